@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メール分類の各処理をまとめて呼び出すコマンドラインツール
+"""
+
+import re
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+from pathlib import Path
+
+# 処理本体のサブコマンド（モジュールは実行時にだけ読み込み、引数はそのまま渡す）
+COMMANDS = {
+    'word2vec': ('generate_word2vec', 'Word2Vec特徴量を生成する'),
+    'tfidf': ('generate_tfidf', 'TF-IDF特徴量を生成する'),
+    'doc2vec': ('generate_doc2vec', 'Doc2Vec特徴量を生成する'),
+    'char_ngram': ('generate_char_ngram', '文字n-gram特徴量を生成する'),
+    'compare': ('compare_features_and_models', '保存済みの特徴量でモデルを比較する'),
+    'reduce': ('reduce_features', '次元削減の方法・次元数ごとの処理時間とF1スコアを比較する'),
+    'dtype': ('dtype_policy', '特徴量の数値型（float32・float64）ごとのメモリ・学習時間・F1スコアを比較する'),
+    'search': ('search_strategies', 'パラメータ探索の方法（全探索・逐次半減法・ランダム探索・正則化パス）ごとの探索時間と最良スコアを比較する'),
+    'store': ('embedding_store', '単語ベクトルを量子化し、メモリと分類精度を比較する'),
+    'run': ('run_all', '特徴量の生成からモデル比較までを1プロセスで実行する'),
+    'stream': ('train_streaming', 'ハッシュ特徴量とミニバッチ学習でモデルを学習・評価する')
+}
+
+# 起動時に読み込まれていないことを確認する重いライブラリ
+HEAVY_MODULES = ('numpy', 'scipy', 'pandas', 'sklearn', 'gensim')
+
+# 起動時間を計測する軽いコマンド
+LIGHT_COMMANDS = [
+    ['--help'],
+    ['config'],
+    ['labels'],
+    *[[name, '--help'] for name in COMMANDS]
+]
+
+def show_config(config_path):
+    """設定の要点を表示する"""
+    from config_loader import ConfigLoader
+    from compare_features_and_models import get_enabled_models
+    config = ConfigLoader(config_path)
+    paths = config.get_paths()
+    data_source = paths["input"]["data_source"]
+    input_path = paths["input"]["data_paths"][data_source]
+    input_dir = Path(input_path.replace("*.txt", ""))
+    print("\n=== 設定 ===")
+    print(f"- データソース: {data_source}（{input_path}, {len(list(input_dir.glob('*.txt')))}件）")
+    print(f"- ラベルファイル: {paths['input']['labels_file']}")
+    print(f"- 有効なモデル: {', '.join(get_enabled_models(config))}")
+    print(f"- Word2Vec: {config.get_word2vec_params()}")
+    print(f"- TF-IDF: {config.get_tfidf_params()}")
+    print(f"- Doc2Vec: {config.get_doc2vec_params()}")
+    print(f"- 文字n-gram: {config.get_char_ngram_params()}")
+    print(f"- 数値型: {config.get_dtype_params() or '既定（float32）'}")
+
+def show_labels(config_path):
+    """ラベルごとの件数を表示する"""
+    from collections import Counter
+    from config_loader import ConfigLoader
+    from compare_features_and_models import load_labels
+    config = ConfigLoader(config_path)
+    labels = load_labels(Path(config.get_paths()["input"]["labels_file"]))
+    counts = Counter(labels.values())
+    print(f"\n=== ラベル（{len(labels)}件） ===")
+    for label, count in counts.most_common():
+        print(f"- {label}: {count}件")
+
+def measure_startup(command, repeat):
+    """コマンドの起動時間（最小値）と読み込まれた重いライブラリを返す"""
+    argv = [sys.executable, str(Path(__file__).resolve()), *command]
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed.append(time.perf_counter() - start)
+
+    # -X importtime の出力から読み込まれたトップレベルのモジュールを調べる
+    result = subprocess.run([sys.executable, '-X', 'importtime', *argv[1:]],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+\s+\|\s+\d+\s+\|(\s*)(\S+)', line)
+        if match:
+            imported.add(match.group(2).split('.')[0])
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    return min(elapsed), heavy
+
+def startup_check(config_path, budget=None, repeat=3):
+    """軽いコマンドの起動時間が予算内で、重いライブラリを読み込まないことを確認する
+
+    Returns:
+        bool: すべてのコマンドが条件を満たす場合True
+    """
+    if budget is None:
+        from config_loader import ConfigLoader
+        budget = ConfigLoader(config_path).get_cli_params().get('startup_budget_sec', 0.5)
+
+    print(f"\n=== 起動時間の確認（予算 {budget:.2f}秒, {repeat}回の最小値） ===")
+    ok = True
+    for command in LIGHT_COMMANDS:
+        if command[0] in ('config', 'labels'):
+            command = [*command, '--config', config_path]
+        elapsed, heavy = measure_startup(command, repeat)
+        passed = elapsed <= budget and not heavy
+        ok = ok and passed
+        note = f"  重いライブラリ: {', '.join(heavy)}" if heavy else ""
+        print(f"{'OK ' if passed else 'NG '} {' '.join(command):<40} {elapsed:6.3f}秒{note}")
+    print("\nすべてのコマンドが予算内です" if ok else "\n予算を超えたコマンドがあります")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        # オプションとヘルプは各スクリプトに任せる
+        subparsers.add_parser(name, help=help_text, add_help=False)
+
+    config_parser = subparsers.add_parser('config', help='設定の要点を表示する')
+    config_parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+
+    labels_parser = subparsers.add_parser('labels', help='ラベルごとの件数を表示する')
+    labels_parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+
+    check_parser = subparsers.add_parser('startup-check', help='軽いコマンドの起動時間を確認する')
+    check_parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    check_parser.add_argument('--budget', type=float,
+                              help='起動時間の予算（秒、設定ファイルの値を上書き）')
+    check_parser.add_argument('--repeat', type=int, default=3, help='計測の回数')
+
+    args, rest = parser.parse_known_args(argv)
+
+    if args.command in COMMANDS:
+        module = importlib.import_module(COMMANDS[args.command][0])
+        return module.main(rest)
+    if rest:
+        parser.error(f"認識できない引数です: {' '.join(rest)}")
+
+    if args.command == 'config':
+        show_config(args.config)
+    elif args.command == 'labels':
+        show_labels(args.config)
+    elif args.command == 'startup-check':
+        if not startup_check(args.config, args.budget, args.repeat):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,79 @@
 
 import os
 import json
-import numpy as np
-import pandas as pd
+import time
+import argparse
 from pathlib import Path
 from datetime import datetime
-from sklearn.model_selection import cross_val_score, GridSearchCV, train_test_split
-from sklearn.metrics import classification_report, confusion_matrix, f1_score
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.naive_bayes import GaussianNB
 from config_loader import ConfigLoader
 
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import open_registry
+
+# 比較するモデル（model_params.enabled_models で絞り込み可能）
+MODEL_NAMES = ('LogisticRegression', 'SVM', 'RandomForest', 'NaiveBayes')
+
+def create_model(name, sparse=False):
+    """モデルを生成する（scikit-learn のモジュールは使うモデルの分だけ読み込む）
+
+    NaiveBayes は疎行列（TF-IDF）には ComplementNB、密行列には GaussianNB を使う
+    """
+    if name == 'LogisticRegression':
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression()
+    if name == 'SVM':
+        from sklearn.svm import SVC
+        return SVC()
+    if name == 'RandomForest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier()
+    if name == 'NaiveBayes':
+        if sparse:
+            from sklearn.naive_bayes import ComplementNB
+            return ComplementNB()
+        from sklearn.naive_bayes import GaussianNB
+        return GaussianNB()
+    raise ValueError(f"未知のモデルです: {name}")
+
+def get_enabled_models(config):
+    """設定で有効なモデル名のリストを返す（省略時は全モデル）"""
+    enabled = config.get_model_params().get('enabled_models', list(MODEL_NAMES))
+    unknown = [name for name in enabled if name not in MODEL_NAMES]
+    if unknown:
+        raise ValueError(f"enabled_models に未知のモデルがあります: {', '.join(unknown)}")
+    return [name for name in MODEL_NAMES if name in enabled]
+
+def is_sparse(X):
+    """特徴量行列が scipy.sparse の疎行列かどうか"""
+    from scipy.sparse import issparse
+    return issparse(X)
+
+def load_feature_set(feature_dir):
+    """特徴量ディレクトリを読み込む
+
+    TF-IDF・文字n-gramの疎行列は密にせずそのまま、Word2Vecの文書ベクトルはメモリマップで返す。
+    どちらもない場合は以前の形式（文書ごとのJSON）を読み込む
+    """
+    from generate_tfidf import TFIDF_MATRIX_FILE, load_tfidf_features
+    from generate_word2vec import DOC_VECTORS_FILE, load_doc_vectors
+    from generate_char_ngram import CHAR_NGRAM_MATRIX_FILE, load_char_ngram_features
+    if (feature_dir / DOC_VECTORS_FILE).exists():
+        print(f"\n文書ベクトルの読み込み（メモリマップ）: {feature_dir / DOC_VECTORS_FILE}")
+        X, filenames = load_doc_vectors(feature_dir)
+        print(f"合計で{X.shape[0]}件の文書を読み込みました（次元数 {X.shape[1]}, {X.dtype}）")
+        return X, filenames
+    for matrix_file, load in ((TFIDF_MATRIX_FILE, load_tfidf_features),
+                              (CHAR_NGRAM_MATRIX_FILE, load_char_ngram_features)):
+        if (feature_dir / matrix_file).exists():
+            print(f"\n疎行列の読み込み: {feature_dir / matrix_file}")
+            X, filenames = load(feature_dir)
+            print(f"合計で{X.shape[0]}件の文書を読み込みました（次元数 {X.shape[1]}, 非ゼロ要素 {X.nnz}）")
+            return X, filenames
+    return load_vectors(feature_dir)
+
 def load_vectors(vec_dir):
-    """ベクトルデータを読み込む"""
+    """ベクトルデータ（以前の形式: 文書ごとのJSON）を float32 の行列として読み込む"""
+    import numpy as np
     vectors = []
     filenames = []
     
@@ -45,7 +104,7 @@ def load_vectors(vec_dir):
     print(f"\n合計で{len(vectors)}個のベクトルを読み込みました")
     
     if not vectors:
-        return np.array([]), []
+        return np.zeros((0, 0), dtype=np.float32), []
     
     # 全てのベクトルを同じ次元数にする
     max_dim = max(len(vec) for vec in vectors)
@@ -58,7 +117,7 @@ def load_vectors(vec_dir):
         else:
             padded_vectors.append(vec)
     
-    return np.array(padded_vectors), filenames
+    return np.array(padded_vectors, dtype=np.float32), filenames
 
 def load_labels(label_file):
     """ラベルデータを読み込む"""
@@ -72,10 +131,46 @@ def load_labels(label_file):
                 labels[fname] = label
     return labels
 
-def evaluate_model(model, X_train, X_test, y_train, y_test, model_name, feature_name):
-    """モデルを評価し、結果を返す"""
+def resolve_labels(label_map, input_dir):
+    """文書レジストリを使って入力テキストのファイル名 -> ラベル の対応を求める
+
+    labels.csv のラベルを文書IDに紐づけて、入力ディレクトリの成果物と結合する（レジストリは読み込むだけ）。
+    レジストリに入力ディレクトリの記録がない場合はエラーとする（先に取り込みと前処理を実行する）
+    """
+    with open_registry(read_only=True) as registry:
+        doc_labels = registry.resolve_labels(input_dir, label_map)
+    print(f"文書レジストリ: labels.csv {len(label_map)}件のラベルを {input_dir} の {len(doc_labels)}件と結合しました")
+    return doc_labels
+
+def get_feature_dirs(config, data_dirs=None):
+    """評価する特徴量の一覧（特徴量名 -> (特徴量の保存先, ラベルを対応づけるテキストのディレクトリ, 表示名)）
+
+    評価・次元削減と数値型の比較・分散実行（pipeline/work_queue.py）で同じ一覧を使う。
+    data_dirs（data_source -> ディレクトリ）を渡した場合は input.data_paths のパスを置き換える
+    """
+    from generate_char_ngram import DEFAULT_CHAR_NGRAM_PARAMS
+    paths = config.get_paths()
+    data_dirs = {**{source: Path(path.replace("*.txt", "")) for source, path in paths["input"]["data_paths"].items()},
+                 **(data_dirs or {})}
+    input_dir = data_dirs[paths["input"]["data_source"]]
+    # 文字n-gramは形態素解析・正規化を経由しないテキスト（char_ngram_params.data_source）から生成する
+    char_ngram_dir = data_dirs[{**DEFAULT_CHAR_NGRAM_PARAMS, **config.get_char_ngram_params()}["data_source"]]
+    output = paths["output"]
+    return {
+        "Word2Vec": (Path(output["word2vec"]["vectors_path"]), input_dir, "Word2Vec特徴量"),
+        "TF-IDF": (Path(output["tfidf"]["features_path"]), input_dir, "TF-IDF特徴量"),
+        "Doc2Vec": (Path(output.get("doc2vec", {}).get("vectors_path", "features_doc2vec")), input_dir,
+                    "Doc2Vec特徴量"),
+        "CharNgram": (Path(output.get("char_ngram", {}).get("features_path", "features_char_ngram")),
+                      char_ngram_dir, "文字n-gram特徴量")
+    }
+
+def evaluate_model(model, X_train, X_test, y_train, y_test, model_name, feature_name, fit=True):
+    """モデルを評価し、結果を返す（fit=False の場合は学習済みのモデルをそのまま使う）"""
+    from sklearn.metrics import classification_report, confusion_matrix, f1_score
     # モデルの学習
-    model.fit(X_train, y_train)
+    if fit:
+        model.fit(X_train, y_train)
     
     # 予測
     y_pred = model.predict(X_test)
@@ -100,12 +195,14 @@ def evaluate_model(model, X_train, X_test, y_train, y_test, model_name, feature_
 
 def save_results_to_csv(results, output_dir):
     """結果をCSVファイルに保存"""
+    import pandas as pd
     data = []
     for r in results:
         model_data = {
             'feature': r['feature_name'],
             'model': r['model_name'],
-            'f1_score': r['f1_score']
+            'f1_score': r['f1_score'],
+            'cv_score': r.get('search', {}).get('best_score')
         }
         # 各クラスの精度、再現率、F1スコアを追加
         for cls in r['report'].keys():
@@ -122,6 +219,7 @@ def save_results_to_csv(results, output_dir):
 
 def save_history(best_result, config, output_dir):
     """最良の結果を履歴として保存"""
+    import pandas as pd
     # 出力ディレクトリが存在することを確認
     output_dir.mkdir(parents=True, exist_ok=True)
     
@@ -149,6 +247,12 @@ def save_history(best_result, config, output_dir):
     elif best_result['feature_name'] == "TF-IDF":
         tfidf_params = config.get_tfidf_params()
         feature_params = f"max_feat={tfidf_params['max_features']},min_df={tfidf_params['min_df']},max_df={tfidf_params['max_df']}"
+    elif best_result['feature_name'] == "Doc2Vec":
+        doc2vec_params = config.get_doc2vec_params()
+        feature_params = f"vec_size={doc2vec_params.get('vector_size')},dm={doc2vec_params.get('dm')},epochs={doc2vec_params.get('epochs')}"
+    elif best_result['feature_name'] == "CharNgram":
+        char_ngram_params = config.get_char_ngram_params()
+        feature_params = f"ngram={char_ngram_params.get('ngram_range')},n_features={char_ngram_params.get('n_features')}"
     
     # クラス数を計算
     unique_classes = set(best_result['y_test'])
@@ -200,6 +304,7 @@ def save_history(best_result, config, output_dir):
 
 def save_evaluation_summary(results, output_dir):
     """評価結果のサマリーをテキストファイルに保存"""
+    from sklearn.metrics import classification_report
     with open(output_dir / 'evaluation_summary.txt', 'w', encoding='utf-8') as f:
         f.write("=== メール分類モデル評価結果 ===\n\n")
         
@@ -221,12 +326,8 @@ def save_evaluation_summary(results, output_dir):
         f.write(f"モデル: {best_result['model_name']}\n")
         f.write(f"F1スコア: {best_result['f1_score']:.4f}\n")
 
-def tune_hyperparameters(X_train, y_train):
-    """ハイパーパラメータチューニング"""
-    # 設定の読み込み
-    config = ConfigLoader()
-    model_params = config.get_model_params()
-
+def build_param_grids(model_params, sparse=False):
+    """モデルごとの (表示名, パラメータグリッド) を返す（sparse: 疎行列用のNaiveBayesにする）"""
     # デフォルトのパラメータグリッド
     default_lr_params = {
         'C': [0.001, 0.01, 0.1, 1, 10, 100],
@@ -251,6 +352,10 @@ def tune_hyperparameters(X_train, y_train):
         'var_smoothing': [1e-9, 1e-8, 1e-7, 1e-6]
     }
 
+    default_cnb_params = {
+        'alpha': [0.1, 0.5, 1.0]
+    }
+
     # 設定ファイルのパラメータでデフォルト値を上書き
     lr_config = model_params.get('logistic_regression', {})
     lr_param_grid = default_lr_params.copy()
@@ -270,96 +375,134 @@ def tune_hyperparameters(X_train, y_train):
     if 'max_depth' in rf_config: rf_param_grid['max_depth'] = rf_config['max_depth']
     if 'min_samples_split' in rf_config: rf_param_grid['min_samples_split'] = rf_config['min_samples_split']
 
-    # GaussianNBのパラメータグリッド
+    # NaiveBayesのパラメータグリッド（疎行列はComplementNB、密行列はGaussianNB）
     nb_config = model_params.get('naive_bayes', {})
-    nb_param_grid = default_nb_params.copy()
-    if 'var_smoothing' in nb_config: nb_param_grid['var_smoothing'] = nb_config['var_smoothing']
-    
-    # グリッドサーチの実行
-    common_params = {
-        'cv': 5,                    # 5分割交差検証
-        'scoring': 'f1_weighted',   # 評価指標
-        'verbose': 1,              # 進捗表示
-        'n_jobs': -1,              # 全CPU使用
-        'return_train_score': True  # 訓練スコアも記録
-    }
+    if sparse:
+        nb_name = 'ComplementNB'
+        nb_param_grid = default_cnb_params.copy()
+        if 'alpha' in nb_config: nb_param_grid['alpha'] = nb_config['alpha']
+    else:
+        nb_name = 'GaussianNB'
+        nb_param_grid = default_nb_params.copy()
+        if 'var_smoothing' in nb_config: nb_param_grid['var_smoothing'] = nb_config['var_smoothing']
     
-    # ロジスティック回帰
-    lr_grid = GridSearchCV(
-        LogisticRegression(),
-        lr_param_grid,
-        **common_params
-    )
-    print("\nロジスティック回帰のパラメータ探索中...")
-    lr_grid.fit(X_train, y_train)
-    print(f"最適パラメータ: {lr_grid.best_params_}")
-    print(f"最良スコア: {lr_grid.best_score_:.4f}")
-    
-    # SVM
-    svm_grid = GridSearchCV(
-        SVC(),
-        svm_param_grid,
-        **common_params
-    )
-    print("\nSVMのパラメータ探索中...")
-    svm_grid.fit(X_train, y_train)
-    print(f"最適パラメータ: {svm_grid.best_params_}")
-    print(f"最良スコア: {svm_grid.best_score_:.4f}")
-    
-    # ランダムフォレスト
-    rf_grid = GridSearchCV(
-        RandomForestClassifier(),
-        rf_param_grid,
-        **common_params
-    )
-    print("\nランダムフォレストのパラメータ探索中...")
-    rf_grid.fit(X_train, y_train)
-    print(f"最適パラメータ: {rf_grid.best_params_}")
-    print(f"最良スコア: {rf_grid.best_score_:.4f}")
-
-    # GaussianNB
-    nb_grid = GridSearchCV(
-        GaussianNB(),
-        nb_param_grid,
-        **common_params
-    )
-    print("\nGaussianNBのパラメータ探索中...")
-    nb_grid.fit(X_train, y_train)
-    print(f"最適パラメータ: {nb_grid.best_params_}")
-    print(f"最良スコア: {nb_grid.best_score_:.4f}")
-    
-    # 最適なパラメータを持つモデルを返す
     return {
-        'LogisticRegression': lr_grid.best_estimator_,
-        'SVM': svm_grid.best_estimator_,
-        'RandomForest': rf_grid.best_estimator_,
-        'NaiveBayes': nb_grid.best_estimator_
+        'LogisticRegression': ('ロジスティック回帰', lr_param_grid),
+        'SVM': ('SVM', svm_param_grid),
+        'RandomForest': ('ランダムフォレスト', rf_param_grid),
+        'NaiveBayes': (nb_name, nb_param_grid)
     }
 
-def process_feature_set(feature_dir, feature_name, label_map, output_dir):
-    """特徴量セットを処理し、評価する"""
+def tune_model(name, X_train, y_train, model_params, cache_dir=None, strategy=None, verbose=1, n_jobs=-1,
+               data_key=None):
+    """1つのモデルのパラメータを探索し、最適なパラメータで学習用の分割全体に学習したモデルを返す
+
+    探索の方法と予算は model_params.search に従う（strategy を渡した場合は方法だけ上書き）。
+    交差検証は n_jobs 個のプロセスで並列に行う（-1 は全CPU）。
+    cache_dir を渡した場合は、同じ学習データ・モデル・探索の設定の結果があれば探索せずに読み込む
+    （data_key は計算済みの学習データのハッシュ。同じ学習データで複数のモデルを探索する場合に渡す）
+
+    Returns:
+        tuple: (学習済みのモデル, 探索の情報（strategy, n_candidates, n_fits, budget_fits,
+                best_params, best_score, search_time, cached）)
+    """
+    from fit_cache import fit_key, load_fit, save_fit, search_entry
+    from search_strategies import family_settings, create_search, count_fits, format_path
+    sparse = is_sparse(X_train)
+    display_name, param_grid = build_param_grids(model_params, sparse)[name]
+    estimator = create_model(name, sparse)
+    settings = family_settings(model_params, name, strategy)
+
+    # 探索結果のキャッシュ（方法・予算を含む探索の設定をキーにする）
+    key = None
+    if cache_dir is not None:
+        key = fit_key(name, estimator, {**settings, 'param_grid': param_grid}, X_train, y_train, data_key)
+        entry = load_fit(cache_dir, name, key)
+        if entry is not None:
+            print(f"\n{display_name}: 探索結果をキャッシュから読み込みました（{entry['created_at']}）")
+            print(f"最適パラメータ: {entry['best_params']}")
+            print(f"最良スコア: {entry['best_score']:.4f}")
+            return entry['estimator'], {**entry['plan'], 'best_params': entry['best_params'],
+                                        'best_score': entry['best_score'], 'search_time': 0.0, 'cached': True}
+
+    # 探索の実行（予算に時間を指定した場合は、ここで1回学習して学習回数に換算する）
+    start = time.perf_counter()
+    search, plan = create_search(estimator, param_grid, settings, X_train, y_train, verbose, n_jobs)
+    budget = f", 予算 {plan['budget_fits']}回" if plan['budget_fits'] is not None else ""
+    print(f"\n{display_name}のパラメータ探索中...（{plan['strategy']}, 候補 {plan['n_candidates']}{budget}）")
+    search.fit(X_train, y_train)
+    search_time = time.perf_counter() - start
+    plan['n_fits'] = count_fits(search, settings['cv'])
+    if hasattr(search, 'path_'):
+        # 正則化パスの場合は C ごとの交差検証スコアの曲線を残す
+        plan['path'] = search.path_
+        print(f"C ごとの交差検証スコア:\n{format_path(search.path_)}")
+    print(f"最適パラメータ: {search.best_params_}")
+    print(f"最良スコア: {search.best_score_:.4f}（学習 {plan['n_fits']}回, {search_time:.2f}秒）")
+    entry = {**search_entry(search, search_time), 'plan': plan}
+    if key is not None:
+        save_fit(cache_dir, name, key, entry)
+    return search.best_estimator_, {**plan, 'best_params': entry['best_params'], 'best_score': entry['best_score'],
+                                    'search_time': search_time, 'cached': False}
+
+def tune_hyperparameters(X_train, y_train, config=None):
+    """ハイパーパラメータチューニング
+
+    Returns:
+        dict: モデル名 -> (最適なパラメータで学習済みのモデル, 探索の情報)
+    """
+    from fit_cache import get_cache_dir
+    from eval_scheduler import worker_budget
+    from reduce_features import fingerprint
+    # 設定の読み込み
+    if config is None:
+        config = ConfigLoader()
+    model_params = config.get_model_params()
+    cache_dir = get_cache_dir(config)
+    
+    # 有効なモデルだけを探索し、最適なパラメータを持つモデルを返す（交差検証の並列数はCPUの予算まで）
+    # 学習データのハッシュはモデルごとに計算し直さない
+    n_jobs = worker_budget(model_params)
+    data_key = fingerprint(X_train, y_train) if cache_dir is not None else None
+    return {name: tune_model(name, X_train, y_train, model_params, cache_dir, n_jobs=n_jobs, data_key=data_key)
+            for name in get_enabled_models(config)}
+
+def load_dataset(feature_dir, feature_name, label_map, config=None):
+    """保存済みの特徴量セットを読み込み、評価用に分割する（有効なデータがない場合はNone）"""
     print("\n" + "="*50)
-    print(f"{feature_name}の処理を開始...")
+    print(f"{feature_name}の読み込みを開始...")
     print("="*50)
     
     # 特徴量とラベルの読み込み
-    X, filenames = load_vectors(feature_dir)
-    
-    if len(X) == 0:
-        print(f"エラー: {feature_name}の有効なデータがありません。")
+    X, filenames = load_feature_set(feature_dir)
+    return prepare_dataset(X, filenames, feature_name, label_map, config)
+
+def process_feature_set(feature_dir, feature_name, label_map, output_dir, config=None):
+    """特徴量セットを処理し、評価する"""
+    dataset = load_dataset(feature_dir, feature_name, label_map, config)
+    if dataset is None:
         return []
-    
+    return evaluate_datasets({feature_name: dataset}, config)
+
+def split_dataset(X, filenames, feature_name, label_map):
+    """特徴量行列にラベルを対応づけ、学習用と評価用に分割する
+
+    Returns:
+        tuple: (X_train, X_test, y_train, y_test)、有効なデータがない場合はNone
+    """
+    from sklearn.model_selection import train_test_split
+    if X.shape[0] == 0:
+        print(f"エラー: {feature_name}の有効なデータがありません。")
+        return None
+
     print("\nデバッグ情報:")
     print(f"読み込んだファイル数: {len(filenames)}")
     print(f"最初の5つのファイル名: {filenames[:5]}")
     print(f"ラベルマップのエントリ数: {len(label_map)}")
     print(f"ラベルマップの最初の5つのエントリ: {dict(list(label_map.items())[:5])}")
         
-    y = []
-    for name in filenames:
-        # 元のファイル名をそのまま使用（.txtを付加）
-        label = label_map.get(f"{name}.txt", "unknown")
-        y.append(label)
+    # label_map は resolve_labels で入力ディレクトリの成果物と結合済み（ファイル名に .txt を付加して照合）
+    y = [label_map.get(f"{name}.txt", "unknown") for name in filenames]
     
     # デバッグ: マッチしなかったファイル名を表示
     unmatched_files = [(name, name + ".txt") for i, name in enumerate(filenames) if y[i] == "unknown"]
@@ -377,9 +520,9 @@ def process_feature_set(feature_dir, feature_name, label_map, output_dir):
         y = [y[i] for i in valid_indices]
         filenames = [filenames[i] for i in valid_indices]
     
-    if len(X) == 0:
+    if X.shape[0] == 0:
         print(f"エラー: {feature_name}の有効なデータがありません。")
-        return []
+        return None
     
     # データの分割
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
@@ -387,81 +530,96 @@ def process_feature_set(feature_dir, feature_name, label_map, output_dir):
     # クラスの一覧
     classes = sorted(list(set(y)))
     print(f"分類クラス: {classes}")
+    return X_train, X_test, y_train, y_test
+
+def prepare_dataset(X, filenames, feature_name, label_map, config=None):
+    """特徴量行列を分割し、次元削減と数値型の統一を行う（有効なデータがない場合はNone）"""
+    from reduce_features import reduce_dataset
+    from dtype_policy import apply_dtype_policy
+    if config is None:
+        config = ConfigLoader()
+    dataset = split_dataset(X, filenames, feature_name, label_map)
+    if dataset is None:
+        return None
+    # 次元削減（設定で有効な場合のみ、学習用の分割で1回だけ学習）
+    dataset = reduce_dataset(dataset, feature_name, config)
+    # 数値型を設定（dtype_params.dtype）に揃える（保存済みの特徴量や削減後の行列の型が異なる場合）
+    return apply_dtype_policy(dataset, feature_name, config)
+
+def print_result(result, y_test):
+    """評価結果のF1スコアと分類レポートを表示する"""
+    from sklearn.metrics import classification_report
+    print(f"\n{result['feature_name']} + {result['model_name']}の結果:")
+    print("-"*30)
+    print(f"F1スコア: {result['f1_score']:.4f}")
+    print("\n分類レポート:")
+    print(classification_report(y_test, result['y_pred'], zero_division=1))
+
+def evaluate_dataset(dataset, feature_name, config=None):
+    """分割済みの特徴量セットで各モデルのパラメータ探索と評価を順に行う"""
+    if config is None:
+        config = ConfigLoader()
+    X_train, X_test, y_train, y_test = dataset
     
     # ハイパーパラメータチューニング
     print("\n" + "-"*50)
     print(f"{feature_name}を用いたパラメータ調整の実行中...")
     print("-"*50)
-    tuned_models = tune_hyperparameters(X_train, y_train)
-    
-    # 評価するモデルのリスト
-    models = [
-        ('LogisticRegression', tuned_models['LogisticRegression']),
-        ('SVM', tuned_models['SVM']),
-        ('RandomForest', tuned_models['RandomForest']),
-        ('NaiveBayes', GaussianNB())
-    ]
+    tuned_models = tune_hyperparameters(X_train, y_train, config)
     
-    # 各モデルの評価
+    # 各モデルの評価（探索で最適なパラメータのモデルは学習用の分割全体で学習済みのため、学習し直さない）
     results = []
-    for name, model in models:
+    for name, (model, search) in tuned_models.items():
         print("\n" + "-"*50)
         print(f"{feature_name} + {name}の評価中...")
         print("-"*50)
-        result = evaluate_model(model, X_train, X_test, y_train, y_test, name, feature_name)
+        start = time.perf_counter()
+        result = evaluate_model(model, X_train, X_test, y_train, y_test, name, feature_name, fit=False)
+        result['search'] = search
+        result['job_time'] = search['search_time'] + time.perf_counter() - start
         results.append(result)
-        
-        # 結果の表示
-        print(f"\n{feature_name} + {name}の結果:")
-        print("-"*30)
-        print(f"F1スコア: {result['f1_score']:.4f}")
-        print("\n分類レポート:")
-        print(classification_report(y_test, result['y_pred'], zero_division=1))
+        print_result(result, y_test)
     
     return results
 
-def main():
-    # 設定の読み込み
-    config = ConfigLoader()
-    paths = config.get_paths()
-    
-    # stopwords設定の確認
-    stopwords_enabled = config.get_stopwords_enabled()
-    print(f"\nstopwords設定: {'有効' if stopwords_enabled else '無効'}")
-    print("-"*50)
-    
-    # 入出力パスの設定
-    labels_file = Path(paths["input"]["labels_file"])
-    word2vec_dir = Path(paths["output"]["word2vec"]["vectors_path"])
-    tfidf_dir = Path(paths["output"]["tfidf"]["features_path"])
-    results_dir = Path(paths["output"]["results"]["evaluation"])
-    results_dir.mkdir(parents=True, exist_ok=True)
-    
-    # ラベルの読み込み
-    label_map = load_labels(labels_file)
-    
-    all_results = []
-    
-    # Word2Vec特徴量の処理
-    if word2vec_dir.exists():
-        word2vec_results = process_feature_set(word2vec_dir, "Word2Vec", label_map, results_dir)
-        all_results.extend(word2vec_results)
-    else:
-        print(f"警告: {word2vec_dir}が存在しません。Word2Vec特徴量は処理されません。")
-    
-    # TF-IDF特徴量の処理
-    if tfidf_dir.exists():
-        tfidf_results = process_feature_set(tfidf_dir, "TF-IDF", label_map, results_dir)
-        all_results.extend(tfidf_results)
-    else:
-        print(f"警告: {tfidf_dir}が存在しません。TF-IDF特徴量は処理されません。")
-    
-    if not all_results:
-        print("エラー: 有効な結果がありません。")
-        return
-    
+def evaluate_datasets(datasets, config=None):
+    """複数の特徴量セットを評価する
+
+    model_params.parallel が有効で、CPUの予算が2以上・ジョブが2つ以上ある場合は、
+    特徴量 × モデルのジョブを eval_scheduler で並列に実行する（それ以外は特徴量ごとに順に実行する）。
+
+    Args:
+        datasets (dict): 特徴量名 -> prepare_dataset で分割済みの (X_train, X_test, y_train, y_test)
+    Returns:
+        list: 評価結果（特徴量・モデルの順、job_time は各ジョブの探索と評価の時間）
+    """
+    from eval_scheduler import get_parallel_params, worker_budget, run_schedule
+    if config is None:
+        config = ConfigLoader()
+    model_params = config.get_model_params()
+    n_jobs = len(datasets) * len(get_enabled_models(config))
+    if not (get_parallel_params(model_params)["enabled"] and worker_budget(model_params) > 1 and n_jobs > 1):
+        return [result for feature_name, dataset in datasets.items()
+                for result in evaluate_dataset(dataset, feature_name, config)]
+    
+    results = run_schedule(datasets, config)
+    for result in results:
+        print_result(result, datasets[result['feature_name']][3])
+    return results
+
+def evaluate_feature_set(X, filenames, feature_name, label_map, config=None):
+    """メモリ上の特徴量行列（行はfilenamesの順、疎行列のままでもよい）を評価する"""
+    dataset = prepare_dataset(X, filenames, feature_name, label_map, config)
+    if dataset is None:
+        return []
+    return evaluate_datasets({feature_name: dataset}, config)
+
+def report_results(all_results, config, results_dir):
+    """評価結果のCSV・サマリー・履歴を保存し、最良のモデルを表示する"""
+    from search_strategies import save_search_history
     # 結果をCSVに保存
     save_results_to_csv(all_results, results_dir)
+    save_search_history(all_results, results_dir)
     
     # 評価結果のサマリーを保存
     save_evaluation_summary(all_results, results_dir)
@@ -481,5 +639,46 @@ def main():
     print(f"結果は {results_dir} ディレクトリに保存されました")
     print("-"*50)
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    args = parser.parse_args(argv)
+    
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    
+    # stopwords設定の確認
+    stopwords_enabled = config.get_stopwords_enabled()
+    print(f"\nstopwords設定: {'有効' if stopwords_enabled else '無効'}")
+    print("-"*50)
+    
+    # 入出力パスの設定
+    labels_file = Path(paths["input"]["labels_file"])
+    results_dir = Path(paths["output"]["results"]["evaluation"])
+    results_dir.mkdir(parents=True, exist_ok=True)
+    
+    # 特徴量セットの読み込みと分割（全特徴量を読み込んでから、まとめて評価する）
+    # ラベルは文書レジストリで特徴量の元になったテキストのファイル名に対応づける（ディレクトリごとに1回）
+    labels = load_labels(labels_file)
+    label_maps = {}
+    datasets = {}
+    for feature_name, (feature_dir, texts_dir, label) in get_feature_dirs(config).items():
+        if not feature_dir.exists():
+            print(f"警告: {feature_dir}が存在しません。{label}は処理されません。")
+            continue
+        if texts_dir not in label_maps:
+            label_maps[texts_dir] = resolve_labels(labels, texts_dir)
+        dataset = load_dataset(feature_dir, feature_name, label_maps[texts_dir], config)
+        if dataset is not None:
+            datasets[feature_name] = dataset
+    
+    all_results = evaluate_datasets(datasets, config)
+    if not all_results:
+        print("エラー: 有効な結果がありません。")
+        return
+    
+    report_results(all_results, config, results_dir)
+
 if __name__ == "__main__":
     main()
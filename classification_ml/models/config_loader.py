@@ -3,18 +3,25 @@ import os
 from typing import Dict, Any
 
 class ConfigLoader:
-    def __init__(self, config_path: str = "model_config.json"):
+    def __init__(self, config_path: str = "model_config.json", preprocess_config_path: str = None):
         """設定ファイルを読み込むためのローダークラス
 
         Args:
             config_path (str): 設定ファイルのパス
+            preprocess_config_path (str): 前処理の設定ファイルのパス
+                （省略時は input.preprocess_config、なければ ../preprocess_nlp/nlp_config.json）
         """
         self.config_path = config_path
         self.config = self._load_config()
         
         # 前処理の設定ファイルを読み込む
         current_dir = os.path.dirname(os.path.abspath(self.config_path))
-        preprocess_config_path = os.path.join(os.path.dirname(current_dir), 'preprocess_nlp', 'nlp_config.json')
+        if preprocess_config_path is None:
+            preprocess_config_path = self.config.get("input", {}).get("preprocess_config")
+        if preprocess_config_path is not None:
+            preprocess_config_path = os.path.join(current_dir, preprocess_config_path)
+        else:
+            preprocess_config_path = os.path.join(os.path.dirname(current_dir), 'preprocess_nlp', 'nlp_config.json')
         print(f"\n前処理設定ファイルのパス: {preprocess_config_path}")
         
         try:
@@ -67,6 +74,62 @@ class ConfigLoader:
         """
         return self.config["model_params"]
 
+    def get_doc2vec_params(self) -> Dict[str, Any]:
+        """Doc2Vecのパラメータを取得
+
+        Returns:
+            Dict[str, Any]: Doc2Vecのパラメータ（未設定の場合は空の辞書）
+        """
+        return self.config.get("doc2vec_params", {})
+
+    def get_char_ngram_params(self) -> Dict[str, Any]:
+        """文字n-gram特徴量のパラメータを取得
+
+        Returns:
+            Dict[str, Any]: 文字n-gram特徴量のパラメータ（未設定の場合は空の辞書）
+        """
+        return self.config.get("char_ngram_params", {})
+
+    def get_reduction_params(self) -> Dict[str, Any]:
+        """次元削減のパラメータを取得
+
+        Returns:
+            Dict[str, Any]: 次元削減のパラメータ（未設定の場合は空の辞書）
+        """
+        return self.config.get("reduction_params", {})
+
+    def get_dtype_params(self) -> Dict[str, Any]:
+        """特徴量行列の数値型のパラメータを取得
+
+        Returns:
+            Dict[str, Any]: 数値型のパラメータ（未設定の場合は空の辞書）
+        """
+        return self.config.get("dtype_params", {})
+
+    def get_embedding_store_params(self) -> Dict[str, Any]:
+        """量子化した埋め込みストアのパラメータを取得
+
+        Returns:
+            Dict[str, Any]: 埋め込みストアのパラメータ（未設定の場合は空の辞書）
+        """
+        return self.config.get("embedding_store_params", {})
+
+    def get_streaming_params(self) -> Dict[str, Any]:
+        """ストリーミング学習（ハッシュ特徴量・逐次学習）のパラメータを取得
+
+        Returns:
+            Dict[str, Any]: ストリーミング学習のパラメータ（未設定の場合は空の辞書）
+        """
+        return self.config.get("streaming_params", {})
+
+    def get_cli_params(self) -> Dict[str, Any]:
+        """コマンドラインツールの設定を取得
+
+        Returns:
+            Dict[str, Any]: コマンドラインツールの設定（未設定の場合は空の辞書）
+        """
+        return self.config.get("cli_params", {})
+
     def get_paths(self) -> Dict[str, Any]:
         """入出力パスの設定を取得
 
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+単語ベクトルから文書ベクトルをまとめて計算するモジュール（平均・TF-IDF重み付き・SIF）
+- 各文書のトークンを1回だけ語彙のインデックス配列に変換し、文書×語彙の出現回数の疎行列にする
+- 単語ベクトルの取り出し（gather）と文書ごとの重み付き合計（segment-reduce）を、
+  重みを掛けた疎行列と単語ベクトル行列の積1回で全文書分まとめて行う
+"""
+
+import time
+import argparse
+from pathlib import Path
+from itertools import chain
+
+POOLING_METHODS = ('mean', 'tfidf', 'sif')
+
+def build_token_index(docs, key_to_index):
+    """文書のトークンを語彙のインデックス配列に変換する（語彙にないトークンは除く）
+
+    Returns:
+        tuple: (全文書のトークンのインデックス（連結）, 文書ごとの開始位置（長さ 文書数+1）)
+    """
+    import numpy as np
+    get = key_to_index.get
+    lengths = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs))
+    flat = np.fromiter((get(token, -1) for token in chain.from_iterable(docs)),
+                       dtype=np.int64, count=int(lengths.sum()))
+    valid = flat >= 0
+    # 語彙にないトークンを除いたあとの各文書の開始位置
+    valid_before = np.concatenate(([0], np.cumsum(valid)))
+    offsets = valid_before[np.concatenate(([0], np.cumsum(lengths)))]
+    return flat[valid], offsets
+
+def count_matrix(token_ids, offsets, vocab_size):
+    """文書×語彙の出現回数の疎行列（CSR）を作る"""
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    counts = csr_matrix((np.ones(len(token_ids)), token_ids, offsets),
+                        shape=(len(offsets) - 1, vocab_size))
+    counts.sum_duplicates()
+    return counts
+
+def token_weights(method, counts, wv, sif_a=1e-3):
+    """語彙ごとの重みを返す（mean の場合はNone）
+
+    - tfidf: 入力文書での文書頻度から求めたIDF（TfidfVectorizer の smooth_idf と同じ式）
+    - sif: a / (a + p(w))、p(w) は Word2Vec の学習コーパスでの出現確率
+    """
+    import numpy as np
+    if method == 'mean':
+        return None
+    if method == 'tfidf':
+        n_docs = counts.shape[0]
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        return np.log((1 + n_docs) / (1 + df)) + 1
+    if method == 'sif':
+        frequencies = np.array([wv.get_vecattr(key, 'count') for key in wv.index_to_key], dtype=np.float64)
+        return sif_a / (sif_a + frequencies / frequencies.sum())
+    raise ValueError(f"未知の集約方法です: {method}")
+
+def segment_pool(counts, vectors, weights=None, dtype="float32"):
+    """文書ごとの（重み付き）平均ベクトルを計算する
+
+    トークンごとの重み（出現回数 × 語の重み）を並べた疎行列と単語ベクトル行列の積で、
+    全文書の重み付き合計をまとめて求める。語彙に含まれるトークンがない文書はゼロベクトルになる。
+    積は dtype で計算する（単語ベクトル行列が同じ型ならコピーしない）
+    """
+    import numpy as np
+    matrix = counts if weights is None else counts.multiply(weights[None, :]).tocsr()
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    sums = matrix.astype(dtype) @ vectors.astype(dtype, copy=False)
+    nonempty = totals > 0
+    result = np.zeros((counts.shape[0], vectors.shape[1]), dtype=dtype)
+    result[nonempty] = sums[nonempty] / totals[nonempty, None].astype(dtype)
+    return result
+
+def remove_common_component(doc_vectors):
+    """SIF: 文書ベクトル全体の第1主成分を取り除く（文書ベクトルと同じ数値型で計算する）"""
+    import numpy as np
+    if len(doc_vectors) < 2:
+        return doc_vectors
+    _, _, vt = np.linalg.svd(doc_vectors, full_matrices=False)
+    u = vt[0]
+    return doc_vectors - np.outer(doc_vectors @ u, u)
+
+def pool_documents(docs, wv, method='mean', sif_a=1e-3, dtype="float32"):
+    """文書ごとのトークンのリストから文書ベクトル（数値型は dtype）を計算する
+
+    Args:
+        docs (list): 文書ごとのトークンのリスト
+        wv (KeyedVectors): 単語ベクトル（model.wv）
+        method (str): 'mean'（平均）, 'tfidf'（IDF重み付き平均）, 'sif'（SIF重み付き平均 + 第1主成分の除去）
+        sif_a (float): SIFの重みのパラメータ a
+        dtype (str): 文書ベクトルの数値型
+    """
+    token_ids, offsets = build_token_index(docs, wv.key_to_index)
+    counts = count_matrix(token_ids, offsets, len(wv))
+    weights = token_weights(method, counts, wv, sif_a)
+    doc_vectors = segment_pool(counts, wv.vectors, weights, dtype)
+    if method == 'sif':
+        doc_vectors = remove_common_component(doc_vectors)
+    return doc_vectors
+
+def mean_pooling_loop(docs, wv):
+    """比較用: 1トークンずつ単語ベクトルを取り出して文書ごとに平均する従来の実装"""
+    import numpy as np
+    doc_vectors = []
+    for tokens in docs:
+        vectors = [wv[token] for token in tokens if token in wv]
+        if vectors:
+            vec = np.mean(vectors, axis=0)
+        else:
+            vec = np.zeros(wv.vector_size, dtype=np.float32)
+        doc_vectors.append(vec)
+    return np.array(doc_vectors, dtype=np.float32)
+
+def benchmark(docs, wv, repeat=3, scale=1):
+    """従来のループと各集約方法の処理時間（最小値）を比較する"""
+    import numpy as np
+    docs = docs * scale
+
+    def measure(func):
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed.append(time.perf_counter() - start)
+        return min(elapsed), result
+
+    n_tokens = sum(len(tokens) for tokens in docs)
+    print(f"\n=== 文書ベクトル計算のベンチマーク（{len(docs)}件, {n_tokens}トークン, {repeat}回の最小値） ===")
+    loop_time, expected = measure(lambda: mean_pooling_loop(docs, wv))
+    print(f"{'従来のループ（mean）':<24} {loop_time:8.3f}秒")
+    for method in POOLING_METHODS:
+        elapsed, result = measure(lambda: pool_documents(docs, wv, method))
+        note = ""
+        if method == 'mean':
+            note = f"  最大誤差 {np.abs(result - expected).max():.2e}"
+        print(f"{'一括計算（' + method + '）':<24} {elapsed:8.3f}秒  {loop_time / elapsed:6.1f}倍{note}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='単語ベクトルからの文書ベクトル計算を従来のループと比較します')
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--repeat', type=int, default=3, help='計測の回数')
+    parser.add_argument('--scale', type=int, default=1, help='文書を複製して件数を増やす倍率')
+    args = parser.parse_args(argv)
+
+    from gensim.models import Word2Vec
+    from config_loader import ConfigLoader
+    from generate_word2vec import read_tokenized_docs
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    data_source = paths["input"]["data_source"]
+    input_dir = Path(paths["input"]["data_paths"][data_source].replace("*.txt", ""))
+    model_path = Path(paths["output"]["word2vec"]["model_path"])
+    if not model_path.exists():
+        raise FileNotFoundError(f"Word2Vecモデルが見つかりません: {model_path}（先に generate_word2vec.py を実行してください）")
+
+    docs, _ = read_tokenized_docs(input_dir)
+    model = Word2Vec.load(str(model_path))
+    benchmark(docs, model.wv, args.repeat, args.scale)
+
+if __name__ == "__main__":
+    main()
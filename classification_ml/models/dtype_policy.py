@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+特徴量行列の数値型（dtype）を特徴量の生成・保存からモデルの学習まで統一するモジュール
+- 既定は float32（dtype_params.dtype で float64 にも変更できる）
+- 設定と異なる型の行列は、黙って変換せずに変換したことを表示する（on_mismatch が error の場合は例外）
+- 単体で実行すると、保存済みの特徴量で float32 と float64 のメモリ・学習時間・F1スコアを比較する
+"""
+
+import time
+import argparse
+from pathlib import Path
+
+DTYPES = ('float32', 'float64')
+MISMATCH_ACTIONS = ('cast', 'error')
+
+DEFAULT_DTYPE_PARAMS = {
+    "dtype": "float32",
+    "on_mismatch": "cast",
+    "report_features": ["Word2Vec", "TF-IDF", "Doc2Vec", "CharNgram"]
+}
+
+def get_dtype_params(config):
+    """数値型のパラメータ（未設定の項目は既定値）"""
+    params = {**DEFAULT_DTYPE_PARAMS, **config.get_dtype_params()}
+    if params["dtype"] not in DTYPES:
+        raise ValueError(f"dtype_params.dtype が不正です: {params['dtype']}（{', '.join(DTYPES)}）")
+    if params["on_mismatch"] not in MISMATCH_ACTIONS:
+        raise ValueError(f"dtype_params.on_mismatch が不正です: {params['on_mismatch']}（{', '.join(MISMATCH_ACTIONS)}）")
+    return params
+
+def get_dtype(config):
+    """特徴量行列の数値型（文字列、numpy・scikit-learn の dtype 引数にそのまま渡せる）"""
+    return get_dtype_params(config)["dtype"]
+
+def enforce_dtype(X, dtype, name, on_mismatch="cast"):
+    """行列の数値型を揃える（同じ型ならコピーせずにそのまま返す）
+
+    Args:
+        X: 特徴量行列（numpy 配列・メモリマップ・scipy.sparse）
+        dtype (str): 揃える数値型
+        name (str): 表示用の名前
+        on_mismatch (str): 'cast'（変換して表示）, 'error'（TypeError）
+    """
+    import numpy as np
+    from scipy.sparse import issparse
+    if X.dtype == np.dtype(dtype):
+        return X
+    if on_mismatch == 'error':
+        raise TypeError(f"{name}: 数値型が {X.dtype} です（設定は {dtype}）")
+    print(f"数値型の変換: {name} {X.dtype} → {dtype}（{matrix_nbytes(X) / 2**20:.1f}MB）")
+    return X.astype(dtype) if issparse(X) else np.asarray(X, dtype=dtype)
+
+def apply_dtype_policy(dataset, name, config):
+    """分割済みのデータセット (X_train, X_test, y_train, y_test) の行列を設定の数値型に揃える"""
+    params = get_dtype_params(config)
+    X_train, X_test, y_train, y_test = dataset
+    X_train = enforce_dtype(X_train, params["dtype"], f"{name}（学習用）", params["on_mismatch"])
+    X_test = enforce_dtype(X_test, params["dtype"], f"{name}（評価用）", params["on_mismatch"])
+    return X_train, X_test, y_train, y_test
+
+def matrix_nbytes(X):
+    """行列が使うメモリ（疎行列は data・indices・indptr の合計）"""
+    from scipy.sparse import issparse
+    if issparse(X):
+        X = X.tocsr()
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+def fitted_dtype(model):
+    """学習済みモデルのパラメータの数値型（モデル内部で float64 に変換されているかの確認用）"""
+    for attr in ('coef_', 'support_vectors_', 'theta_', 'feature_log_prob_'):
+        value = getattr(model, attr, None)
+        if value is not None and hasattr(value, 'dtype'):
+            return str(value.dtype)
+    return "-"
+
+def measure_fit(name, X_train, X_test, y_train, y_test, model_params):
+    """グリッドの最初のパラメータでモデルを学習し、学習時間・学習中のメモリの最大値・F1スコアを計測する"""
+    import tracemalloc
+    from sklearn.metrics import f1_score
+    from compare_features_and_models import create_model, build_param_grids, is_sparse
+    from reduce_features import first_params
+    sparse = is_sparse(X_train)
+    _, param_grid = build_param_grids(model_params, sparse)[name]
+    model = create_model(name, sparse).set_params(**first_params(param_grid))
+    tracemalloc.start()
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    y_pred = model.predict(X_test)
+    f1 = f1_score(y_test, y_pred, average='weighted', zero_division=1)
+    return {'fit_sec': fit_time, 'fit_peak_mb': peak / 2**20, 'f1_score': f1, 'model_dtype': fitted_dtype(model)}
+
+def dtype_report(dataset, feature_name, config, dtypes=DTYPES):
+    """数値型ごとに、行列のメモリとモデルごとの学習時間・学習中のメモリ・F1スコアを計測する
+
+    Returns:
+        list: 行ごとの辞書（feature, dtype, matrix_mb, model, fit_sec, fit_peak_mb, f1_score, model_dtype）
+    """
+    from compare_features_and_models import get_enabled_models
+    X_train, X_test, y_train, y_test = dataset
+    model_params = config.get_model_params()
+    rows = []
+    print(f"\n=== 数値型の比較: {feature_name}（学習 {X_train.shape[0]}件, 評価 {X_test.shape[0]}件） ===")
+    print(f"{'型':<8} {'行列':>9} {'モデル':<20} {'学習時間':>10} {'学習中の最大':>12} {'F1':>8} {'モデル内部'}")
+    for dtype in dtypes:
+        # 比較のため、設定の型と異なる場合も表示せずに変換する
+        X_tr, X_te = X_train.astype(dtype), X_test.astype(dtype)
+        matrix_mb = (matrix_nbytes(X_tr) + matrix_nbytes(X_te)) / 2**20
+        for name in get_enabled_models(config):
+            result = measure_fit(name, X_tr, X_te, y_train, y_test, model_params)
+            rows.append({'feature': feature_name, 'dtype': dtype, 'matrix_mb': round(matrix_mb, 3), 'model': name,
+                         'fit_sec': round(result['fit_sec'], 4), 'fit_peak_mb': round(result['fit_peak_mb'], 3),
+                         'f1_score': round(result['f1_score'], 4), 'model_dtype': result['model_dtype']})
+            print(f"{dtype:<8} {matrix_mb:>7.2f}MB {name:<20} {result['fit_sec']:>9.2f}秒 "
+                  f"{result['fit_peak_mb']:>10.2f}MB {result['f1_score']:>8.4f} {result['model_dtype']}")
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='保存済みの特徴量で float32 と float64 のメモリ・学習時間・F1スコアを比較します')
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--features', help='比較する特徴量（カンマ区切り、設定ファイルの値を上書き）')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from config_loader import ConfigLoader
+    from compare_features_and_models import (load_labels, resolve_labels, load_feature_set, split_dataset,
+                                             get_feature_dirs)
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    params = get_dtype_params(config)
+    features = args.features.split(',') if args.features else params["report_features"]
+
+    # 入出力パスの設定（特徴量の一覧は評価と同じ）
+    labels_file = Path(paths["input"]["labels_file"])
+    results_dir = Path(paths["output"]["results"]["evaluation"])
+    feature_dirs = get_feature_dirs(config)
+    unknown = [feature for feature in features if feature not in feature_dirs]
+    if unknown:
+        parser.error(f"未知の特徴量です: {', '.join(unknown)}（{', '.join(feature_dirs)}）")
+    results_dir.mkdir(parents=True, exist_ok=True)
+    labels = load_labels(labels_file)
+
+    rows = []
+    for feature_name in features:
+        feature_dir, texts_dir, _ = feature_dirs[feature_name]
+        if not feature_dir.exists():
+            print(f"警告: {feature_dir}が存在しません。{feature_name}は比較しません。")
+            continue
+        X, filenames = load_feature_set(feature_dir)
+        dataset = split_dataset(X, filenames, feature_name, resolve_labels(labels, texts_dir))
+        if dataset is None:
+            continue
+        rows.extend(dtype_report(dataset, feature_name, config))
+
+    if not rows:
+        print("エラー: 比較できる特徴量がありません。")
+        return
+    report_file = results_dir / 'dtype_report.csv'
+    pd.DataFrame(rows).to_csv(report_file, index=False)
+    print(f"\n比較結果を {report_file} に保存しました")
+
+if __name__ == "__main__":
+    main()
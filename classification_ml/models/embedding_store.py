@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+単語ベクトルを量子化して保持する埋め込みストア（int8のスカラー量子化・直積量子化）
+- int8: 単語ごとのスケールと int8 の符号（float32 の約1/4）
+- pq: 次元を部分ベクトルに分け、部分空間ごとのコードブック（k-means の重心）の番号を uint8 で保持
+- 類似度の計算と文書ベクトルへの集約は、単語ベクトル全体を float32 に戻さずに符号のまま行う
+- 単体で実行すると、メモリの削減量と類似語・メール分類の精度がどれだけ保たれるかを比較する
+"""
+
+import time
+import random
+import argparse
+from pathlib import Path
+
+STORE_METHODS = ('int8', 'pq')
+
+# 量子化した単語ベクトルの保存ファイル（method ごとに1ファイル）
+STORE_FILE = "word2vec_{method}.npz"
+
+DEFAULT_STORE_PARAMS = {
+    "methods": list(STORE_METHODS),
+    "pq_subvectors": 20,
+    "pq_centroids": 256,
+    "pq_train_sample": 100000,
+    "similarity_queries": 100,
+    "top_k": 10
+}
+
+class QuantizedEmbeddings:
+    """量子化した単語ベクトル（語彙・出現回数・符号・復元用のパラメータ）"""
+
+    def __init__(self, method, keys, counts, arrays):
+        import numpy as np
+        if method not in STORE_METHODS:
+            raise ValueError(f"未知の量子化の方法です: {method}")
+        self.method = method
+        self.index_to_key = list(keys)
+        self.key_to_index = {key: i for i, key in enumerate(self.index_to_key)}
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.arrays = arrays
+        # 近似コサイン類似度用の、復元したベクトルのノルム
+        self.norms = self._norms()
+
+    @classmethod
+    def from_keyed_vectors(cls, wv, method, store_params=None):
+        """gensim の KeyedVectors から量子化したストアを作る"""
+        import numpy as np
+        params = {**DEFAULT_STORE_PARAMS, **(store_params or {})}
+        vectors = np.asarray(wv.vectors, dtype=np.float32)
+        if method == 'int8':
+            arrays = quantize_int8(vectors)
+        else:
+            arrays = train_product_quantizer(vectors, params["pq_subvectors"], params["pq_centroids"],
+                                             params["pq_train_sample"])
+        counts = [wv.get_vecattr(key, 'count') for key in wv.index_to_key]
+        return cls(method, wv.index_to_key, counts, arrays)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        with np.load(path) as data:
+            method = str(data["method"])
+            arrays = {name: data[name] for name in data.files if name not in ("method", "keys", "counts")}
+            return cls(method, data["keys"].tolist(), data["counts"], arrays)
+
+    def save(self, path):
+        import numpy as np
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, method=np.array(self.method), keys=np.array(self.index_to_key),
+                 counts=self.counts, **self.arrays)
+
+    def __len__(self):
+        return len(self.index_to_key)
+
+    @property
+    def vector_size(self):
+        if self.method == 'int8':
+            return self.arrays["codes"].shape[1]
+        codebooks = self.arrays["codebooks"]
+        return codebooks.shape[0] * codebooks.shape[2]
+
+    @property
+    def nbytes(self):
+        """単語ベクトルの保持に使うバイト数（符号・スケール・コードブック・ノルム）"""
+        return sum(array.nbytes for array in self.arrays.values()) + self.norms.nbytes
+
+    def _norms(self):
+        """復元したベクトルのノルム（全単語を float32 に戻さずに計算）"""
+        import numpy as np
+        if self.method == 'int8':
+            squared = np.concatenate([np.einsum('ij,ij->i', block, block)
+                                      for block in self._blocks()] or [np.zeros(0)])
+            return (np.sqrt(squared) * self.arrays["scales"]).astype(np.float32)
+        # 部分空間ごとの重心のノルムの2乗を符号で引いて足し合わせる
+        codebooks = self.arrays["codebooks"]
+        centroid_squared = np.einsum('mkd,mkd->mk', codebooks, codebooks)
+        squared = np.zeros(len(self), dtype=np.float32)
+        for m in range(codebooks.shape[0]):
+            squared += centroid_squared[m][self.arrays["codes"][:, m]]
+        return np.sqrt(squared)
+
+    def _blocks(self, block_size=65536):
+        """int8 の符号を block_size 語ずつ float32 にして返す（一時的なメモリを一定に保つ）"""
+        import numpy as np
+        codes = self.arrays["codes"]
+        for start in range(0, len(codes), block_size):
+            yield codes[start:start + block_size].astype(np.float32)
+
+    def reconstruct(self, indices=None):
+        """符号から float32 のベクトルを復元する（indices 省略時は全単語）"""
+        import numpy as np
+        if self.method == 'int8':
+            codes = self.arrays["codes"] if indices is None else self.arrays["codes"][indices]
+            scales = self.arrays["scales"] if indices is None else self.arrays["scales"][indices]
+            return codes.astype(np.float32) * scales[:, None]
+        codes = self.arrays["codes"] if indices is None else self.arrays["codes"][indices]
+        codebooks = self.arrays["codebooks"]
+        return np.concatenate([codebooks[m][codes[:, m]] for m in range(codebooks.shape[0])], axis=1)
+
+    def dot(self, query):
+        """全単語と float32 のベクトルとの内積（符号のまま計算）"""
+        import numpy as np
+        query = np.asarray(query, dtype=np.float32)
+        if self.method == 'int8':
+            scores = np.concatenate([block @ query for block in self._blocks()])
+            return scores * self.arrays["scales"]
+        # 部分空間ごとに「重心 × 問い合わせ」の表を作り、符号で引いて足し合わせる
+        codebooks = self.arrays["codebooks"]
+        n_sub, _, sub_dim = codebooks.shape
+        tables = np.einsum('mkd,md->mk', codebooks, query.reshape(n_sub, sub_dim))
+        codes = self.arrays["codes"]
+        scores = np.zeros(len(self), dtype=np.float32)
+        for m in range(n_sub):
+            scores += tables[m][codes[:, m]]
+        return scores
+
+    def most_similar(self, key, topn=10):
+        """近似コサイン類似度の上位 topn 語（key 自身は除く）"""
+        import numpy as np
+        index = self.key_to_index[key]
+        query = self.reconstruct([index])[0]
+        scores = self.dot(query) / np.maximum(self.norms * self.norms[index], 1e-12)
+        scores[index] = -np.inf
+        top = np.argpartition(-scores, min(topn, len(scores) - 1))[:topn]
+        top = top[np.argsort(-scores[top])]
+        return [(self.index_to_key[i], float(scores[i])) for i in top]
+
+    def weighted_sum(self, matrix):
+        """文書×語彙の重み（疎行列）と単語ベクトルの積を符号のまま計算する"""
+        import numpy as np
+        from scipy.sparse import csr_matrix
+        if self.method == 'int8':
+            # 文書に出現する語の列だけを取り出し、スケールを重みに掛けてから int8 の符号との積をとる
+            used = np.unique(matrix.indices)
+            scaled = matrix[:, used].multiply(self.arrays["scales"][used][None, :]).tocsr()
+            return scaled @ self.arrays["codes"][used].astype(np.float32)
+        codebooks = self.arrays["codebooks"]
+        n_sub, n_centroids, sub_dim = codebooks.shape
+        codes = self.arrays["codes"]
+        vocab = np.arange(len(self) + 1)
+        parts = []
+        for m in range(n_sub):
+            # 文書ごとの重心の出現回数（文書×重心）を求めてから重心との積をとる
+            onehot = csr_matrix((np.ones(len(self)), codes[:, m], vocab), shape=(len(self), n_centroids))
+            parts.append((matrix @ onehot) @ codebooks[m])
+        return np.hstack(parts)
+
+    def token_weights(self, method, counts, sif_a=1e-3):
+        """語彙ごとの重み（doc_pooling.token_weights と同じ式、SIFは保存した出現回数を使う）"""
+        from doc_pooling import token_weights
+        if method == 'sif':
+            frequencies = self.counts / self.counts.sum()
+            return sif_a / (sif_a + frequencies)
+        return token_weights(method, counts, None, sif_a)
+
+    def pool(self, docs, method='mean', sif_a=1e-3):
+        """文書ごとのトークンのリストから文書ベクトル（float32）を符号のまま計算する"""
+        import numpy as np
+        from doc_pooling import build_token_index, count_matrix, remove_common_component
+        token_ids, offsets = build_token_index(docs, self.key_to_index)
+        counts = count_matrix(token_ids, offsets, len(self))
+        weights = self.token_weights(method, counts, sif_a)
+        matrix = counts if weights is None else counts.multiply(weights[None, :]).tocsr()
+        totals = np.asarray(matrix.sum(axis=1)).ravel()
+        sums = np.asarray(self.weighted_sum(matrix))
+        nonempty = totals > 0
+        doc_vectors = np.zeros((len(docs), self.vector_size), dtype=np.float32)
+        doc_vectors[nonempty] = sums[nonempty] / totals[nonempty, None]
+        if method == 'sif':
+            doc_vectors = remove_common_component(doc_vectors)
+        return doc_vectors
+
+def quantize_int8(vectors):
+    """単語ごとの最大絶対値で [-127, 127] に量子化する"""
+    import numpy as np
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return {"codes": codes, "scales": scales.astype(np.float32)}
+
+def train_product_quantizer(vectors, n_subvectors, n_centroids, train_sample):
+    """部分空間ごとに k-means でコードブックを学習し、全単語を重心の番号に変換する"""
+    import numpy as np
+    from sklearn.cluster import KMeans
+    n_words, dim = vectors.shape
+    if dim % n_subvectors != 0:
+        raise ValueError(f"次元数（{dim}）が部分ベクトルの数（{n_subvectors}）で割り切れません")
+    n_centroids = min(n_centroids, n_words, 256)   # 番号を uint8 で保持するため256以下
+    sub_dim = dim // n_subvectors
+    rng = np.random.default_rng(42)
+    sample = vectors[rng.choice(n_words, train_sample, replace=False)] if n_words > train_sample else vectors
+    codebooks = np.zeros((n_subvectors, n_centroids, sub_dim), dtype=np.float32)
+    codes = np.zeros((n_words, n_subvectors), dtype=np.uint8)
+    for m in range(n_subvectors):
+        columns = slice(m * sub_dim, (m + 1) * sub_dim)
+        kmeans = KMeans(n_clusters=n_centroids, n_init=1, max_iter=50, random_state=42)
+        kmeans.fit(sample[:, columns])
+        codebooks[m] = kmeans.cluster_centers_
+        codes[:, m] = kmeans.predict(vectors[:, columns])
+    return {"codes": codes, "codebooks": codebooks}
+
+def load_keyed_vectors(model_path):
+    """Word2Vecモデル（または KeyedVectors）を読み込んで単語ベクトルを返す"""
+    from gensim.utils import SaveLoad
+    obj = SaveLoad.load(str(model_path))
+    return getattr(obj, 'wv', obj)
+
+def neighbor_recall(wv, store, queries, top_k):
+    """類似語の上位 top_k 語のうち、量子化前と同じ語の割合（平均）"""
+    import numpy as np
+    vectors = np.asarray(wv.vectors, dtype=np.float32)
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    recalls = []
+    for key in queries:
+        index = wv.key_to_index[key]
+        scores = unit @ unit[index]
+        scores[index] = -np.inf
+        exact = set(np.argpartition(-scores, top_k)[:top_k])
+        approx = {store.key_to_index[word] for word, _ in store.most_similar(key, top_k)}
+        recalls.append(len(exact & approx) / top_k)
+    return float(np.mean(recalls))
+
+def compare_stores(wv, docs, filenames, label_map, config, store_params, pooling, sif_a):
+    """float32 と量子化したストアで、メモリ・類似語の一致率・文書ベクトルの誤差・分類のF1スコアを比較する
+
+    Returns:
+        tuple: (行ごとの辞書のリスト, method -> ストア)
+    """
+    import numpy as np
+    from doc_pooling import pool_documents
+    from compare_features_and_models import split_dataset, get_enabled_models
+    from reduce_features import fit_and_score
+    model_params = config.get_model_params()
+    models = get_enabled_models(config)
+
+    baseline_bytes = wv.vectors.astype(np.float32).nbytes
+    top_k = min(store_params["top_k"], len(wv) - 1)
+    random.seed(42)
+    queries = random.sample(wv.index_to_key, min(store_params["similarity_queries"], len(wv)))
+
+    def evaluate(doc_vectors):
+        dataset = split_dataset(doc_vectors, filenames, "Word2Vec", label_map)
+        if dataset is None:
+            return {}
+        return {name: fit_and_score(name, *dataset, model_params)[1] for name in models}
+
+    start = time.perf_counter()
+    exact_vectors = pool_documents(docs, wv, pooling, sif_a)
+    exact_time = time.perf_counter() - start
+    exact_f1 = evaluate(exact_vectors)
+    rows = [{'method': 'float32', 'memory_mb': baseline_bytes / 2**20, 'compression': 1.0, 'build_sec': 0.0,
+             'pool_sec': exact_time, 'neighbor_recall': 1.0, 'doc_vector_error': 0.0,
+             **{f'f1_{name}': f1 for name, f1 in exact_f1.items()}}]
+
+    stores = {}
+    for method in store_params["methods"]:
+        start = time.perf_counter()
+        store = QuantizedEmbeddings.from_keyed_vectors(wv, method, store_params)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        doc_vectors = store.pool(docs, pooling, sif_a)
+        pool_time = time.perf_counter() - start
+        # 文書ベクトルの相対誤差（量子化前の文書ベクトルとの差のノルム / 元のノルム）
+        error = np.linalg.norm(doc_vectors - exact_vectors) / max(np.linalg.norm(exact_vectors), 1e-12)
+        f1 = evaluate(doc_vectors)
+        rows.append({'method': method, 'memory_mb': store.nbytes / 2**20,
+                     'compression': baseline_bytes / store.nbytes, 'build_sec': build_time,
+                     'pool_sec': pool_time, 'neighbor_recall': neighbor_recall(wv, store, queries, top_k),
+                     'doc_vector_error': float(error), **{f'f1_{name}': value for name, value in f1.items()}})
+        stores[method] = store
+    return rows, stores
+
+def print_report(rows, models, top_k):
+    """メモリ・精度の比較を表示する（F1の保持率は float32 に対するモデル平均の比）"""
+    baseline = rows[0]
+    base_f1 = sum(baseline.get(f'f1_{name}', 0.0) for name in models) / max(len(models), 1)
+    print(f"\n=== 埋め込みストアの比較（類似語は上位{top_k}語の一致率） ===")
+    print(f"{'方法':<8} {'メモリ':>10} {'圧縮率':>7} {'作成':>8} {'集約':>8} {'類似語':>7} {'誤差':>7} "
+          + " ".join(f"{name[:12]:>12}" for name in models) + f" {'F1保持率':>8}")
+    for row in rows:
+        mean_f1 = sum(row.get(f'f1_{name}', 0.0) for name in models) / max(len(models), 1)
+        row['f1_retained'] = mean_f1 / base_f1 if base_f1 else 0.0
+        print(f"{row['method']:<8} {row['memory_mb']:>8.2f}MB {row['compression']:>6.1f}倍 "
+              f"{row['build_sec']:>7.2f}秒 {row['pool_sec']:>7.3f}秒 {row['neighbor_recall']:>7.3f} "
+              f"{row['doc_vector_error']:>7.4f} "
+              + " ".join(f"{row.get(f'f1_{name}', 0.0):>12.4f}" for name in models)
+              + f" {row['f1_retained']:>7.1%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='単語ベクトルを量子化し、メモリの削減量と分類精度の保持率を比較します')
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--model', help='Word2Vecモデルのパス（省略時は output.word2vec.model_path）')
+    parser.add_argument('--methods', help='量子化の方法（カンマ区切り: int8,pq、設定ファイルの値を上書き）')
+    parser.add_argument('--save', action='store_true', help='量子化したストアを文書ベクトルと同じディレクトリに保存する')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from config_loader import ConfigLoader
+    from generate_word2vec import read_tokenized_docs
+    from compare_features_and_models import load_labels, resolve_labels, get_enabled_models
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    word2vec_params = config.get_word2vec_params()
+    store_params = {**DEFAULT_STORE_PARAMS, **config.get_embedding_store_params()}
+    if args.methods:
+        store_params["methods"] = args.methods.split(',')
+    unknown = [method for method in store_params["methods"] if method not in STORE_METHODS]
+    if unknown:
+        parser.error(f"未知の量子化の方法です: {', '.join(unknown)}")
+
+    # 入出力パスの設定
+    data_source = paths["input"]["data_source"]
+    input_dir = Path(paths["input"]["data_paths"][data_source].replace("*.txt", ""))
+    labels_file = Path(paths["input"]["labels_file"])
+    model_path = Path(args.model or paths["output"]["word2vec"]["model_path"])
+    vectors_dir = Path(paths["output"]["word2vec"]["vectors_path"])
+    results_dir = Path(paths["output"]["results"]["evaluation"])
+    results_dir.mkdir(parents=True, exist_ok=True)
+    if not model_path.exists():
+        raise FileNotFoundError(f"Word2Vecモデルが見つかりません: {model_path}（先に generate_word2vec.py を実行してください）")
+
+    wv = load_keyed_vectors(model_path)
+    docs, filenames = read_tokenized_docs(input_dir)
+    if not docs:
+        raise ValueError("テキストファイルが見つからないか、すべてが空です")
+    label_map = resolve_labels(load_labels(labels_file), input_dir)
+    print(f"\n単語ベクトル: {model_path}（{len(wv)}語 × {wv.vector_size}次元）")
+
+    rows, stores = compare_stores(wv, docs, filenames, label_map, config, store_params,
+                                  word2vec_params.get("pooling", "mean"), word2vec_params.get("sif_a", 1e-3))
+    print_report(rows, get_enabled_models(config), min(store_params["top_k"], len(wv) - 1))
+
+    report_file = results_dir / 'embedding_store_report.csv'
+    pd.DataFrame(rows).round(4).to_csv(report_file, index=False)
+    print(f"\n比較結果を {report_file} に保存しました")
+
+    if args.save:
+        for method, store in stores.items():
+            path = vectors_dir / STORE_FILE.format(method=method)
+            store.save(path)
+            print(f"量子化したストアを保存しました: {path}（{path.stat().st_size / 2**20:.2f}MB）")
+
+if __name__ == "__main__":
+    main()
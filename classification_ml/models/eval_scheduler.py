@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+特徴量 × モデルの評価（パラメータ探索と評価）をCPUの予算内で並列に実行するスケジューラ
+- 分割済みの特徴量行列は共有メモリに1回だけ置き、ワーカープロセスはコピーせずに参照する
+- 同時に実行するジョブ数 × 各ジョブの探索の並列数 が予算（model_params.parallel.workers）を超えないようにする
+  （各ジョブの BLAS・OpenMP のスレッド数も探索の並列数に制限する）
+- 探索結果のキャッシュのキーに使う学習データのハッシュは、特徴量ごとに親プロセスで1回だけ計算してワーカーに渡す
+- 時間のかかるジョブから順に開始し、全体の時間を最も遅いジョブの時間に近づける
+"""
+
+import os
+import time
+from pathlib import Path
+
+DEFAULT_PARALLEL_PARAMS = {
+    "enabled": True,
+    "workers": 0
+}
+
+def get_parallel_params(model_params):
+    """並列評価の設定（model_params.parallel、未設定の項目は既定値）"""
+    return {**DEFAULT_PARALLEL_PARAMS, **model_params.get("parallel", {})}
+
+def worker_budget(model_params):
+    """評価に使うCPU数（parallel.workers、0 の場合はCPU数）"""
+    return get_parallel_params(model_params)["workers"] or os.cpu_count() or 1
+
+def plan_workers(budget, n_jobs):
+    """(同時に実行するジョブ数, 各ジョブの探索の並列数) を決める（積が予算を超えないようにする）"""
+    concurrency = max(1, min(budget, n_jobs))
+    return concurrency, max(1, budget // concurrency)
+
+# ---------------------------------------------------------------------------
+# 共有メモリ上の特徴量行列
+# ---------------------------------------------------------------------------
+
+def share_array(array, blocks):
+    """配列を共有メモリにコピーし、ワーカーで参照するための情報を返す（blocks に共有メモリを追加）"""
+    import numpy as np
+    from multiprocessing.shared_memory import SharedMemory
+    array = np.ascontiguousarray(array)
+    shm = SharedMemory(create=True, size=max(1, array.nbytes))
+    blocks.append(shm)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return {"name": shm.name, "shape": array.shape, "dtype": str(array.dtype)}
+
+def attach_array(handle, blocks):
+    """共有メモリ上の配列をコピーせずに参照する（削除は作成したプロセスが行う）"""
+    import numpy as np
+    from multiprocessing.shared_memory import SharedMemory
+    shm = SharedMemory(name=handle["name"])
+    blocks.append(shm)
+    return np.ndarray(handle["shape"], dtype=handle["dtype"], buffer=shm.buf)
+
+def share_matrix(X, blocks):
+    """密行列はそのまま、疎行列は CSR の data・indices・indptr を共有メモリに置く"""
+    from scipy.sparse import issparse
+    if issparse(X):
+        X = X.tocsr()
+        return {"format": "csr", "shape": X.shape,
+                "parts": [share_array(part, blocks) for part in (X.data, X.indices, X.indptr)]}
+    return {"format": "dense", "array": share_array(X, blocks)}
+
+def attach_matrix(handle, blocks):
+    from scipy.sparse import csr_matrix
+    if handle["format"] == "csr":
+        data, indices, indptr = (attach_array(part, blocks) for part in handle["parts"])
+        return csr_matrix((data, indices, indptr), shape=handle["shape"], copy=False)
+    return attach_array(handle["array"], blocks)
+
+def share_datasets(datasets, blocks):
+    """特徴量ごとの (X_train, X_test, y_train, y_test) の行列を共有メモリに置く（ラベルはそのまま渡す）"""
+    return {feature_name: (share_matrix(X_train, blocks), share_matrix(X_test, blocks), y_train, y_test)
+            for feature_name, (X_train, X_test, y_train, y_test) in datasets.items()}
+
+# ---------------------------------------------------------------------------
+# ワーカー
+# ---------------------------------------------------------------------------
+
+# ワーカープロセスごとの設定
+_worker_state = {}
+
+def _init_worker(shared, model_params, cache_dir, n_jobs, data_keys):
+    _worker_state.update(shared=shared, model_params=model_params, cache_dir=cache_dir,
+                         n_jobs=n_jobs, data_keys=data_keys)
+
+def _evaluate_job(feature_name, name, blocks):
+    from threadpoolctl import threadpool_limits
+    from compare_features_and_models import tune_model, evaluate_model
+    X_train, X_test, y_train, y_test = _worker_state["shared"][feature_name]
+    X_train, X_test = attach_matrix(X_train, blocks), attach_matrix(X_test, blocks)
+    n_jobs = _worker_state["n_jobs"]
+    with threadpool_limits(limits=n_jobs):
+        model, search = tune_model(name, X_train, y_train, _worker_state["model_params"],
+                                   _worker_state["cache_dir"], n_jobs=n_jobs, verbose=0,
+                                   data_key=_worker_state["data_keys"].get(feature_name))
+        result = evaluate_model(model, X_train, X_test, y_train, y_test, name, feature_name, fit=False)
+    result['search'] = search
+    return result
+
+def _run_job(feature_name, name):
+    """1つの (特徴量, モデル) のパラメータ探索と評価（ワーカープロセスで実行）
+
+    共有メモリはジョブごとに参照し、ジョブが終わったら閉じる（削除は親プロセスが行う）
+    """
+    start = time.perf_counter()
+    blocks = []
+    try:
+        result = _evaluate_job(feature_name, name, blocks)
+    finally:
+        # 共有メモリを参照する配列は _evaluate_job の終了で解放されている
+        for shm in blocks:
+            shm.close()
+    result['job_time'] = time.perf_counter() - start
+    return result
+
+# ---------------------------------------------------------------------------
+# スケジューラ
+# ---------------------------------------------------------------------------
+
+def estimate_costs(jobs, datasets, model_params, history_file=None):
+    """ジョブごとの時間の見積もり（秒）
+
+    前回の探索時間（search_history.csv）を使い、記録がないジョブは 学習回数 × 行列のサイズ に
+    記録から求めた 1回の学習・1バイトあたりの秒数（同じモデルの記録の中央値、なければ全体の中央値）を掛けて秒に換算する。
+    記録が全くない場合は全てのジョブを 学習回数 × 行列のサイズ の相対値で比べる（単位は混ぜない）
+    """
+    from statistics import median
+    from compare_features_and_models import build_param_grids, is_sparse
+    from search_strategies import count_candidates, family_settings
+    from dtype_policy import matrix_nbytes
+    sizes = {feature_name: max(1, matrix_nbytes(datasets[feature_name][0])) for feature_name, _ in jobs}
+    work = {}
+    for feature_name, name in jobs:
+        _, param_grid = build_param_grids(model_params, is_sparse(datasets[feature_name][0]))[name]
+        cv = family_settings(model_params, name)["cv"]
+        work[(feature_name, name)] = count_candidates(param_grid) * cv * sizes[feature_name]
+    previous, rates = {}, {}
+    if history_file is not None and Path(history_file).exists():
+        import pandas as pd
+        history = pd.read_csv(history_file)
+        history = history[~history['cached'].astype(bool)]
+        for row in history.itertuples():
+            previous[(row.feature, row.model)] = row.search_sec
+            # 今回の特徴量行列のサイズで、記録の学習回数あたりの秒数を1バイトあたりに換算する
+            if row.feature in sizes and row.n_fits > 0:
+                rates.setdefault(row.model, []).append(row.search_sec / (row.n_fits * sizes[row.feature]))
+    if not rates:
+        return work
+    overall_rate = median(rate for model_rates in rates.values() for rate in model_rates)
+    costs = {}
+    for job in jobs:
+        if job in previous:
+            costs[job] = previous[job]
+        else:
+            model_rates = rates.get(job[1])
+            costs[job] = work[job] * (median(model_rates) if model_rates else overall_rate)
+    return costs
+
+def run_schedule(datasets, config):
+    """全ての (特徴量, モデル) のジョブを並列に実行する
+
+    Args:
+        datasets (dict): 特徴量名 -> 分割済みの (X_train, X_test, y_train, y_test)
+        config (ConfigLoader): 設定
+    Returns:
+        list: 評価結果（特徴量・モデルの順、各結果の job_time はジョブの実行時間）
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from compare_features_and_models import get_enabled_models
+    from fit_cache import get_cache_dir
+    from reduce_features import fingerprint
+    model_params = config.get_model_params()
+    models = get_enabled_models(config)
+    jobs = [(feature_name, name) for feature_name in datasets for name in models]
+    if not jobs:
+        return []
+    budget = worker_budget(model_params)
+    concurrency, n_jobs = plan_workers(budget, len(jobs))
+    results_dir = Path(config.get_paths()["output"]["results"]["evaluation"])
+    costs = estimate_costs(jobs, datasets, model_params, results_dir / 'search_history.csv')
+    cache_dir = get_cache_dir(config)
+    cache_dir = cache_dir.resolve() if cache_dir is not None else None
+    data_keys = {}
+    if cache_dir is not None:
+        data_keys = {feature_name: fingerprint(X_train, y_train)
+                     for feature_name, (X_train, _, y_train, _) in datasets.items()}
+
+    print(f"\n=== 並列評価: {len(jobs)}ジョブ（同時に {concurrency}ジョブ × 探索の並列数 {n_jobs}、予算 {budget}CPU） ===")
+    start = time.perf_counter()
+    blocks = []
+    results = {}
+    try:
+        shared = share_datasets(datasets, blocks)
+        shared_mb = sum(shm.size for shm in blocks) / 2**20
+        print(f"共有メモリ: {len(blocks)}ブロック, {shared_mb:.1f}MB")
+        with ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker,
+                                 initargs=(shared, model_params, cache_dir, n_jobs, data_keys)) as executor:
+            # 時間のかかるジョブから順に投入する
+            ordered = sorted(jobs, key=lambda job: costs[job], reverse=True)
+            futures = {executor.submit(_run_job, *job): job for job in ordered}
+            for done, future in enumerate(as_completed(futures), 1):
+                feature_name, name = futures[future]
+                result = future.result()
+                results[(feature_name, name)] = result
+                source = "キャッシュ" if result['search']['cached'] else f"{result['search']['strategy']}"
+                print(f"[{done}/{len(jobs)}] {feature_name} + {name}: CVスコア {result['search']['best_score']:.4f}, "
+                      f"F1スコア {result['f1_score']:.4f}（{result['job_time']:.2f}秒, {source}）")
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    wall_time = time.perf_counter() - start
+    job_times = [result['job_time'] for result in results.values()]
+    print(f"\n並列評価の時間: {wall_time:.2f}秒（ジョブの合計 {sum(job_times):.2f}秒, 最も遅いジョブ {max(job_times):.2f}秒）")
+    return [results[job] for job in jobs]
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+パラメータ探索の結果（学習済みのモデルと交差検証のスコア）をファイルにキャッシュするモジュール
+- キーは学習データ（特徴量行列と分割後のラベル）のハッシュ・モデル・探索の設定・scikit-learn のバージョン
+- 特徴量・分割・パラメータが変わらなければ、再実行時は探索も学習もせずに読み込むだけになる
+"""
+
+import os
+import json
+import pickle
+import hashlib
+from pathlib import Path
+from datetime import datetime
+
+DEFAULT_CACHE_PATH = "fit_cache"
+
+def get_cache_dir(config):
+    """探索結果を保存するディレクトリ（model_params.fit_cache が false の場合は None）"""
+    if not config.get_model_params().get("fit_cache", True):
+        return None
+    output = config.get_paths()["output"]
+    return Path(output.get("fit_cache", {}).get("cache_path", DEFAULT_CACHE_PATH))
+
+def fit_key(name, estimator, search_params, X_train, y_train, data_key=None):
+    """学習データ・モデル（既定のパラメータを含む）・探索の設定から決まるキャッシュのキー
+
+    data_key に計算済みの学習データのハッシュ（reduce_features.fingerprint）を渡した場合は計算し直さない
+    """
+    import sklearn
+    from reduce_features import fingerprint
+    spec = {
+        "model": name,
+        "estimator": type(estimator).__name__,
+        "defaults": estimator.get_params(),
+        "search": search_params,
+        "data": data_key or fingerprint(X_train, y_train),
+        "sklearn": sklearn.__version__
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=repr).encode("utf-8")).hexdigest()[:16]
+
+def cache_file(cache_dir, name, key):
+    return Path(cache_dir) / f"{name}_{key}.pkl"
+
+def load_fit(cache_dir, name, key):
+    """キャッシュ済みの探索結果を読み込む（ない場合・読み込めない場合は None）
+
+    Returns:
+        dict: estimator（学習済みのモデル）, best_params, best_score, cv_results, search_time, created_at
+    """
+    path = cache_file(cache_dir, name, key)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+        print(f"警告: 探索結果のキャッシュを読み込めません（探索し直します）: {path}（{e}）")
+        return None
+
+def save_fit(cache_dir, name, key, entry):
+    """探索結果を保存する（複数のワーカーが同時に書いても壊れないよう、一時ファイルから置き換える）"""
+    path = cache_file(cache_dir, name, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump({**entry, "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, f)
+    os.replace(tmp_path, path)
+
+def search_entry(search, search_time):
+    """学習済みの探索（GridSearchCV など）からキャッシュに保存する内容を取り出す"""
+    return {
+        "estimator": search.best_estimator_,
+        "best_params": search.best_params_,
+        "best_score": float(search.best_score_),
+        "cv_results": {"params": list(search.cv_results_["params"]),
+                       "mean_test_score": [float(score) for score in search.cv_results_["mean_test_score"]]},
+        "search_time": search_time
+    }
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+マスク処理済みのメール本文から文字n-gramのハッシュ特徴量を生成して特徴量ディレクトリに保存
+（形態素解析・正規化を経由しない）
+"""
+
+from pathlib import Path
+import re
+import json
+import time
+import pickle
+import argparse
+import unicodedata
+from config_loader import ConfigLoader
+from dtype_policy import get_dtype
+
+# 文字n-gram特徴量の保存ファイル（圧縮したCSR形式の疎行列と、行に対応する文書名）
+CHAR_NGRAM_MATRIX_FILE = "char_ngram_features.npz"
+CHAR_NGRAM_INDEX_FILE = "char_ngram_index.json"
+
+DEFAULT_CHAR_NGRAM_PARAMS = {
+    "data_source": "mask",
+    "ngram_range": [2, 3],
+    "n_features": 2 ** 18,
+    "sublinear_tf": True
+}
+
+def normalize_text(text):
+    """全角・半角の統一（NFKC）と小文字化、連続する空白の圧縮"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+def read_masked_texts(input_dir):
+    """マスク処理済みのテキストファイルを読み込む"""
+    texts = []
+    filenames = []
+    for path in sorted(input_dir.glob("*.txt")):
+        with path.open(encoding="utf-8") as f:
+            text = f.read()
+        if text.strip():
+            texts.append(text)
+            filenames.append(path.stem)
+    return texts, filenames
+
+def build_char_ngram_features(texts, char_ngram_params, dtype="float32"):
+    """文字n-gramのハッシュ特徴量（TF-IDF重み付け、行列の数値型は dtype）を生成する
+
+    Returns:
+        tuple: (特徴量行列（scipy.sparse）, ハッシュ化モデル, TF-IDF変換モデル)
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+    vectorizer = HashingVectorizer(
+        analyzer="char",
+        ngram_range=tuple(char_ngram_params["ngram_range"]),
+        n_features=char_ngram_params["n_features"],
+        preprocessor=normalize_text,
+        alternate_sign=False,   # 出現回数として扱うため非負の値にする
+        norm=None,
+        dtype=dtype
+    )
+    transformer = TfidfTransformer(sublinear_tf=char_ngram_params["sublinear_tf"])
+    X = transformer.fit_transform(vectorizer.transform(texts))
+    return X.tocsr(), vectorizer, transformer
+
+def save_char_ngram_features(X, filenames, vectorizer, transformer, output_dir):
+    """変換モデルと文字n-gram特徴量（疎行列のまま1ファイル）を保存する"""
+    from scipy.sparse import save_npz
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "char_ngram_vectorizer.pkl", "wb") as f:
+        pickle.dump({"vectorizer": vectorizer, "transformer": transformer}, f)
+    save_npz(output_dir / CHAR_NGRAM_MATRIX_FILE, X.tocsr(), compressed=True)
+    index = {"filenames": list(filenames), "shape": list(X.shape)}
+    with (output_dir / CHAR_NGRAM_INDEX_FILE).open("w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+def load_char_ngram_features(feature_dir):
+    """保存済みの文字n-gram特徴量を疎行列のまま読み込む
+
+    Returns:
+        tuple: (特徴量行列（scipy.sparse.csr_matrix）, ファイル名のリスト)
+    """
+    from scipy.sparse import load_npz
+    X = load_npz(feature_dir / CHAR_NGRAM_MATRIX_FILE).tocsr()
+    with (feature_dir / CHAR_NGRAM_INDEX_FILE).open(encoding="utf-8") as f:
+        filenames = json.load(f)["filenames"]
+    if X.shape[0] != len(filenames):
+        raise ValueError(f"{feature_dir}: 行数（{X.shape[0]}）と文書数（{len(filenames)}）が一致しません")
+    return X, filenames
+
+def get_char_ngram_input_dir(config):
+    """文字n-gram特徴量の入力ディレクトリ（char_ngram_params.data_source のパス）"""
+    params = {**DEFAULT_CHAR_NGRAM_PARAMS, **config.get_char_ngram_params()}
+    input_path = config.get_paths()["input"]["data_paths"][params["data_source"]]
+    return Path(input_path.replace("*.txt", ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    char_ngram_params = {**DEFAULT_CHAR_NGRAM_PARAMS, **config.get_char_ngram_params()}
+
+    # 入出力パスの設定
+    input_dir = get_char_ngram_input_dir(config)
+    output_dir = Path(paths["output"]["char_ngram"]["features_path"])
+
+    # マスク処理済みテキストの読み込み
+    texts, filenames = read_masked_texts(input_dir)
+    if not texts:
+        raise ValueError(f"テキストファイルが見つからないか、すべてが空です: {input_dir}")
+
+    # 文字n-gram特徴量の生成
+    X, vectorizer, transformer = build_char_ngram_features(texts, char_ngram_params, get_dtype(config))
+
+    print("\n=== 特徴量情報 ===")
+    print(f"- 入力: {input_dir}")
+    print(f"- n-gramの範囲: {char_ngram_params['ngram_range']}")
+    print(f"- ハッシュの次元数: {X.shape[1]}")
+    print(f"- 文書数: {X.shape[0]}")
+    print(f"- 数値型: {X.dtype}")
+    print(f"- 非ゼロ要素: {X.nnz}")
+
+    save_char_ngram_features(X, filenames, vectorizer, transformer, output_dir)
+
+    print(f"文字n-gram: {X.shape[0]}件の文書ベクトルを生成しました（{time.perf_counter() - start:.2f}秒）")
+
+if __name__ == "__main__":
+    main()
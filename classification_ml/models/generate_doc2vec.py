@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メール形態素データからDoc2Vec文書ベクトルを生成して特徴量ディレクトリに保存
+- モデルは複数のワーカーで学習し、学習の設定が変わるまで（または --retrain 指定時まで）再利用する
+- 文書ベクトルはワーカープロセスでバッチごとに並列に推論（infer_vector）する
+- 推論したベクトルは文書のハッシュ値をキーにキャッシュし、再実行時は推論しない
+"""
+
+from pathlib import Path
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from config_loader import ConfigLoader
+from dtype_policy import get_dtype
+from generate_word2vec import read_tokenized_docs, document_hashes, save_doc_vectors
+
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import text_hash
+
+# モデルの情報（学習時の設定と、推論キャッシュの対応づけに使うモデルID）と推論キャッシュ
+MODEL_INFO_FILE = "doc2vec_model.json"
+INFER_CACHE_FILE = "infer_cache.npz"
+
+DEFAULT_DOC2VEC_PARAMS = {
+    "vector_size": 100,
+    "window": 5,
+    "min_count": 2,
+    "dm": 1,
+    "epochs": 20,
+    "workers": 4,
+    "vector_source": "infer",
+    "infer_epochs": None,
+    "infer_batch_size": 64,
+    "infer_workers": 0
+}
+
+# モデルの学習に関係するパラメータ（変わった場合は学習し直す）
+TRAIN_KEYS = ("vector_size", "window", "min_count", "dm", "epochs")
+
+def train_doc2vec(docs, doc2vec_params):
+    """Doc2Vecモデルを学習する（タグは文書の行番号）"""
+    from gensim.models.doc2vec import Doc2Vec, TaggedDocument
+    tagged = [TaggedDocument(tokens, [i]) for i, tokens in enumerate(docs)]
+    model = Doc2Vec(vector_size=doc2vec_params["vector_size"],
+                    window=doc2vec_params["window"],
+                    min_count=doc2vec_params["min_count"],
+                    dm=doc2vec_params["dm"],
+                    epochs=doc2vec_params["epochs"],
+                    workers=doc2vec_params["workers"],
+                    seed=42)
+    model.build_vocab(tagged)
+    model.train(tagged, total_examples=model.corpus_count, epochs=model.epochs)
+    return model
+
+def model_id_for(hashes, doc2vec_params):
+    """学習に使った文書と設定から決まるモデルID"""
+    train_params = {key: doc2vec_params[key] for key in TRAIN_KEYS}
+    return text_hash(json.dumps([train_params, sorted(hashes)], sort_keys=True))
+
+# 推論用のワーカープロセスごとに1回だけ読み込むモデル
+_worker_model = None
+
+def _init_infer_worker(model_path):
+    global _worker_model
+    from gensim.models.doc2vec import Doc2Vec
+    # 大きな配列はメモリマップで開き、ワーカー間でページを共有する
+    _worker_model = Doc2Vec.load(str(model_path), mmap='r')
+
+def _infer_batch(batch, epochs=None):
+    """ワーカープロセスでバッチ内の文書ベクトルを推論する"""
+    import numpy as np
+    return np.array([_worker_model.infer_vector(tokens, epochs=epochs) for tokens in batch], dtype=np.float32)
+
+def infer_vectors(docs, model_path, doc2vec_params, model=None):
+    """文書ベクトルをバッチごとに並列に推論する
+
+    文書数が1バッチ以下の場合やワーカー数が1の場合は、このプロセスで推論する（model を渡せば読み込まない）
+    """
+    global _worker_model
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+    if not docs:
+        return np.zeros((0, doc2vec_params["vector_size"]), dtype=np.float32)
+    epochs = doc2vec_params.get("infer_epochs")
+    batch_size = doc2vec_params["infer_batch_size"]
+    batches = [docs[i:i + batch_size] for i in range(0, len(docs), batch_size)]
+    workers = min(doc2vec_params["infer_workers"] or os.cpu_count() or 1, len(batches))
+    if workers <= 1 or model_path is None:
+        if model is None:
+            _init_infer_worker(model_path)
+        else:
+            _worker_model = model
+        return np.vstack([_infer_batch(batch, epochs) for batch in batches])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_infer_worker,
+                             initargs=(str(model_path),)) as executor:
+        return np.vstack(list(executor.map(_infer_batch, batches, [epochs] * len(batches))))
+
+def load_infer_cache(output_dir, model_id):
+    """推論キャッシュ（文書のハッシュ値 -> ベクトル）を読み込む（モデルIDが違う場合は空）"""
+    import numpy as np
+    cache_path = output_dir / INFER_CACHE_FILE
+    if not cache_path.exists():
+        return {}
+    with np.load(cache_path) as data:
+        if str(data["model_id"]) != model_id:
+            return {}
+        return dict(zip(data["hashes"].tolist(), data["vectors"]))
+
+def save_infer_cache(output_dir, model_id, cache):
+    import numpy as np
+    hashes = list(cache)
+    vectors = np.array([cache[h] for h in hashes], dtype=np.float32)
+    np.savez(output_dir / INFER_CACHE_FILE, model_id=np.array(model_id), hashes=np.array(hashes), vectors=vectors)
+
+def load_model_info(output_dir):
+    info_path = output_dir / MODEL_INFO_FILE
+    if not info_path.exists():
+        return None
+    with info_path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+def needs_training(info, model_path, doc2vec_params):
+    """保存済みのモデルがない、または学習時の設定が変わった場合は学習し直す"""
+    if info is None or not model_path.exists():
+        return True
+    return any(info["params"].get(key) != doc2vec_params[key] for key in TRAIN_KEYS)
+
+def build_doc2vec_vectors(docs, model_path, output_dir, doc2vec_params, retrain=False, dtype="float32"):
+    """モデルの学習（必要な場合のみ）と、キャッシュを使った文書ベクトルの推論
+
+    推論キャッシュは gensim のベクトルと同じ float32 のまま保存し、返す行列だけを dtype にする
+
+    Returns:
+        tuple: (文書ベクトル行列（数値型は dtype）, 文書ごとのハッシュ値)
+    """
+    import numpy as np
+    from gensim.models.doc2vec import Doc2Vec
+    hashes = document_hashes(docs)
+    info = load_model_info(output_dir)
+
+    model = None
+    if retrain or needs_training(info, model_path, doc2vec_params):
+        print("\nDoc2Vecモデルの学習中...")
+        start = time.perf_counter()
+        model = train_doc2vec(docs, doc2vec_params)
+        print(f"- 学習: {len(docs)}件, {time.perf_counter() - start:.2f}秒（ワーカー {doc2vec_params['workers']}）")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        model.save(str(model_path))
+        info = {"model_id": model_id_for(hashes, doc2vec_params),
+                "params": {key: doc2vec_params[key] for key in TRAIN_KEYS},
+                "trained_docs": hashes,
+                "trained_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        with (output_dir / MODEL_INFO_FILE).open("w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+    else:
+        print(f"\n保存済みのDoc2Vecモデルを使用します: {model_path}（学習日時 {info['trained_at']}）")
+
+    model_id = info["model_id"]
+    cache = load_infer_cache(output_dir, model_id)
+    known = dict(cache)
+
+    # 学習したベクトルを使う場合は、学習に使った文書の推論を省く（キャッシュには推論したベクトルだけを保存）
+    if doc2vec_params["vector_source"] == "trained":
+        if model is None:
+            model = Doc2Vec.load(str(model_path))
+        known.update((h, model.dv[row]) for row, h in enumerate(info["trained_docs"]))
+
+    # キャッシュにない文書だけを推論する（同じ内容の文書は1回だけ）
+    missing = list(dict.fromkeys(h for h in hashes if h not in known))
+    print(f"- 推論: {len(missing)}件（キャッシュ済み・学習済み {len(hashes) - len(missing)}件）")
+    if missing:
+        first_doc = {}
+        for tokens, h in zip(docs, hashes):
+            first_doc.setdefault(h, tokens)
+        start = time.perf_counter()
+        inferred = infer_vectors([first_doc[h] for h in missing], model_path, doc2vec_params, model)
+        elapsed = time.perf_counter() - start
+        print(f"- 推論時間: {elapsed:.2f}秒（{len(missing) / max(elapsed, 1e-9):.1f}件/秒）")
+        cache.update(zip(missing, inferred))
+        known.update(zip(missing, inferred))
+        save_infer_cache(output_dir, model_id, cache)
+
+    vectors = np.array([known[h] for h in hashes], dtype=dtype)
+    return vectors, hashes
+
+def build_doc2vec_in_memory(docs, doc2vec_params, dtype="float32"):
+    """特徴量ディレクトリに保存せずに学習・推論する（run_all.py 用、キャッシュは使わない）"""
+    import tempfile
+    import numpy as np
+    model = train_doc2vec(docs, doc2vec_params)
+    if doc2vec_params["vector_source"] == "trained":
+        return np.array([model.dv[i] for i in range(len(docs))], dtype=dtype)
+    # ワーカープロセスに渡すため、モデルは一時ディレクトリに保存する
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = Path(tmp_dir) / "doc2vec.model"
+        model.save(str(model_path))
+        return infer_vectors(docs, model_path, doc2vec_params, model).astype(dtype, copy=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--retrain', action='store_true', help='保存済みのモデルがあっても学習し直す')
+    args = parser.parse_args(argv)
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    doc2vec_params = {**DEFAULT_DOC2VEC_PARAMS, **config.get_doc2vec_params()}
+
+    # 入出力パスの設定
+    data_source = paths["input"]["data_source"]
+    input_dir = Path(paths["input"]["data_paths"][data_source].replace("*.txt", ""))
+    output_dir = Path(paths["output"]["doc2vec"]["vectors_path"])
+    model_path = Path(paths["output"]["doc2vec"]["model_path"])
+
+    # 文書の読み込み
+    print("形態素解析済みテキストの読み込み中...")
+    docs, filenames = read_tokenized_docs(input_dir)
+    if not docs:
+        raise ValueError("テキストファイルが見つからないか、すべてが空です")
+
+    print("\n=== 特徴量情報 ===")
+    print(f"- 文書数: {len(docs)}件")
+    print(f"- ベクトル次元数: {doc2vec_params['vector_size']}")
+    print(f"- 学習方式: {'PV-DM' if doc2vec_params['dm'] else 'PV-DBOW'}")
+    print(f"- 数値型: {get_dtype(config)}")
+    print(f"- 文書ベクトル: {'学習したベクトル（新しい文書のみ推論）' if doc2vec_params['vector_source'] == 'trained' else '推論'}")
+
+    start = time.perf_counter()
+    vectors, hashes = build_doc2vec_vectors(docs, model_path, output_dir, doc2vec_params, args.retrain,
+                                            get_dtype(config))
+    save_doc_vectors(vectors, filenames, output_dir, hashes, keep=(MODEL_INFO_FILE,))
+
+    print(f"Doc2Vec: {len(vectors)}件の文書ベクトルを生成しました（{time.perf_counter() - start:.2f}秒）")
+
+if __name__ == "__main__":
+    main()
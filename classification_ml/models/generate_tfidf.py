@@ -4,13 +4,28 @@
 メール形態素データからTF-IDF特徴量を生成して特徴量ディレクトリに保存
 """
 
-from sklearn.feature_extraction.text import TfidfVectorizer
 from pathlib import Path
-import numpy as np
 import os
 import json
 import pickle
+import argparse
+from datetime import datetime
 from config_loader import ConfigLoader
+from dtype_policy import get_dtype
+
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import text_hash
+
+# TF-IDF特徴量の保存ファイル（圧縮したCSR形式の疎行列と、行に対応する文書名）
+TFIDF_MATRIX_FILE = "tfidf_features.npz"
+TFIDF_INDEX_FILE = "tfidf_index.json"
+# 差分更新用の状態（文書ごとのハッシュ・語彙ごとの文書頻度・ベクトル化に使ったIDF）
+TFIDF_STATE_FILE = "tfidf_state.json"
+
+# 差分更新で全文書をベクトル化し直すIDFの変化量（語彙全体の平均相対変化）の既定値
+DEFAULT_IDF_DRIFT_THRESHOLD = 0.05
+# 差分更新で全文書をベクトル化し直す、語彙にないトークンの割合の増加（新しい文書の割合 - ベクトル化した文書の割合）の既定値
+DEFAULT_OOV_RATE_THRESHOLD = 0.1
 
 def read_tokenized_docs(input_dir):
     """形態素解析済みのテキストファイルを読み込む"""
@@ -24,36 +39,240 @@ def read_tokenized_docs(input_dir):
                 filenames.append(path.stem)
     return docs, filenames
 
-def main():
+def build_tfidf_features(docs, tfidf_params, dtype="float32"):
+    """TF-IDF特徴量を生成する（行列の数値型は dtype）
+
+    Returns:
+        tuple: (TF-IDF行列（scipy.sparse）, 学習済みのベクトル化モデル)
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(
+        max_features=tfidf_params["max_features"],
+        min_df=tfidf_params["min_df"],
+        max_df=tfidf_params["max_df"],
+        sublinear_tf=True,  # サブリニアTF変換（log(1+tf)）
+        dtype=dtype
+    )
+    
+    # 文書をベクトル化
+    X = vectorizer.fit_transform(docs)
+    return X, vectorizer
+
+def save_tfidf_features(X, filenames, vectorizer, output_dir, state=None):
+    """ベクトル化モデルとTF-IDF特徴量（疎行列のまま1ファイル）を保存する
+
+    state を渡した場合は差分更新用の状態も保存する。渡さない場合は古い状態を削除する
+    （次回の差分更新は全文書のベクトル化になる）
+    """
+    from scipy.sparse import save_npz
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    # ベクトル化モデルを保存
+    with open(output_dir / "tfidf_vectorizer.pkl", "wb") as f:
+        pickle.dump(vectorizer, f)
+    
+    # 以前の形式（文書ごとの密なJSON）と古い状態が残っていれば削除
+    for path in output_dir.glob("*.json"):
+        if path.name != TFIDF_INDEX_FILE:
+            path.unlink()
+    if state is not None:
+        with (output_dir / TFIDF_STATE_FILE).open("w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+    
+    # CSR形式の疎行列を圧縮して保存し、行の順に文書名を記録
+    save_npz(output_dir / TFIDF_MATRIX_FILE, X.tocsr(), compressed=True)
+    index = {"filenames": list(filenames), "shape": list(X.shape)}
+    with (output_dir / TFIDF_INDEX_FILE).open("w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+def load_tfidf_features(feature_dir):
+    """保存済みのTF-IDF特徴量を疎行列のまま読み込む
+
+    Returns:
+        tuple: (TF-IDF行列（scipy.sparse.csr_matrix）, ファイル名のリスト)
+    """
+    from scipy.sparse import load_npz
+    X = load_npz(feature_dir / TFIDF_MATRIX_FILE).tocsr()
+    with (feature_dir / TFIDF_INDEX_FILE).open(encoding="utf-8") as f:
+        filenames = json.load(f)["filenames"]
+    if X.shape[0] != len(filenames):
+        raise ValueError(f"{feature_dir}: 行数（{X.shape[0]}）と文書数（{len(filenames)}）が一致しません")
+    return X, filenames
+
+def compute_idf(df, n_docs):
+    """文書頻度からIDFを計算する（TfidfVectorizer の smooth_idf=True と同じ式）"""
+    import numpy as np
+    return np.log((1 + n_docs) / (1 + np.asarray(df, dtype=np.float64))) + 1
+
+def oov_rate(docs, vectorizer):
+    """語彙にないトークンの割合（ベクトル化と同じ規則で分割する）"""
+    vocabulary = vectorizer.vocabulary_
+    analyze = vectorizer.build_analyzer()
+    tokens = [token for doc in docs for token in analyze(doc)]
+    return sum(1 for token in tokens if token not in vocabulary) / len(tokens) if tokens else 0.0
+
+def build_tfidf_state(X, filenames, docs, vectorizer, history=None):
+    """差分更新用の状態を作る（X はこの vectorizer でベクトル化した全文書の行列）"""
+    return {
+        "documents": {fname: text_hash(doc) for fname, doc in zip(filenames, docs)},
+        "n_docs": X.shape[0],
+        "df": X.tocsc().getnnz(axis=0).tolist(),    # 語彙（列）ごとの文書頻度
+        "fitted_idf": vectorizer.idf_.tolist(),     # 保存済みの行列をベクトル化したときのIDF
+        # ベクトル化した文書の語彙にないトークンの割合（max_features・min_df で除いた語の分、新しい文書の割合と比べる）
+        "fitted_oov_rate": oov_rate(docs, vectorizer),
+        "history": history or []
+    }
+
+def load_tfidf_state(output_dir):
+    """差分更新用の状態を読み込む（ない場合はNone）"""
+    path = output_dir / TFIDF_STATE_FILE
+    if not path.exists():
+        return None
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+def idf_drift(fitted_idf, current_idf):
+    """ベクトル化に使ったIDFと現在の文書頻度から求めたIDFの相対変化
+
+    Returns:
+        tuple: (平均相対変化, 最大相対変化, 語彙ごとの相対変化)
+    """
+    import numpy as np
+    fitted_idf = np.asarray(fitted_idf)
+    change = np.abs(current_idf - fitted_idf) / fitted_idf
+    if change.size == 0:
+        return 0.0, 0.0, change
+    return float(change.mean()), float(change.max()), change
+
+def update_tfidf_incremental(docs, filenames, tfidf_params, output_dir, dtype="float32"):
+    """保存済みの状態に新しい文書だけを追加してベクトル化する
+
+    語彙とIDFは前回の全文書ベクトル化のものを使い、文書頻度だけを更新する。
+    IDFの変化量か、新しい文書の語彙にないトークンの割合の増加がしきい値を超えた場合や、
+    既存の文書が変更・削除された場合は結果をNoneとする
+    （呼び出し側で全文書をベクトル化し直す）
+
+    Returns:
+        tuple: ((TF-IDF行列, ファイル名のリスト, ベクトル化モデル, 状態) または None, 更新履歴)
+    """
+    import numpy as np
+    from scipy.sparse import vstack
+
+    state = load_tfidf_state(output_dir)
+    if state is None or not (output_dir / TFIDF_MATRIX_FILE).exists():
+        print("差分更新: 保存済みの状態がないため、全文書をベクトル化します")
+        return None, []
+    X_old, old_filenames = load_tfidf_features(output_dir)
+    if list(state["documents"]) != old_filenames:
+        print("差分更新: 状態と保存済みの特徴量が一致しないため、全文書をベクトル化します")
+        return None, state["history"]
+
+    # 新しい文書と、変更・削除された既存の文書を調べる
+    hashes = {fname: text_hash(doc) for fname, doc in zip(filenames, docs)}
+    changed = [fname for fname, h in state["documents"].items() if hashes.get(fname, h) != h]
+    removed = [fname for fname in state["documents"] if fname not in hashes]
+    if changed or removed:
+        print(f"差分更新: 既存の文書の変更 {len(changed)}件・削除 {len(removed)}件があるため、全文書をベクトル化します")
+        return None, state["history"]
+    new_indices = [i for i, fname in enumerate(filenames) if fname not in state["documents"]]
+
+    with open(output_dir / "tfidf_vectorizer.pkl", "rb") as f:
+        vectorizer = pickle.load(f)
+    if vectorizer.dtype != np.dtype(dtype):
+        print(f"差分更新: 保存済みの特徴量の数値型（{np.dtype(vectorizer.dtype)}）が設定（{dtype}）と異なるため、全文書をベクトル化します")
+        return None, state["history"]
+    if not new_indices:
+        print("差分更新: 新しい文書はありません")
+        return (X_old, old_filenames, vectorizer, state), state["history"]
+
+    # 新しい文書だけを前回のIDFでベクトル化し、文書頻度を更新する
+    new_docs = [docs[i] for i in new_indices]
+    new_filenames = [filenames[i] for i in new_indices]
+    X_new = vectorizer.transform(new_docs)
+    df = np.asarray(state["df"], dtype=np.int64) + X_new.tocsc().getnnz(axis=0)
+    n_docs = state["n_docs"] + len(new_docs)
+
+    # IDFの変化量
+    current_idf = compute_idf(df, n_docs)
+    mean_drift, max_drift, change = idf_drift(state["fitted_idf"], current_idf)
+    threshold = tfidf_params.get("idf_drift_threshold", DEFAULT_IDF_DRIFT_THRESHOLD)
+
+    # 新しい文書のうち語彙にないトークンの割合（前回ベクトル化した文書の割合からの増加で判定する）
+    new_oov_rate = oov_rate(new_docs, vectorizer)
+    fitted_oov_rate = state.get("fitted_oov_rate")
+    oov_threshold = tfidf_params.get("oov_rate_threshold", DEFAULT_OOV_RATE_THRESHOLD)
+
+    print("\n=== 差分更新 ===")
+    print(f"- 保存済みの文書: {len(old_filenames)}件")
+    print(f"- 新しい文書: {len(new_docs)}件")
+    if fitted_oov_rate is None:
+        print(f"- 語彙にないトークンの割合（新しい文書）: {new_oov_rate:.2%}（ベクトル化した文書の割合の記録なし）")
+    else:
+        print(f"- 語彙にないトークンの割合: 新しい文書 {new_oov_rate:.2%} / ベクトル化した文書 {fitted_oov_rate:.2%}"
+              f"（増加のしきい値 {oov_threshold:.2%}）")
+    print(f"- IDFの変化量: 平均 {mean_drift:.4f} / 最大 {max_drift:.4f}（しきい値 {threshold}）")
+    if change.size:
+        terms = vectorizer.get_feature_names_out()
+        for i in np.argsort(change)[::-1][:5]:
+            if change[i] > 0:
+                print(f"  {terms[i]}: {state['fitted_idf'][i]:.4f} -> {current_idf[i]:.4f}")
+
+    # 割合の記録がない状態（以前の形式）は、記録するために全文書をベクトル化し直す
+    oov_refit = fitted_oov_rate is None or new_oov_rate - fitted_oov_rate > oov_threshold
+    refit = mean_drift > threshold or oov_refit
+    state["history"].append({
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "new_docs": len(new_docs),
+        "n_docs": n_docs,
+        "mean_idf_drift": round(mean_drift, 6),
+        "max_idf_drift": round(max_drift, 6),
+        "oov_rate": round(new_oov_rate, 6),
+        "refit": refit
+    })
+    if refit:
+        if mean_drift > threshold:
+            print("IDFの変化量がしきい値を超えたため、全文書をベクトル化します")
+        else:
+            print("語彙にないトークンの割合の増加がしきい値を超えたため、全文書をベクトル化します（語彙を作り直す）")
+        return None, state["history"]
+
+    X = vstack([X_old, X_new]).tocsr()
+    state["documents"].update({fname: hashes[fname] for fname in new_filenames})
+    state["n_docs"] = n_docs
+    state["df"] = df.tolist()
+    return (X, old_filenames + new_filenames, vectorizer, state), state["history"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--incremental', action='store_true',
+                      help='保存済みの特徴量に新しい文書だけを追加する（IDFの変化が大きい場合は全文書をベクトル化）')
+    args = parser.parse_args(argv)
+    
     # 設定の読み込み
-    config = ConfigLoader()
+    config = ConfigLoader(args.config)
     paths = config.get_paths()
     tfidf_params = config.get_tfidf_params()
+    dtype = get_dtype(config)
     
     # 入出力パスの設定
     data_source = paths["input"]["data_source"]
     input_path = paths["input"]["data_paths"][data_source]
     input_dir = Path(input_path.replace("*.txt", ""))
     output_dir = Path(paths["output"]["tfidf"]["features_path"])
-    output_dir.mkdir(parents=True, exist_ok=True)
     
     # 形態素解析済みテキストの読み込み
     docs, filenames = read_tokenized_docs(input_dir)
     
-    # TF-IDF特徴量の生成
-    vectorizer = TfidfVectorizer(
-        max_features=tfidf_params["max_features"],
-        min_df=tfidf_params["min_df"],
-        max_df=tfidf_params["max_df"],
-        sublinear_tf=True   # サブリニアTF変換（log(1+tf)）
-    )
-    
-    # 文書をベクトル化
-    X = vectorizer.fit_transform(docs)
-    
-    # ベクトル化モデルを保存
-    with open(output_dir / "tfidf_vectorizer.pkl", "wb") as f:
-        pickle.dump(vectorizer, f)
+    # TF-IDF特徴量の生成（差分更新できない場合は全文書をベクトル化）
+    updated, history = None, (load_tfidf_state(output_dir) or {}).get("history", [])
+    if args.incremental:
+        updated, history = update_tfidf_incremental(docs, filenames, tfidf_params, output_dir, dtype)
+    if updated is not None:
+        X, filenames, vectorizer, state = updated
+    else:
+        X, vectorizer = build_tfidf_features(docs, tfidf_params, dtype)
+        state = build_tfidf_state(X, filenames, docs, vectorizer, history)
     
     # 前処理設定と特徴量情報を表示
     print("\n=== 前処理設定 ===")
@@ -62,18 +281,15 @@ def main():
     print("\n=== 特徴量情報 ===")
     print(f"- 特徴量の次元数: {X.shape[1]}")
     print(f"- 文書数: {X.shape[0]}")
+    print(f"- 数値型: {X.dtype}")
+    print(f"- 非ゼロ要素: {X.nnz}（密度 {X.nnz / max(1, X.shape[0] * X.shape[1]):.2%}）")
     
-    # 各文書のTF-IDF特徴量をJSONファイルとして保存
-    for i, fname in enumerate(filenames):
-        # scipy.sparse行列からnumpy配列に変換
-        vec = X[i].toarray()[0]
-        
-        # JSONファイルとして保存
-        outpath = output_dir / f"{fname}.json"
-        with outpath.open("w", encoding="utf-8") as f:
-            json.dump(vec.tolist(), f, ensure_ascii=False, indent=2)
+    save_tfidf_features(X, filenames, vectorizer, output_dir, state)
     
-    print(f"TF-IDF: {X.shape[0]}件の文書ベクトルを生成しました")
+    if updated is not None:
+        print(f"TF-IDF: 差分更新しました（合計 {X.shape[0]}件）")
+    else:
+        print(f"TF-IDF: {X.shape[0]}件の文書ベクトルを生成しました")
 
 if __name__ == "__main__":
     main()
@@ -4,12 +4,26 @@
 メール形態素データからWord2Vec文書ベクトルを生成して特微量ディレクトリに保存
 """
 
-from gensim.models import Word2Vec
 from pathlib import Path
-import numpy as np
 import os
 import json
+import time
+import random
+import argparse
 from config_loader import ConfigLoader
+from dtype_policy import get_dtype, enforce_dtype
+
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import text_hash
+
+# 文書ベクトルの保存ファイル（全文書分の連続した行列（dtype_params.dtype、既定は float32）と、行に対応する文書名）
+DOC_VECTORS_FILE = "doc_vectors.npy"
+DOC_INDEX_FILE = "doc_index.json"
+
+# 更新モードで最初から学習し直す、追加・変更・削除された文書の割合（保存済みの文書数に対する割合）
+DEFAULT_UPDATE_MAX_NEW_RATIO = 0.2
+# 追加学習で単語ベクトルが変わったとみなす相対変化（||新 - 旧|| / ||旧||）
+DEFAULT_UPDATE_VECTOR_TOLERANCE = 0.01
 
 def read_tokenized_docs(input_dir):
     """形態素解析済みのテキストファイルを読み込む"""
@@ -23,23 +37,176 @@ def read_tokenized_docs(input_dir):
                 filenames.append(path.stem)
     return docs, filenames
 
-def compute_doc_vectors(docs, model):
-    """文書ベクトルを計算（単語ベクトルの平均）"""
-    doc_vectors = []
-    for tokens in docs:
-        vectors = [model.wv[token] for token in tokens if token in model.wv]
-        if vectors:
-            vec = np.mean(vectors, axis=0)
-        else:
-            vec = np.zeros(model.vector_size)
-        doc_vectors.append(vec)
-    return np.array(doc_vectors)
-
-def main():
+def compute_doc_vectors(docs, model, word2vec_params=None, dtype="float32"):
+    """文書ベクトルを計算（word2vec_params.pooling の方法で単語ベクトルを集約、数値型は dtype）"""
+    from doc_pooling import pool_documents
+    params = word2vec_params or {}
+    return pool_documents(docs, model.wv, params.get("pooling", "mean"), params.get("sif_a", 1e-3), dtype)
+
+def train_word2vec(docs, word2vec_params):
+    """Word2Vecモデルを学習する"""
+    from gensim.models import Word2Vec
+    model = Word2Vec(min_count=word2vec_params["min_count"],
+                    window=word2vec_params["window"],
+                    vector_size=word2vec_params["vector_size"],
+                    workers=word2vec_params["workers"])
+    
+    # 語彙の構築
+    model.build_vocab(docs)
+    
+    # モデルの学習
+    model.train(docs, total_examples=model.corpus_count, epochs=model.epochs)
+    return model
+
+def document_hashes(docs):
+    """文書ごとのトークン列のハッシュ値（更新モードで変更された文書を調べるのに使う）"""
+    return [text_hash(" ".join(tokens)) for tokens in docs]
+
+def save_doc_vectors(vectors, filenames, output_dir, hashes=None, keep=()):
+    """文書ベクトルを1つの連続した行列（.npy）として保存する（数値型は変換せずにそのまま）
+
+    hashes（文書ごとのハッシュ値のリスト）を渡した場合はインデックスに記録し、更新モードで使う
+    keep には削除しないJSONファイル名（同じディレクトリに置くモデルの情報など）を指定する
+    """
+    import numpy as np
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    # 以前の形式（文書ごとのJSON）が残っていれば削除
+    for path in output_dir.glob("*.json"):
+        if path.name != DOC_INDEX_FILE and path.name not in keep:
+            path.unlink()
+    
+    matrix = np.ascontiguousarray(vectors)
+    np.save(output_dir / DOC_VECTORS_FILE, matrix)
+    index = {"filenames": list(filenames), "shape": list(matrix.shape), "dtype": str(matrix.dtype)}
+    if hashes is not None:
+        index["hashes"] = list(hashes)
+    with (output_dir / DOC_INDEX_FILE).open("w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+def load_doc_vectors(feature_dir, mmap_mode="r"):
+    """保存済みの文書ベクトルを読み込む
+
+    既定ではメモリマップで開くため、ファイル全体をコピーせずに必要なページだけを読み込み、
+    同じファイルを開いた複数のプロセスでページを共有できる
+
+    Returns:
+        tuple: (文書ベクトル行列（保存時の数値型）, ファイル名のリスト)
+    """
+    import numpy as np
+    X = np.load(feature_dir / DOC_VECTORS_FILE, mmap_mode=mmap_mode)
+    with (feature_dir / DOC_INDEX_FILE).open(encoding="utf-8") as f:
+        filenames = json.load(f)["filenames"]
+    if X.shape[0] != len(filenames):
+        raise ValueError(f"{feature_dir}: 行数（{X.shape[0]}）と文書数（{len(filenames)}）が一致しません")
+    return X, filenames
+
+def update_word2vec(docs, filenames, model_path, output_dir, word2vec_params, dtype="float32"):
+    """保存済みのモデルを新しい文書で追加学習し、影響を受けた文書ベクトルだけを計算し直す
+
+    - 新しい文書（追加・変更された文書）のトークンで語彙を拡張する
+    - 学習は新しい文書と、既存の文書から抽出した一部（update_sample_ratio）だけで行う
+    - 文書ベクトルは新しい文書と、追加された語か学習でベクトルが update_vector_tolerance を超えて変わった語を含む
+      既存の文書だけを計算し直す
+    - 追加・変更・削除された文書の割合が update_max_new_ratio を超えた場合は、追加学習では分布の変化に追従できないため
+      最初から学習する
+
+    Returns:
+        tuple: (モデル, 文書ベクトル行列, ファイル名のリスト) または None（保存済みのモデルがない場合、最初から学習する場合）
+    """
+    import numpy as np
+    from gensim.models import Word2Vec
+
+    index_path = output_dir / DOC_INDEX_FILE
+    if not model_path.exists() or not (output_dir / DOC_VECTORS_FILE).exists() or not index_path.exists():
+        print("更新モード: 保存済みのモデルまたは文書ベクトルがないため、最初から学習します")
+        return None
+    with index_path.open(encoding="utf-8") as f:
+        index = json.load(f)
+    if "hashes" not in index:
+        print("更新モード: 文書ベクトルに文書のハッシュ値が記録されていないため、最初から学習します")
+        return None
+
+    old_vectors, old_filenames = load_doc_vectors(output_dir, mmap_mode=None)
+    old_vectors = enforce_dtype(old_vectors, dtype, "保存済みの文書ベクトル")
+    old_rows = {fname: i for i, fname in enumerate(old_filenames)}
+    old_hashes = dict(zip(old_filenames, index["hashes"]))
+    hashes = document_hashes(docs)
+
+    # 追加・変更された文書と、変更のない既存の文書
+    new_indices = [i for i, (fname, h) in enumerate(zip(filenames, hashes)) if old_hashes.get(fname) != h]
+    kept_indices = [i for i, (fname, h) in enumerate(zip(filenames, hashes)) if old_hashes.get(fname) == h]
+    removed = len(set(old_filenames) - set(filenames))
+    print("\n=== 更新モード ===")
+    print(f"- 保存済みの文書: {len(old_filenames)}件")
+    print(f"- 追加・変更された文書: {len(new_indices)}件, 削除された文書: {removed}件")
+    max_new_ratio = word2vec_params.get("update_max_new_ratio", DEFAULT_UPDATE_MAX_NEW_RATIO)
+    new_ratio = (len(new_indices) + removed) / max(1, len(old_filenames))
+    if new_ratio > max_new_ratio:
+        print(f"更新モード: 追加・変更・削除された文書の割合（{new_ratio:.1%}）がしきい値（{max_new_ratio:.1%}）を超えたため、"
+              "最初から学習します")
+        return None
+
+    model = Word2Vec.load(str(model_path))
+    new_docs = [docs[i] for i in new_indices]
+    if new_docs:
+        # 語彙の拡張（min_count は新しい文書の中での出現回数に適用される）
+        vocab_size = len(model.wv)
+        model.build_vocab(new_docs, update=True)
+        print(f"- 語彙: {vocab_size}語 -> {len(model.wv)}語")
+
+        # 新しい文書と、既存の文書の一部だけで追加学習
+        sample_ratio = word2vec_params.get("update_sample_ratio", 0.0)
+        sample_size = min(len(kept_indices), int(len(kept_indices) * sample_ratio))
+        sampled = random.Random(42).sample(kept_indices, sample_size)
+        train_docs = new_docs + [docs[i] for i in sampled]
+        start = time.perf_counter()
+        before = model.wv.vectors[:vocab_size].copy()
+        model.train(train_docs, total_examples=len(train_docs), epochs=model.epochs)
+        print(f"- 追加学習: {len(train_docs)}件（新しい文書 {len(new_docs)}件 + 既存の文書 {sample_size}件）"
+              f" {time.perf_counter() - start:.2f}秒")
+
+        # 追加された語と、ベクトルの相対変化が許容値を超えた語
+        tolerance = word2vec_params.get("update_vector_tolerance", DEFAULT_UPDATE_VECTOR_TOLERANCE)
+        change = (np.linalg.norm(model.wv.vectors[:vocab_size] - before, axis=1)
+                  / np.maximum(np.linalg.norm(before, axis=1), 1e-12))
+        moved = np.flatnonzero(change > tolerance)
+        changed_words = {model.wv.index_to_key[i] for i in moved}
+        changed_words.update(model.wv.index_to_key[vocab_size:])
+        print(f"- ベクトルが変わった語: {len(moved)}語（許容値 {tolerance}）, 追加された語: {len(model.wv) - vocab_size}語")
+    else:
+        changed_words = set()
+
+    # 新しい文書と、追加された語・ベクトルが変わった語を含む既存の文書だけを計算し直す
+    # （平均以外の集約は重みが全文書から決まるため、すべて計算し直す）
+    pooling = word2vec_params.get("pooling", "mean")
+    if pooling != "mean" and (new_docs or removed):
+        print(f"- 集約方法が {pooling} のため、すべての文書ベクトルを計算し直します")
+        return model, compute_doc_vectors(docs, model, word2vec_params, dtype), hashes
+    recompute = set(new_indices)
+    recompute.update(i for i in kept_indices if not changed_words.isdisjoint(docs[i]))
+    vectors = np.empty((len(docs), model.vector_size), dtype=dtype)
+    kept = [i for i in kept_indices if i not in recompute]
+    if kept:
+        vectors[kept] = old_vectors[[old_rows[filenames[i]] for i in kept]]
+    targets = sorted(recompute)
+    if targets:
+        vectors[targets] = compute_doc_vectors([docs[i] for i in targets], model, word2vec_params, dtype)
+    print(f"- 文書ベクトルの再計算: {len(targets)}件（そのまま使用: {len(kept)}件）")
+    return model, vectors, hashes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--update', action='store_true',
+                      help='保存済みのモデルを新しい文書で追加学習し、影響を受けた文書ベクトルだけを更新する')
+    args = parser.parse_args(argv)
+    
     # 設定の読み込み
-    config = ConfigLoader()
+    config = ConfigLoader(args.config)
     paths = config.get_paths()
     word2vec_params = config.get_word2vec_params()
+    dtype = get_dtype(config)
 
     # 入出力パスの設定
     data_source = paths["input"]["data_source"]
@@ -67,32 +234,26 @@ def main():
     print(f"- ベクトル次元数: {word2vec_params['vector_size']}")
     print(f"- 文脈窓サイズ: {word2vec_params['window']}")
     print(f"- 最小出現回数: {word2vec_params['min_count']}")
+    print(f"- 文書ベクトルの集約方法: {word2vec_params.get('pooling', 'mean')}")
+    print(f"- 数値型: {dtype}")
 
-    # Word2Vecモデルの学習
-    print("\nWord2Vecモデルの学習中...")
-    model = Word2Vec(min_count=word2vec_params["min_count"],
-                    window=word2vec_params["window"],
-                    vector_size=word2vec_params["vector_size"],
-                    workers=word2vec_params["workers"])
-    
-    # 語彙の構築
-    model.build_vocab(docs)
-    
-    # モデルの学習
-    model.train(docs, total_examples=model.corpus_count, epochs=model.epochs)
+    updated = update_word2vec(docs, filenames, model_path, output_dir, word2vec_params, dtype) if args.update else None
+    if updated is not None:
+        model, vectors, hashes = updated
+    else:
+        # Word2Vecモデルの学習
+        print("\nWord2Vecモデルの学習中...")
+        model = train_word2vec(docs, word2vec_params)
+
+        # 文書ベクトルの計算
+        print("文書ベクトルを生成中...")
+        vectors = compute_doc_vectors(docs, model, word2vec_params, dtype)
+        hashes = document_hashes(docs)
     
-    # モデルの保存
+    # モデルと文書ベクトルの保存
     print(f"モデルを保存中: {model_path}")
     model.save(str(model_path))
-
-    # 文書ベクトルの計算と保存
-    print("文書ベクトルを生成中...")
-    vectors = compute_doc_vectors(docs, model)
-
-    for vec, fname in zip(vectors, filenames):
-        outpath = output_dir / f"{fname}.json"
-        with outpath.open("w", encoding="utf-8") as f:
-            json.dump(vec.tolist(), f, ensure_ascii=False, indent=2)
+    save_doc_vectors(vectors, filenames, output_dir, hashes)
 
     print(f"Word2Vec: {len(vectors)}件の文書ベクトルを生成しました")
 
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+特徴量とモデルの間で次元を削減するモジュール（truncated SVD・スパースランダム射影・χ²による特徴選択）
+- 削減器は学習用の分割ごとに1回だけ学習し、学習データとパラメータのハッシュをキーにファイルへキャッシュする
+- パラメータ探索の各グリッド点・交差検証の各分割では削減済みの行列をそのまま使う
+- 単体で実行すると、保存済みの特徴量で次元数ごとの処理時間とF1スコアを比較する
+"""
+
+import time
+import pickle
+import hashlib
+import argparse
+from pathlib import Path
+
+REDUCTION_METHODS = ('svd', 'random_projection', 'chi2')
+
+DEFAULT_REDUCTION_PARAMS = {
+    "method": "none",
+    "n_components": 100,
+    "features": ["TF-IDF", "CharNgram"],
+    "report_methods": list(REDUCTION_METHODS),
+    "report_dimensions": [50, 100, 200, 500]
+}
+
+DEFAULT_CACHE_PATH = "features_reduced"
+
+def get_reduction_params(config):
+    """次元削減のパラメータ（未設定の項目は既定値）"""
+    params = {**DEFAULT_REDUCTION_PARAMS, **config.get_reduction_params()}
+    method = params["method"]
+    if method not in ('none',) + REDUCTION_METHODS:
+        raise ValueError(f"reduction_params.method が不正です: {method}（none, {', '.join(REDUCTION_METHODS)}）")
+    return params
+
+def get_cache_dir(config):
+    """学習済みの削減器を保存するディレクトリ"""
+    output = config.get_paths()["output"]
+    return Path(output.get("reduction", {}).get("cache_path", DEFAULT_CACHE_PATH))
+
+def create_reducer(method, n_components, shape):
+    """削減器を生成する（次元数は元の特徴量の次元数（SVDは文書数も）を超えないようにする）"""
+    n_samples, n_features = shape
+    if method == 'svd':
+        from sklearn.decomposition import TruncatedSVD
+        return TruncatedSVD(n_components=min(n_components, n_samples - 1, n_features - 1), random_state=42)
+    if method == 'random_projection':
+        from sklearn.random_projection import SparseRandomProjection
+        # 射影後は負の値を含み ComplementNB が使えないため密行列（GaussianNB）として扱う
+        return SparseRandomProjection(n_components=min(n_components, n_features),
+                                      dense_output=True, random_state=42)
+    if method == 'chi2':
+        from sklearn.feature_selection import SelectKBest, chi2
+        return SelectKBest(chi2, k=min(n_components, n_features))
+    raise ValueError(f"未知の次元削減の方法です: {method}")
+
+def fingerprint(X, y):
+    """学習データ（特徴量行列とラベル）のハッシュ（連続した配列はコピーせずにそのまま読む）"""
+    import numpy as np
+    from scipy.sparse import issparse
+    digest = hashlib.sha1()
+    digest.update(repr((X.shape, str(X.dtype))).encode("utf-8"))
+    if issparse(X):
+        X = X.tocsr()
+        for part in (X.data, X.indices, X.indptr):
+            digest.update(memoryview(np.ascontiguousarray(part)))
+    else:
+        digest.update(memoryview(np.ascontiguousarray(X)))
+    digest.update("\n".join(map(str, y)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def fit_reducer(X_train, y_train, method, n_components, cache_dir=None):
+    """削減器を学習する（同じ学習データ・パラメータで学習済みのものがあれば読み込む）
+
+    Returns:
+        tuple: (学習済みの削減器, 学習時間（秒）, キャッシュから読み込んだかどうか)
+    """
+    cache_file = None
+    if cache_dir is not None:
+        key = fingerprint(X_train, y_train)
+        cache_file = Path(cache_dir) / f"{method}_{n_components}_{key}.pkl"
+        if cache_file.exists():
+            with open(cache_file, "rb") as f:
+                return pickle.load(f), 0.0, True
+
+    start = time.perf_counter()
+    reducer = create_reducer(method, n_components, X_train.shape)
+    reducer.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "wb") as f:
+            pickle.dump(reducer, f)
+    return reducer, fit_time, False
+
+def check_method(method, X):
+    """χ²は非負の特徴量（TF-IDF・文字n-gram）でしか使えない"""
+    from scipy.sparse import issparse
+    if method == 'chi2' and (X.data if issparse(X) else X).min() < 0:
+        raise ValueError("chi2 は負の値を含む特徴量（Word2Vec など）には使えません")
+
+def reduce_split(X_train, X_test, y_train, method, n_components, cache_dir=None):
+    """学習用の分割で削減器を学習し、学習用・評価用の両方を変換する
+
+    Returns:
+        tuple: (X_train, X_test, 情報（method, n_components, fit_time, cached）)
+    """
+    check_method(method, X_train)
+    reducer, fit_time, cached = fit_reducer(X_train, y_train, method, n_components, cache_dir)
+    X_train_reduced = reducer.transform(X_train)
+    X_test_reduced = reducer.transform(X_test)
+    info = {'method': method, 'n_components': X_train_reduced.shape[1],
+            'fit_time': fit_time, 'cached': cached}
+    return X_train_reduced, X_test_reduced, info
+
+def reduce_dataset(dataset, feature_name, config):
+    """設定で次元削減が有効な特徴量なら、分割済みのデータセットを削減して返す（無効ならそのまま）"""
+    params = get_reduction_params(config)
+    if params["method"] == 'none' or feature_name not in params["features"]:
+        return dataset
+    X_train, X_test, y_train, y_test = dataset
+    X_train, X_test, info = reduce_split(X_train, X_test, y_train, params["method"],
+                                         params["n_components"], get_cache_dir(config))
+    source = "キャッシュから読み込み" if info['cached'] else f"学習 {info['fit_time']:.2f}秒"
+    print(f"\n次元削減: {params['method']} {dataset[0].shape[1]} → {info['n_components']}次元（{source}）")
+    return X_train, X_test, y_train, y_test
+
+def first_params(param_grid):
+    """パラメータグリッドの各項目の最初の値"""
+    return {key: values[0] for key, values in param_grid.items()}
+
+def fit_and_score(name, X_train, X_test, y_train, y_test, model_params):
+    """グリッドの最初のパラメータでモデルを学習し、(学習・予測時間, F1スコア) を返す"""
+    from sklearn.metrics import f1_score
+    from compare_features_and_models import create_model, build_param_grids, is_sparse
+    sparse = is_sparse(X_train)
+    _, param_grid = build_param_grids(model_params, sparse)[name]
+    model = create_model(name, sparse).set_params(**first_params(param_grid))
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    elapsed = time.perf_counter() - start
+    return elapsed, f1_score(y_test, y_pred, average='weighted', zero_division=1)
+
+def tradeoff_report(dataset, feature_name, config, methods, dimensions):
+    """削減しない場合と、方法 × 次元数ごとの削減器の学習時間・モデルの学習時間・F1スコアを計測する
+    （削減器の学習時間を計測するためキャッシュは使わない）
+
+    Returns:
+        list: 行ごとの辞書（feature, method, dimensions, reduce_sec, model, train_sec, f1_score）
+    """
+    from compare_features_and_models import get_enabled_models
+    X_train, X_test, y_train, y_test = dataset
+    model_params = config.get_model_params()
+    models = get_enabled_models(config)
+    rows = []
+
+    def measure(method, X_tr, X_te, reduce_time):
+        for name in models:
+            elapsed, f1 = fit_and_score(name, X_tr, X_te, y_train, y_test, model_params)
+            rows.append({'feature': feature_name, 'method': method, 'dimensions': X_tr.shape[1],
+                         'reduce_sec': round(reduce_time, 4), 'model': name,
+                         'train_sec': round(elapsed, 4), 'f1_score': round(f1, 4)})
+            print(f"{method:<18} {X_tr.shape[1]:>8} {reduce_time:>9.2f}秒 {name:<20} {elapsed:>9.2f}秒 {f1:>8.4f}")
+
+    print(f"\n=== 次元削減の比較: {feature_name}（学習 {X_train.shape[0]}件, 評価 {X_test.shape[0]}件） ===")
+    print(f"{'方法':<18} {'次元数':>8} {'削減時間':>10} {'モデル':<20} {'学習時間':>10} {'F1':>8}")
+    measure('none', X_train, X_test, 0.0)
+    for method in methods:
+        try:
+            check_method(method, X_train)
+        except ValueError as e:
+            print(f"{method}: スキップ（{e}）")
+            continue
+        for n_components in dimensions:
+            if n_components >= X_train.shape[1]:
+                continue
+            start = time.perf_counter()
+            X_tr, X_te, _ = reduce_split(X_train, X_test, y_train, method, n_components)
+            measure(method, X_tr, X_te, time.perf_counter() - start)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='保存済みの特徴量で次元削減の方法・次元数ごとの処理時間とF1スコアを比較します')
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--methods', help='比較する方法（カンマ区切り、設定ファイルの値を上書き）')
+    parser.add_argument('--dimensions', help='比較する次元数（カンマ区切り、設定ファイルの値を上書き）')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from config_loader import ConfigLoader
+    from compare_features_and_models import (load_labels, resolve_labels, load_feature_set, split_dataset,
+                                             get_feature_dirs)
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    params = get_reduction_params(config)
+    methods = args.methods.split(',') if args.methods else params["report_methods"]
+    dimensions = [int(d) for d in args.dimensions.split(',')] if args.dimensions else params["report_dimensions"]
+    unknown = [method for method in methods if method not in REDUCTION_METHODS]
+    if unknown:
+        parser.error(f"未知の次元削減の方法です: {', '.join(unknown)}")
+
+    # 入出力パスの設定（特徴量の一覧は評価と同じ）
+    labels_file = Path(paths["input"]["labels_file"])
+    results_dir = Path(paths["output"]["results"]["evaluation"])
+    feature_dirs = get_feature_dirs(config)
+    unknown = [feature for feature in params["features"] if feature not in feature_dirs]
+    if unknown:
+        parser.error(f"未知の特徴量です: {', '.join(unknown)}（{', '.join(feature_dirs)}）")
+    results_dir.mkdir(parents=True, exist_ok=True)
+    labels = load_labels(labels_file)
+
+    rows = []
+    for feature_name in params["features"]:
+        feature_dir, texts_dir, _ = feature_dirs[feature_name]
+        if not feature_dir.exists():
+            print(f"警告: {feature_dir}が存在しません。{feature_name}は比較しません。")
+            continue
+        X, filenames = load_feature_set(feature_dir)
+        dataset = split_dataset(X, filenames, feature_name, resolve_labels(labels, texts_dir))
+        if dataset is None:
+            continue
+        rows.extend(tradeoff_report(dataset, feature_name, config, methods, dimensions))
+
+    if not rows:
+        print("エラー: 比較できる特徴量がありません。")
+        return
+    report_file = results_dir / 'reduction_report.csv'
+    pd.DataFrame(rows).to_csv(report_file, index=False)
+    print(f"\n比較結果を {report_file} に保存しました")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Word2Vec・TF-IDF・Doc2Vec・文字n-gram特徴量の生成からモデル比較までを1プロセスで実行するスクリプト
+"""
+
+import time
+import argparse
+from pathlib import Path
+from config_loader import ConfigLoader
+from dtype_policy import get_dtype
+from generate_word2vec import (read_tokenized_docs, train_word2vec, compute_doc_vectors, save_doc_vectors,
+                               document_hashes)
+from generate_tfidf import build_tfidf_features, save_tfidf_features, build_tfidf_state, load_tfidf_state
+from generate_doc2vec import DEFAULT_DOC2VEC_PARAMS, build_doc2vec_in_memory, build_doc2vec_vectors, MODEL_INFO_FILE
+from generate_char_ngram import (DEFAULT_CHAR_NGRAM_PARAMS, read_masked_texts, build_char_ngram_features,
+                                 save_char_ngram_features, get_char_ngram_input_dir)
+from compare_features_and_models import load_labels, resolve_labels, prepare_dataset, evaluate_datasets, report_results
+
+FEATURES = ('word2vec', 'tfidf', 'doc2vec', 'char_ngram')
+# 形態素解析済みテキストを使う特徴量
+TOKENIZED_FEATURES = ('word2vec', 'tfidf', 'doc2vec')
+
+def build_features(docs, filenames, config, features=FEATURES, output_paths=None):
+    """特徴量をメモリ上で生成する
+
+    Args:
+        docs (list): 文書ごとのトークンのリスト
+        filenames (list): 文書のファイル名（拡張子なし）
+        config (ConfigLoader): 設定
+        features (tuple): 生成する特徴量
+        output_paths (dict): 保存先（get_paths()["output"]、Noneの場合は保存しない）
+    Returns:
+        list: (特徴量名, 特徴量行列, 行に対応するファイル名, 処理時間) のリスト
+        （文字n-gramはマスク処理済みテキストを読み込むため、読み込み時間を含み、ファイル名も異なる）
+    """
+    feature_sets = []
+    dtype = get_dtype(config)
+
+    if 'word2vec' in features:
+        start = time.perf_counter()
+        word2vec_params = config.get_word2vec_params()
+        model = train_word2vec(docs, word2vec_params)
+        # 保存する文書ベクトルと同じ数値型のまま評価に渡す
+        vectors = compute_doc_vectors(docs, model, word2vec_params, dtype)
+        if output_paths is not None:
+            # 文書のハッシュ値も記録し、generate_word2vec.py --update で追加学習できるようにする
+            model.save(output_paths["word2vec"]["model_path"])
+            save_doc_vectors(vectors, filenames, Path(output_paths["word2vec"]["vectors_path"]),
+                             hashes=document_hashes(docs))
+        feature_sets.append(("Word2Vec", vectors, filenames, time.perf_counter() - start))
+
+    if 'tfidf' in features:
+        start = time.perf_counter()
+        tfidf_docs = [" ".join(tokens) for tokens in docs]
+        X, vectorizer = build_tfidf_features(tfidf_docs, config.get_tfidf_params(), dtype)
+        if output_paths is not None:
+            # 差分更新用の状態（更新履歴は引き継ぐ）も保存し、generate_tfidf.py --incremental で使えるようにする
+            output_dir = Path(output_paths["tfidf"]["features_path"])
+            history = (load_tfidf_state(output_dir) or {}).get("history", [])
+            save_tfidf_features(X, filenames, vectorizer, output_dir,
+                                build_tfidf_state(X, filenames, tfidf_docs, vectorizer, history))
+        # 疎行列のまま評価に渡す
+        feature_sets.append(("TF-IDF", X.tocsr(), filenames, time.perf_counter() - start))
+
+    if 'doc2vec' in features:
+        start = time.perf_counter()
+        doc2vec_params = {**DEFAULT_DOC2VEC_PARAMS, **config.get_doc2vec_params()}
+        if output_paths is not None:
+            # 保存する場合は保存済みのモデルと推論キャッシュを使う
+            output_dir = Path(output_paths["doc2vec"]["vectors_path"])
+            vectors, hashes = build_doc2vec_vectors(docs, Path(output_paths["doc2vec"]["model_path"]),
+                                                    output_dir, doc2vec_params, dtype=dtype)
+            save_doc_vectors(vectors, filenames, output_dir, hashes, keep=(MODEL_INFO_FILE,))
+        else:
+            vectors = build_doc2vec_in_memory(docs, doc2vec_params, dtype)
+        feature_sets.append(("Doc2Vec", vectors, filenames, time.perf_counter() - start))
+
+    if 'char_ngram' in features:
+        # 形態素解析・正規化を経由せず、マスク処理済みテキストから直接生成する
+        start = time.perf_counter()
+        texts, char_filenames = read_masked_texts(get_char_ngram_input_dir(config))
+        if not texts:
+            raise ValueError("マスク処理済みのテキストファイルが見つからないか、すべてが空です")
+        params = {**DEFAULT_CHAR_NGRAM_PARAMS, **config.get_char_ngram_params()}
+        X, vectorizer, transformer = build_char_ngram_features(texts, params, dtype)
+        if output_paths is not None:
+            save_char_ngram_features(X, char_filenames, vectorizer, transformer,
+                                     Path(output_paths["char_ngram"]["features_path"]))
+        feature_sets.append(("CharNgram", X, char_filenames, time.perf_counter() - start))
+
+    return feature_sets
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--features', default=','.join(FEATURES),
+                      help='評価する特徴量（カンマ区切り: word2vec,tfidf,doc2vec,char_ngram）')
+    parser.add_argument('--save-features', action='store_true',
+                      help='特徴量とモデルを従来どおりファイルにも保存する')
+    args = parser.parse_args(argv)
+
+    features = [f.strip() for f in args.features.split(',') if f.strip()]
+    unknown = [f for f in features if f not in FEATURES]
+    if unknown:
+        parser.error(f"未知の特徴量です: {', '.join(unknown)}")
+
+    total_start = time.perf_counter()
+
+    # 設定の読み込み（全処理で共有）
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+
+    # 入出力パスの設定
+    data_source = paths["input"]["data_source"]
+    input_dir = Path(paths["input"]["data_paths"][data_source].replace("*.txt", ""))
+    labels_file = Path(paths["input"]["labels_file"])
+    results_dir = Path(paths["output"]["results"]["evaluation"])
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    # 形態素解析済みテキストとラベルの読み込み（1回だけ）
+    start = time.perf_counter()
+    labels = load_labels(labels_file)
+    docs, filenames = [], []
+    label_maps = {}
+    if any(feature in TOKENIZED_FEATURES for feature in features):
+        docs, filenames = read_tokenized_docs(input_dir)
+        if not docs:
+            raise ValueError("テキストファイルが見つからないか、すべてが空です")
+        label_maps['tokenized'] = resolve_labels(labels, input_dir)
+    if 'char_ngram' in features:
+        label_maps['char_ngram'] = resolve_labels(labels, get_char_ngram_input_dir(config))
+    load_time = time.perf_counter() - start
+    if docs:
+        print(f"\n入力: {input_dir}（{len(docs)}件, {load_time:.2f}秒）")
+
+    # 特徴量の生成
+    output_paths = paths["output"] if args.save_features else None
+    feature_sets = build_features(docs, filenames, config, features, output_paths)
+
+    # 各特徴量の分割（メモリ上の行列をそのまま渡す）
+    datasets = {}
+    timings = [("読み込み", load_time)]
+    for feature_name, X, feature_filenames, build_time in feature_sets:
+        print("\n" + "="*50)
+        print(f"{feature_name}の処理を開始...（次元数 {X.shape[1]}）")
+        print("="*50)
+        label_map = label_maps['char_ngram' if feature_name == "CharNgram" else 'tokenized']
+        dataset = prepare_dataset(X, feature_filenames, feature_name, label_map, config)
+        if dataset is not None:
+            datasets[feature_name] = dataset
+        timings.append((f"{feature_name} 生成", build_time))
+
+    # 全特徴量 × モデルの評価（model_params.parallel が有効な場合は並列に実行）
+    start = time.perf_counter()
+    all_results = evaluate_datasets(datasets, config)
+    timings.append(("評価", time.perf_counter() - start))
+
+    # 特徴量ごとの評価時間は、探索と評価のジョブの時間の合計
+    summary = []
+    for feature_name, _, _, build_time in feature_sets:
+        results = [r for r in all_results if r['feature_name'] == feature_name]
+        eval_time = sum(r['job_time'] for r in results)
+        best_f1 = max((r['f1_score'] for r in results), default=None)
+        summary.append((feature_name, build_time, eval_time, best_f1))
+
+    if not all_results:
+        print("エラー: 有効な結果がありません。")
+        return
+
+    report_results(all_results, config, results_dir)
+
+    # 特徴量ごとの比較（生成時間は入力の読み込みから特徴量行列の作成まで、並列に評価した場合は評価時間の合計が全体の評価時間を超える）
+    print("\n=== 特徴量ごとの比較 ===")
+    print(f"{'特徴量':<12} {'生成時間':>10} {'評価時間':>10} {'最良F1':>8}")
+    for feature_name, build_time, eval_time, best_f1 in summary:
+        f1_text = f"{best_f1:.4f}" if best_f1 is not None else "-"
+        print(f"{feature_name:<12} {build_time:>9.2f}秒 {eval_time:>9.2f}秒 {f1_text:>8}")
+
+    print("\n=== 処理時間 ===")
+    for name, seconds in timings:
+        print(f"- {name}: {seconds:.2f}秒")
+    print(f"- 合計: {time.perf_counter() - total_start:.2f}秒")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+パラメータ探索の方法（全探索・逐次半減法・ランダム探索・正則化パス）と、モデルごとの学習回数・時間の予算
+- model_params.search.strategy で方法を選び、budgets でモデルごとに方法・予算を上書きする
+- 正則化パス（path）は C を小さい順に warm start で学習し、C ごとの交差検証スコアの曲線を1回の探索で求める
+- 時間の予算は、最初の候補を1回学習した時間から学習回数の予算に換算する
+- 探索時間と最良スコアは results/search_history.csv に記録する
+- 単体で実行すると、保存済みの特徴量で方法ごとの探索時間・学習回数・最良スコア・F1スコアを比較する
+"""
+
+import os
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+SEARCH_STRATEGIES = ('grid', 'halving', 'random', 'path')
+
+DEFAULT_SEARCH_PARAMS = {
+    "strategy": "grid",
+    "cv": 5,
+    "scoring": "f1_weighted",
+    "random_n_iter": 10,
+    "halving_factor": 3,
+    "max_fits": None,
+    "max_time_sec": None,
+    "budgets": {},
+    "report_strategies": list(SEARCH_STRATEGIES),
+    "report_features": ["Word2Vec", "TF-IDF"]
+}
+
+# モデルごとに上書きできる項目
+FAMILY_KEYS = ("strategy", "cv", "scoring", "random_n_iter", "halving_factor", "max_fits", "max_time_sec")
+
+def get_search_params(model_params):
+    """探索の設定（model_params.search、未設定の項目は既定値）"""
+    params = {**DEFAULT_SEARCH_PARAMS, **model_params.get("search", {})}
+    for name, budget in [(None, params), *params["budgets"].items()]:
+        strategy = budget.get("strategy", params["strategy"])
+        if strategy not in SEARCH_STRATEGIES:
+            where = f"budgets.{name}" if name else "strategy"
+            raise ValueError(f"model_params.search.{where} が不正です: {strategy}（{', '.join(SEARCH_STRATEGIES)}）")
+    return params
+
+def family_settings(model_params, name, strategy=None):
+    """モデルの探索の設定（budgets[name] で全体の設定を上書き、strategy を渡した場合はさらに上書き）"""
+    params = get_search_params(model_params)
+    settings = {key: params[key] for key in FAMILY_KEYS}
+    settings.update({key: value for key, value in params["budgets"].get(name, {}).items() if key in FAMILY_KEYS})
+    if strategy is not None:
+        settings["strategy"] = strategy
+    return settings
+
+class RegularizationPathCV:
+    """正則化パスの探索（GridSearchCV の代わりに使う、C と warm_start を持つモデル用）
+
+    交差検証の分割を1回だけ作り、C 以外のパラメータ（solver など）の組み合わせ × 分割ごとに、
+    C を小さい順に学習する。前の C の係数から学習を始めるため（warm start）、2つ目以降の C の学習は
+    少ない反復で収束する（liblinear は warm start に対応しないため、毎回最初から学習する）。
+    組み合わせ × 分割ごとのパスを joblib で並列に学習し、最良のパラメータで学習用データ全体に学習し直す。
+    候補の順序と学習に失敗した候補の扱い（error_score）は GridSearchCV と同じ。
+
+    Attributes:
+        best_estimator_, best_params_, best_score_: GridSearchCV と同じ
+        cv_results_: params, mean_test_score, std_test_score, rank_test_score, mean_fit_time（ParameterGrid の順）
+        path_ (list): C ごとの交差検証スコアの曲線（C 以外のパラメータ・C・平均・標準偏差）
+    """
+
+    def __init__(self, estimator, param_grid, cv=5, scoring=None, n_jobs=-1, verbose=0, error_score=float("nan")):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+        self.error_score = error_score
+
+    def _fit_path(self, X, y, train, test, params, Cs, scorer):
+        """1つの分割と C 以外のパラメータの組み合わせで、C を小さい順に warm start で学習する
+
+        学習に失敗した C のスコアは error_score とし（'raise' の場合は例外をそのまま送出）、
+        次の C は失敗したモデルの係数を使わずに最初から学習する
+        """
+        from sklearn.base import clone
+        from sklearn.utils import _safe_indexing
+        X_train, X_test = _safe_indexing(X, train), _safe_indexing(X, test)
+        y_train, y_test = _safe_indexing(y, train), _safe_indexing(y, test)
+        model = clone(self.estimator).set_params(**params, warm_start=True)
+        scores, fit_times, errors = [], [], []
+        for C in Cs:
+            start = time.perf_counter()
+            try:
+                model.set_params(C=C).fit(X_train, y_train)
+            except Exception as e:
+                if self.error_score == "raise":
+                    raise
+                fit_times.append(time.perf_counter() - start)
+                scores.append(self.error_score)
+                errors.append(f"{type(e).__name__}: {e}")
+                model = clone(self.estimator).set_params(**params, warm_start=True)
+                continue
+            fit_times.append(time.perf_counter() - start)
+            scores.append(scorer(model, X_test, y_test))
+        return scores, fit_times, errors
+
+    def fit(self, X, y):
+        import warnings
+        import numpy as np
+        from joblib import Parallel, delayed
+        from scipy.stats import rankdata
+        from sklearn.base import clone
+        from sklearn.exceptions import FitFailedWarning
+        from sklearn.metrics import check_scoring
+        from sklearn.model_selection import ParameterGrid, check_cv
+        y = np.asarray(y)
+        Cs = sorted(set(self.param_grid["C"]))
+        others = list(ParameterGrid({key: values for key, values in self.param_grid.items() if key != "C"}))
+        # GridSearchCV と同じ分割（分類では StratifiedKFold）を全ての組み合わせで共有する
+        folds = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        scorer = check_scoring(self.estimator, scoring=self.scoring)
+
+        tasks = [(params, train, test) for params in others for train, test in folds]
+        paths = Parallel(n_jobs=self.n_jobs, verbose=self.verbose)(
+            delayed(self._fit_path)(X, y, train, test, params, Cs, scorer) for params, train, test in tasks)
+
+        # (組み合わせ, 分割, C) のスコア
+        scores = np.array([path[0] for path in paths], dtype=float).reshape(len(others), len(folds), len(Cs))
+        fit_times = np.array([path[1] for path in paths]).reshape(len(others), len(folds), len(Cs))
+        errors = [error for path in paths for error in path[2]]
+        if errors:
+            n_fits = len(others) * len(folds) * len(Cs)
+            if len(errors) == n_fits:
+                raise ValueError(f"全ての学習（{n_fits}回）が失敗しました:\n" + "\n".join(sorted(set(errors))))
+            warnings.warn(f"{n_fits}回の学習のうち {len(errors)}回が失敗しました（スコアは error_score={self.error_score}）:\n"
+                          + "\n".join(sorted(set(errors))), FitFailedWarning)
+
+        # 候補は GridSearchCV と同じ ParameterGrid の順に並べる（C 以外のパラメータの組み合わせと C の位置で対応づける）
+        candidates = list(ParameterGrid(self.param_grid))
+        positions = [(others.index({key: value for key, value in params.items() if key != "C"}), Cs.index(params["C"]))
+                     for params in candidates]
+        fold_scores = np.array([scores[i, :, j] for i, j in positions])
+        mean_scores = fold_scores.mean(axis=1)
+        # GridSearchCV と同じく、同じスコアの候補は同じ順位にし、失敗した（nan の）候補は最下位にする
+        if np.isnan(mean_scores).all():
+            ranks = np.ones(len(mean_scores), dtype=np.int32)
+        else:
+            filled = np.nan_to_num(mean_scores, nan=np.nanmin(mean_scores) - 1)
+            ranks = rankdata(-filled, method="min").astype(np.int32)
+        self.cv_results_ = {
+            "params": candidates,
+            "mean_test_score": mean_scores,
+            "std_test_score": fold_scores.std(axis=1),
+            "rank_test_score": ranks,
+            "mean_fit_time": np.array([fit_times[i, :, j].mean() for i, j in positions])
+        }
+        self.path_ = [{**params, "C": C, "mean_test_score": float(scores[i, :, j].mean()),
+                       "std_test_score": float(scores[i, :, j].std())}
+                      for i, params in enumerate(others) for j, C in enumerate(Cs)]
+        best = int(ranks.argmin())
+        self.best_index_ = best
+        self.best_params_ = candidates[best]
+        self.best_score_ = float(mean_scores[best])
+        self.n_splits_ = len(folds)
+        # 最良のパラメータで学習用データ全体に学習し直す（warm start は使わない）
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+def supports_path(estimator, param_grid):
+    """正則化パスで探索できるか（グリッドに C があり、モデルが warm_start を持つ）"""
+    return "C" in param_grid and "warm_start" in estimator.get_params()
+
+def format_path(path):
+    """正則化パスの曲線を表示用の文字列にする（C 以外のパラメータごとに1行）"""
+    lines = {}
+    for point in path:
+        others = ", ".join(f"{key}={value}" for key, value in point.items()
+                           if key not in ("C", "mean_test_score", "std_test_score"))
+        lines.setdefault(others, []).append(f"C={point['C']}: {point['mean_test_score']:.4f}")
+    return "\n".join(f"  {others or '-'}: {' / '.join(points)}" for others, points in lines.items())
+
+def count_candidates(param_grid):
+    """パラメータグリッドの組み合わせの数"""
+    from sklearn.model_selection import ParameterGrid
+    return len(ParameterGrid(param_grid))
+
+def probe_fit_time(estimator, param_grid, X_train, y_train):
+    """最初の候補を学習用の分割全体で1回学習した時間"""
+    from sklearn.base import clone
+    from sklearn.model_selection import ParameterGrid
+    model = clone(estimator).set_params(**next(iter(ParameterGrid(param_grid))))
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    return time.perf_counter() - start
+
+def fit_budget(settings, estimator, param_grid, X_train, y_train, n_jobs=-1):
+    """学習回数の予算（max_fits と、max_time_sec から換算した回数の小さい方、どちらもなければ None）
+
+    交差検証の学習は n_jobs 個（-1 は全CPU）で並列に行うため、時間の予算 × 並列数 ÷ 1回の学習時間 を学習回数とする
+    （候補が1つの場合は予算で候補を減らせないため、時間を計るための学習は行わない）
+    """
+    budgets = []
+    if settings["max_fits"]:
+        budgets.append(int(settings["max_fits"]))
+    if settings["max_time_sec"] and count_candidates(param_grid) > 1:
+        elapsed = max(probe_fit_time(estimator, param_grid, X_train, y_train), 1e-3)
+        parallel = n_jobs if n_jobs > 0 else os.cpu_count() or 1
+        budgets.append(int(settings["max_time_sec"] * parallel / elapsed))
+    return max(1, min(budgets)) if budgets else None
+
+def create_search(estimator, param_grid, settings, X_train, y_train, verbose=1, n_jobs=-1):
+    """設定の方法で探索器を生成する
+
+    - grid: 全組み合わせを交差検証する（予算は使わない）
+    - random: 組み合わせから random_n_iter 個（予算がある場合は 予算 ÷ 分割数 個）を選んで交差検証する
+    - halving: 少ない学習データで全候補を評価し、上位 1/halving_factor だけを多いデータで評価し直すことを繰り返す
+      （予算がある場合は、学習回数の合計が予算に収まる数の候補から始める）
+    - path: C を小さい順に warm start で学習する（予算は使わない、C や warm_start のないモデルは grid で探索する）
+
+    Returns:
+        tuple: (探索器, 計画（strategy, n_candidates, budget_fits）)
+    """
+    from sklearn.model_selection import GridSearchCV, RandomizedSearchCV
+    strategy = settings["strategy"]
+    cv = settings["cv"]
+    common_params = {
+        'cv': cv,                               # 交差検証の分割数
+        'scoring': settings["scoring"],         # 評価指標
+        'verbose': verbose,                     # 進捗表示
+        'n_jobs': n_jobs                        # 並列数（-1 は全CPU）
+    }
+    n_total = count_candidates(param_grid)
+    if strategy == 'path':
+        if supports_path(estimator, param_grid):
+            search = RegularizationPathCV(estimator, param_grid, **common_params)
+            return search, {'strategy': strategy, 'n_candidates': n_total, 'budget_fits': None}
+        print(f"{type(estimator).__name__} は正則化パスで探索できないため、全探索（grid）で探索します")
+        strategy = 'grid'
+    if strategy == 'grid':
+        search = GridSearchCV(estimator, param_grid, return_train_score=True, **common_params)
+        return search, {'strategy': strategy, 'n_candidates': n_total, 'budget_fits': None}
+
+    budget = fit_budget(settings, estimator, param_grid, X_train, y_train, n_jobs)
+    if strategy == 'random':
+        n_iter = settings["random_n_iter"] if budget is None else max(1, budget // cv)
+        n_iter = min(n_iter, n_total)
+        search = RandomizedSearchCV(estimator, param_grid, n_iter=n_iter, random_state=42,
+                                    return_train_score=True, **common_params)
+        return search, {'strategy': strategy, 'n_candidates': n_iter, 'budget_fits': budget}
+
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingGridSearchCV, HalvingRandomSearchCV
+    factor = settings["halving_factor"]
+    # 候補数 n から始めると学習回数の合計はおよそ 分割数 × n × factor / (factor - 1)
+    n_candidates = n_total if budget is None else max(1, budget * (factor - 1) // (factor * cv))
+    if n_candidates >= n_total:
+        search = HalvingGridSearchCV(estimator, param_grid, factor=factor, random_state=42, **common_params)
+        n_candidates = n_total
+    else:
+        search = HalvingRandomSearchCV(estimator, param_grid, n_candidates=n_candidates, factor=factor,
+                                       random_state=42, **common_params)
+    return search, {'strategy': strategy, 'n_candidates': n_candidates, 'budget_fits': budget}
+
+def count_fits(search, cv):
+    """探索で行った交差検証の学習回数（最適なパラメータでの学習し直しは含まない）"""
+    if hasattr(search, 'n_candidates_'):
+        return int(sum(search.n_candidates_)) * cv
+    return len(search.cv_results_["params"]) * cv
+
+def save_search_history(results, output_dir):
+    """評価結果ごとの探索の方法・学習回数・探索時間・最良スコアを results/search_history.csv に追記する"""
+    import pandas as pd
+    now = datetime.now()
+    rows = [{
+        'date': now.strftime('%Y-%m-%d'),
+        'time': now.strftime('%H:%M:%S'),
+        'feature': r['feature_name'],
+        'model': r['model_name'],
+        'strategy': r['search'].get('strategy'),
+        'n_candidates': r['search'].get('n_candidates'),
+        'n_fits': r['search'].get('n_fits'),
+        'budget_fits': r['search'].get('budget_fits'),
+        'search_sec': round(r['search']['search_time'], 4),
+        'cached': r['search']['cached'],
+        'best_cv_score': round(r['search']['best_score'], 4),
+        'test_f1': round(r['f1_score'], 4),
+        'best_params': r['search']['best_params']
+    } for r in results if 'search' in r]
+    if not rows:
+        return
+    history_file = output_dir / 'search_history.csv'
+    # 予算がないモデルの予算は空欄（整数の列のまま保存する）
+    frame = pd.DataFrame(rows).astype({'budget_fits': 'Int64'})
+    frame.to_csv(history_file, mode='a', header=not history_file.exists(), index=False)
+
+def strategy_report(dataset, feature_name, config, strategies):
+    """方法ごとに各モデルを探索し（キャッシュは使わない）、探索時間・学習回数・最良スコア・F1スコアを計測する
+
+    Returns:
+        list: 行ごとの辞書（feature, strategy, model, n_candidates, n_fits, budget_fits, search_sec, best_cv_score, test_f1）
+    """
+    from sklearn.metrics import f1_score
+    from compare_features_and_models import get_enabled_models, tune_model, create_model, build_param_grids, is_sparse
+    X_train, X_test, y_train, y_test = dataset
+    model_params = config.get_model_params()
+    sparse = is_sparse(X_train)
+    param_grids = build_param_grids(model_params, sparse)
+    rows = []
+    print(f"\n=== 探索方法の比較: {feature_name}（学習 {X_train.shape[0]}件, 評価 {X_test.shape[0]}件） ===")
+    for strategy in strategies:
+        for name in get_enabled_models(config):
+            # 正則化パスで探索できないモデルは比較しない（grid と同じ結果になるため）
+            if strategy == 'path' and not supports_path(create_model(name, sparse), param_grids[name][1]):
+                continue
+            model, search = tune_model(name, X_train, y_train, model_params, strategy=strategy, verbose=0)
+            f1 = f1_score(y_test, model.predict(X_test), average='weighted', zero_division=1)
+            rows.append({'feature': feature_name, 'strategy': strategy, 'model': name,
+                         'n_candidates': search['n_candidates'], 'n_fits': search['n_fits'],
+                         'budget_fits': search['budget_fits'], 'search_sec': round(search['search_time'], 4),
+                         'best_cv_score': round(search['best_score'], 4), 'test_f1': round(f1, 4),
+                         'path': search.get('path')})
+
+    print(f"\n{'方法':<8} {'モデル':<20} {'候補数':>6} {'学習回数':>8} {'予算':>6} {'探索時間':>10} {'CVスコア':>9} {'F1':>8}")
+    for row in rows:
+        budget = row['budget_fits'] if row['budget_fits'] is not None else '-'
+        print(f"{row['strategy']:<8} {row['model']:<20} {row['n_candidates']:>6} {row['n_fits']:>8} {budget:>6} "
+              f"{row['search_sec']:>9.2f}秒 {row['best_cv_score']:>9.4f} {row['test_f1']:>8.4f}")
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='保存済みの特徴量でパラメータ探索の方法ごとの探索時間・最良スコアを比較します')
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--strategies', help='比較する方法（カンマ区切り、設定ファイルの値を上書き）')
+    parser.add_argument('--features', help='比較する特徴量（カンマ区切り、設定ファイルの値を上書き）')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from config_loader import ConfigLoader
+    from compare_features_and_models import (load_labels, resolve_labels, load_feature_set, split_dataset,
+                                             get_feature_dirs)
+    from reduce_features import reduce_dataset
+    from dtype_policy import apply_dtype_policy
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    params = get_search_params(config.get_model_params())
+    strategies = args.strategies.split(',') if args.strategies else params["report_strategies"]
+    features = args.features.split(',') if args.features else params["report_features"]
+    unknown = [strategy for strategy in strategies if strategy not in SEARCH_STRATEGIES]
+    if unknown:
+        parser.error(f"未知の探索方法です: {', '.join(unknown)}")
+
+    # 入出力パスの設定（特徴量の一覧は評価と同じ）
+    labels_file = Path(paths["input"]["labels_file"])
+    results_dir = Path(paths["output"]["results"]["evaluation"])
+    feature_dirs = get_feature_dirs(config)
+    unknown = [feature for feature in features if feature not in feature_dirs]
+    if unknown:
+        parser.error(f"未知の特徴量です: {', '.join(unknown)}（{', '.join(feature_dirs)}）")
+    results_dir.mkdir(parents=True, exist_ok=True)
+    labels = load_labels(labels_file)
+
+    rows = []
+    for feature_name in features:
+        feature_dir, texts_dir, _ = feature_dirs[feature_name]
+        if not feature_dir.exists():
+            print(f"警告: {feature_dir}が存在しません。{feature_name}は比較しません。")
+            continue
+        X, filenames = load_feature_set(feature_dir)
+        dataset = split_dataset(X, filenames, feature_name, resolve_labels(labels, texts_dir))
+        if dataset is None:
+            continue
+        # 評価と同じく次元削減・数値型の統一を行ってから探索する
+        dataset = apply_dtype_policy(reduce_dataset(dataset, feature_name, config), feature_name, config)
+        rows.extend(strategy_report(dataset, feature_name, config, strategies))
+
+    if not rows:
+        print("エラー: 比較できる特徴量がありません。")
+        return
+    report_file = results_dir / 'search_report.csv'
+    frame = pd.DataFrame(rows).astype({'budget_fits': 'Int64'})
+    frame.drop(columns='path').to_csv(report_file, index=False)
+    print(f"\n比較結果を {report_file} に保存しました")
+
+    # 正則化パスで探索した場合は、C ごとの交差検証スコアの曲線も保存する
+    path_rows = [{'feature': row['feature'], 'model': row['model'], **point}
+                 for row in rows if row['path'] for point in row['path']]
+    if path_rows:
+        path_file = results_dir / 'regularization_path.csv'
+        pd.DataFrame(path_rows).to_csv(path_file, index=False)
+        print(f"正則化パスの曲線を {path_file} に保存しました")
+
+if __name__ == "__main__":
+    main()
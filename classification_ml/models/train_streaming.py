@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ハッシュ特徴量とミニバッチ学習でメモリ使用量を一定に保ったままモデルを学習・評価するスクリプト
+"""
+
+import sys
+import time
+import zlib
+import argparse
+from pathlib import Path
+from config_loader import ConfigLoader
+from dtype_policy import get_dtype
+from compare_features_and_models import load_labels, resolve_labels
+
+# 逐次学習（partial_fit）できるモデル
+STREAM_MODELS = ('SGDLogistic', 'SGDHinge', 'MultinomialNB')
+
+DEFAULT_STREAMING_PARAMS = {
+    "n_features": 2 ** 18,
+    "batch_size": 64,
+    "epochs": 1,
+    "models": list(STREAM_MODELS),
+    "sgd_alpha": 1e-4,
+    "nb_alpha": 0.1
+}
+
+def iter_batches(input_dir, batch_size):
+    """形態素解析済みのテキストをファイルから読みながらバッチ単位で返す
+
+    Yields:
+        tuple: (空白区切りのテキストのリスト, ファイル名（拡張子なし）のリスト)
+    """
+    texts = []
+    filenames = []
+    for path in sorted(input_dir.glob("*.txt")):
+        with path.open(encoding="utf-8") as f:
+            text = f.read().strip()
+        if not text:
+            continue
+        texts.append(text)
+        filenames.append(path.stem)
+        if len(texts) >= batch_size:
+            yield texts, filenames
+            texts, filenames = [], []
+    if texts:
+        yield texts, filenames
+
+def is_test_document(name, test_size):
+    """ファイル名のハッシュで評価用の文書かどうかを決める（全件を読まずに分割できる）"""
+    return zlib.crc32(name.encode("utf-8")) % 1000 < test_size * 1000
+
+def create_vectorizer(n_features, dtype="float32"):
+    """学習不要のハッシュ特徴量（語彙を持たないため文書数が増えてもメモリは一定、数値型は dtype）"""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(
+        n_features=n_features,
+        tokenizer=str.split,    # 形態素解析済みのため空白で分割するだけ
+        token_pattern=None,
+        lowercase=False,
+        alternate_sign=False,   # MultinomialNB のため非負の値にする
+        norm="l2",
+        dtype=dtype
+    )
+
+def create_incremental_model(name, streaming_params):
+    """partial_fit で逐次学習できるモデルを生成する"""
+    if name == 'SGDLogistic':
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss="log_loss", alpha=streaming_params["sgd_alpha"], random_state=42)
+    if name == 'SGDHinge':
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss="hinge", alpha=streaming_params["sgd_alpha"], random_state=42)
+    if name == 'MultinomialNB':
+        from sklearn.naive_bayes import MultinomialNB
+        return MultinomialNB(alpha=streaming_params["nb_alpha"])
+    raise ValueError(f"未知のモデルです: {name}")
+
+def peak_memory_mb():
+    """プロセスの最大常駐メモリ（MB）"""
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux はKB、macOS はバイト単位
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+def label_batch(texts, filenames, label_map, test_size, test):
+    """バッチのうちラベルのある学習用（test=True の場合は評価用）の文書だけを返す"""
+    selected_texts = []
+    labels = []
+    for text, name in zip(texts, filenames):
+        if is_test_document(name, test_size) != test:
+            continue
+        label = label_map.get(f"{name}.txt")
+        if label is None:
+            continue
+        selected_texts.append(text)
+        labels.append(label)
+    return selected_texts, labels
+
+def train_streaming(input_dir, label_map, streaming_params, test_size=0.3, dtype="float32"):
+    """ミニバッチごとにハッシュ特徴量へ変換し、各モデルを逐次学習してから評価する
+
+    Returns:
+        list: モデルごとの評価結果
+    """
+    from sklearn.metrics import classification_report, f1_score
+    vectorizer = create_vectorizer(streaming_params["n_features"], dtype)
+    batch_size = streaming_params["batch_size"]
+    classes = sorted(set(label_map.values()))
+    models = {name: create_incremental_model(name, streaming_params)
+              for name in streaming_params["models"]}
+
+    # 学習（エポックごとにファイルを読み直す）
+    train_time = 0.0
+    trained = 0
+    for epoch in range(1, streaming_params["epochs"] + 1):
+        print(f"\n=== 学習 エポック {epoch}/{streaming_params['epochs']}（バッチサイズ {batch_size}） ===")
+        print(f"{'バッチ':>6} {'件数':>6} {'処理時間':>10} {'件/秒':>10} {'最大メモリ':>12}")
+        # 処理時間はファイルの読み込みも含めて計測する
+        start = time.perf_counter()
+        for i, (texts, filenames) in enumerate(iter_batches(input_dir, batch_size), 1):
+            texts, labels = label_batch(texts, filenames, label_map, test_size, test=False)
+            if texts:
+                X = vectorizer.transform(texts)
+                for model in models.values():
+                    model.partial_fit(X, labels, classes=classes)
+            elapsed = time.perf_counter() - start
+            train_time += elapsed
+            trained += len(texts)
+            print(f"{i:>6} {len(texts):>6} {elapsed:>9.3f}秒 {len(texts) / max(elapsed, 1e-9):>10.1f} "
+                  f"{peak_memory_mb():>10.1f}MB")
+            start = time.perf_counter()
+
+    # 評価（評価用の文書も1バッチずつ予測する）
+    y_test = []
+    y_pred = {name: [] for name in models}
+    for texts, filenames in iter_batches(input_dir, batch_size):
+        texts, labels = label_batch(texts, filenames, label_map, test_size, test=True)
+        if not texts:
+            continue
+        X = vectorizer.transform(texts)
+        y_test.extend(labels)
+        for name, model in models.items():
+            y_pred[name].extend(model.predict(X))
+
+    print(f"\n学習: {trained}件 / {train_time:.2f}秒（{trained / max(train_time, 1e-9):.1f}件/秒）, 評価: {len(y_test)}件")
+    if not y_test:
+        print("エラー: 評価用のラベル付きデータがありません。")
+        return []
+
+    results = []
+    for name, predictions in y_pred.items():
+        f1 = f1_score(y_test, predictions, average='weighted', zero_division=1)
+        print(f"\nハッシュ特徴量 + {name}の結果:")
+        print("-"*30)
+        print(f"F1スコア: {f1:.4f}")
+        print("\n分類レポート:")
+        print(classification_report(y_test, predictions, zero_division=1))
+        results.append({'model_name': name, 'f1_score': f1})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='model_config.json', help='設定ファイルのパス')
+    parser.add_argument('--batch-size', type=int, help='ミニバッチの文書数（設定ファイルの値を上書き）')
+    parser.add_argument('--epochs', type=int, help='学習データを読み直す回数（設定ファイルの値を上書き）')
+    args = parser.parse_args(argv)
+
+    # 設定の読み込み
+    config = ConfigLoader(args.config)
+    paths = config.get_paths()
+    streaming_params = {**DEFAULT_STREAMING_PARAMS, **config.get_streaming_params()}
+    if args.batch_size:
+        streaming_params["batch_size"] = args.batch_size
+    if args.epochs:
+        streaming_params["epochs"] = args.epochs
+    unknown = [name for name in streaming_params["models"] if name not in STREAM_MODELS]
+    if unknown:
+        parser.error(f"streaming_params.models に未知のモデルがあります: {', '.join(unknown)}")
+
+    # 入出力パスの設定
+    data_source = paths["input"]["data_source"]
+    input_dir = Path(paths["input"]["data_paths"][data_source].replace("*.txt", ""))
+    labels_file = Path(paths["input"]["labels_file"])
+    test_size = config.get_model_params().get('test_size', 0.3)
+
+    print("\n=== ストリーミング学習 ===")
+    print(f"- 入力: {input_dir}")
+    print(f"- ハッシュ特徴量の次元数: {streaming_params['n_features']}")
+    print(f"- モデル: {', '.join(streaming_params['models'])}")
+
+    label_map = resolve_labels(load_labels(labels_file), input_dir)
+    results = train_streaming(input_dir, label_map, streaming_params, test_size, get_dtype(config))
+    if not results:
+        return
+
+    best_result = max(results, key=lambda x: x['f1_score'])
+    print("\n" + "="*50)
+    print(f"最良のモデル: ハッシュ特徴量 + {best_result['model_name']}")
+    print(f"F1スコア: {best_result['f1_score']:.4f}")
+
+if __name__ == "__main__":
+    main()
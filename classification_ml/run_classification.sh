@@ -31,31 +31,12 @@ echo "ラベル付きデータ数: $labeled_data"
 echo
 
 echo "----------------------------------------"
-echo "1. Word2Vec特徴量の生成"
-echo "実行: python models/generate_word2vec.py"
+echo "特徴量の生成（Word2Vec / TF-IDF）とモデルの比較"
+echo "実行: python models/run_all.py $*"
+echo "（特徴量をファイルにも保存する場合は --save-features を指定）"
 echo "----------------------------------------"
-if ! python models/generate_word2vec.py; then
-    echo "エラー: Word2Vec特徴量の生成に失敗しました"
-    exit 1
-fi
-echo
-
-echo "----------------------------------------"
-echo "2. TF-IDF特徴量の生成"
-echo "実行: python models/generate_tfidf.py"
-echo "----------------------------------------"
-if ! python models/generate_tfidf.py; then
-    echo "エラー: TF-IDF特徴量の生成に失敗しました"
-    exit 1
-fi
-echo
-
-echo "----------------------------------------"
-echo "3. 特徴量とモデルの比較"
-echo "実行: python models/compare_features_and_models.py"
-echo "----------------------------------------"
-if ! python models/compare_features_and_models.py; then
-    echo "エラー: 特徴量とモデルの比較に失敗しました"
+if ! python models/run_all.py "$@"; then
+    echo "エラー: 特徴量の生成またはモデルの比較に失敗しました"
     exit 1
 fi
 echo
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+パイプライン全体の実行ツールと、各段が共有する文書レジストリ（doc_registry）
+- 各段のスクリプトのディレクトリ（preprocess_rules/・preprocess_nlp/・classification_ml/models/）には
+  このパッケージへのシンボリックリンク pipeline を置き、`from pipeline.doc_registry import ...` で読み込む
+"""
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メール分類パイプライン全体の差分ビルド
+- 取得 → マスク → 定型行除去 → 形態素解析 → 正規化 → 特徴量 → 評価 を成果物のDAGとして扱う
+- 各段の入力ファイルの内容と、関係する設定（rule_config.json / nlp_config.json / model_config.json の一部）
+  からフィンガープリントを計算し、前回から変わった段とその下流だけを再実行する
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+STATE_FILE = Path(__file__).resolve().parent / '.build_state.json'
+STATE_VERSION = 1
+
+# すべての段が import する共通モジュール
+SHARED_CODE = ['pipeline/doc_registry.py']
+
+CONFIG_FILES = {
+    'rule': ROOT_DIR / 'preprocess_rules' / 'rule_config.json',
+    'nlp': ROOT_DIR / 'preprocess_nlp' / 'nlp_config.json',
+    'model': ROOT_DIR / 'classification_ml' / 'model_config.json'
+}
+
+def pick(config, *keys):
+    """設定から指定したキーだけを取り出す"""
+    return {key: config.get(key) for key in keys}
+
+def stage_path(cwd, path):
+    """段の実行ディレクトリ（cwd）から見た設定のパスを、リポジトリルートからの相対パスにする"""
+    return Path(os.path.normpath(Path(cwd) / path)).as_posix()
+
+def rule_dir(configs, key, default):
+    """rule_config.json の directories のパス（preprocess_rules/ からの相対パス）"""
+    return stage_path('preprocess_rules', configs['rule'].get('directories', {}).get(key, default))
+
+def nlp_value(configs, key, default=None):
+    """nlp_config.json の値（{"value": ...} の形式）"""
+    return configs['nlp'].get(key, {}).get('value', default)
+
+def nlp_path(configs, key, default):
+    """nlp_config.json のファイルのパス（preprocess_nlp/ からの相対パス）"""
+    return stage_path('preprocess_nlp', nlp_value(configs, key, default))
+
+def nlp_dir(configs, kind, stage, default):
+    """nlp_config.json の process_input / process_output の段のディレクトリ"""
+    return stage_path('preprocess_nlp', nlp_value(configs, kind, {}).get(stage, default))
+
+def model_data_dir(configs, data_source):
+    """model_config.json の data_paths のディレクトリ（classification_ml/ からの相対パス）"""
+    data_path = configs['model']['input']['data_paths'][data_source]
+    return stage_path('classification_ml', data_path.replace('*.txt', ''))
+
+def feature_input_dir(configs):
+    """model_config.json の data_source から特徴量生成の入力ディレクトリを求める"""
+    return model_data_dir(configs, configs['model']['input']['data_source'])
+
+def char_ngram_input_dir(configs):
+    """文字n-gram特徴量の入力ディレクトリ（char_ngram_params.data_source のパス、既定はマスク処理済みテキスト）"""
+    return model_data_dir(configs, configs['model'].get('char_ngram_params', {}).get('data_source', 'mask'))
+
+def feature_dir(configs, feature, key, default):
+    """model_config.json の output の特徴量の保存先（classification_ml/ からの相対パス）"""
+    return stage_path('classification_ml', configs['model']['output'].get(feature, {}).get(key, default))
+
+def results_dir(configs):
+    """評価結果の出力先"""
+    return stage_path('classification_ml', configs['model']['output']['results']['evaluation'])
+
+def feature_dirs(configs):
+    """評価の入力となる特徴量の保存先"""
+    return [feature_dir(configs, 'word2vec', 'vectors_path', 'features_word2vec'),
+            feature_dir(configs, 'tfidf', 'features_path', 'features_tfidf'),
+            feature_dir(configs, 'doc2vec', 'vectors_path', 'features_doc2vec'),
+            feature_dir(configs, 'char_ngram', 'features_path', 'features_char_ngram')]
+
+# 段の定義（実行順）
+# - cwd: 実行ディレクトリ（リポジトリルートからの相対パス）
+# - inputs: 入力となるファイル・ディレクトリ（各段のスクリプトと同じく設定から求める）
+#   スクリプトと、スクリプトと同じディレクトリのモジュールは stage_code で別に扱う
+# - config: 結果に影響する設定の一部
+# - outputs: 出力ディレクトリ・ファイル（設定から求める）
+# - clean: 再実行前に出力ディレクトリを削除するか（スクリプト自体が差分処理する段は False）
+# - update_args: 前回から設定が変わらず出力が残っている場合に付ける差分更新の引数（入力の文書だけが変わった場合）
+STAGES = [
+    {
+        'name': 'fetch',
+        'cwd': 'preprocess_rules',
+        'command': ['get_mail_imap.py'],
+        'inputs': lambda c: [],
+        'config': lambda c: pick(c['rule'], 'email', 'fetch_settings'),
+        'outputs': lambda c: [rule_dir(c, 'save_dir', 'mail_data')],
+        'clean': False,
+        'external': True
+    },
+    {
+        'name': 'mask',
+        'cwd': 'preprocess_rules',
+        'command': ['mask_mail_texts.py'],
+        'inputs': lambda c: [rule_dir(c, 'save_dir', 'mail_data')],
+        'config': lambda c: pick(c['rule'], 'directories', 'mask_filters'),
+        'outputs': lambda c: [rule_dir(c, 'masked_dir', 'mail_mask')],
+        'clean': False
+    },
+    {
+        'name': 'boilerplate',
+        'cwd': 'preprocess_nlp',
+        'command': ['boilerplate_filter.py'],
+        'inputs': lambda c: [nlp_dir(c, 'process_input', 'boilerplate', '../shared_mail_mask')],
+        'config': lambda c: pick(c['nlp'], 'boilerplate_params', 'process_input', 'process_output'),
+        'outputs': lambda c: [nlp_dir(c, 'process_output', 'boilerplate', 'texts_boilerplate')],
+        'clean': False
+    },
+    {
+        'name': 'tokenize',
+        'cwd': 'preprocess_nlp',
+        'command': ['tokenize_texts.py'],
+        'inputs': lambda c: [nlp_dir(c, 'process_input', 'tokenize', 'texts_boilerplate'),
+                             nlp_path(c, 'stopwords_file', 'stopwords.txt')],
+        'config': lambda c: pick(c['nlp'], 'default_pos_filter', 'tokenize_params', 'stopwords_file',
+                                 'process_input', 'process_output'),
+        'outputs': lambda c: [nlp_dir(c, 'process_output', 'tokenize', 'texts_tokenize')],
+        'clean': False
+    },
+    {
+        'name': 'normalize',
+        'cwd': 'preprocess_nlp',
+        'command': ['fuzzy_normalize.py'],
+        'inputs': lambda c: [nlp_dir(c, 'process_input', 'fuzzy', 'texts_tokenize'),
+                             nlp_path(c, 'fuzzy_patterns_file', 'fuzzy_patterns.json'),
+                             stage_path('preprocess_nlp', 'technical_terms.json')],
+        'config': lambda c: pick(c['nlp'], 'normalize_params', 'fuzzy_patterns_file',
+                                 'process_input', 'process_output'),
+        'outputs': lambda c: [nlp_dir(c, 'process_output', 'fuzzy', 'texts_fuzzy')],
+        'clean': False
+    },
+    {
+        'name': 'word2vec',
+        'cwd': 'classification_ml',
+        'command': ['models/generate_word2vec.py'],
+        'inputs': lambda c: [feature_input_dir(c)],
+        'config': lambda c: {**pick(c['model'], 'word2vec_params', 'dtype_params', 'input'),
+                             'output': c['model']['output']['word2vec']},
+        'outputs': lambda c: [feature_dir(c, 'word2vec', 'vectors_path', 'features_word2vec')],
+        'clean': False,
+        'update_args': ['--update']
+    },
+    {
+        'name': 'tfidf',
+        'cwd': 'classification_ml',
+        'command': ['models/generate_tfidf.py'],
+        'inputs': lambda c: [feature_input_dir(c)],
+        'config': lambda c: {**pick(c['model'], 'tfidf_params', 'dtype_params', 'input'),
+                             'output': c['model']['output']['tfidf']},
+        'outputs': lambda c: [feature_dir(c, 'tfidf', 'features_path', 'features_tfidf')],
+        'clean': False,
+        'update_args': ['--incremental']
+    },
+    {
+        'name': 'doc2vec',
+        'cwd': 'classification_ml',
+        'command': ['models/generate_doc2vec.py'],
+        'inputs': lambda c: [feature_input_dir(c)],
+        'config': lambda c: {**pick(c['model'], 'doc2vec_params', 'dtype_params', 'input'),
+                             'output': c['model']['output'].get('doc2vec')},
+        'outputs': lambda c: [feature_dir(c, 'doc2vec', 'vectors_path', 'features_doc2vec')],
+        'clean': False
+    },
+    {
+        'name': 'char_ngram',
+        'cwd': 'classification_ml',
+        'command': ['models/generate_char_ngram.py'],
+        'inputs': lambda c: [char_ngram_input_dir(c)],
+        'config': lambda c: {**pick(c['model'], 'char_ngram_params', 'dtype_params', 'input'),
+                             'output': c['model']['output'].get('char_ngram')},
+        'outputs': lambda c: [feature_dir(c, 'char_ngram', 'features_path', 'features_char_ngram')],
+        'clean': True
+    },
+    {
+        'name': 'evaluation',
+        'cwd': 'classification_ml',
+        'command': ['models/compare_features_and_models.py'],
+        'inputs': lambda c: feature_dirs(c) + [stage_path('classification_ml', c['model']['input']['labels_file'])],
+        'config': lambda c: pick(c['model'], 'model_params', 'reduction_params', 'dtype_params', 'input', 'output'),
+        'outputs': lambda c: [f"{results_dir(c)}/evaluation_summary.txt",
+                              f"{results_dir(c)}/feature_model_comparison.csv"],
+        'clean': False
+    }
+]
+
+STAGE_NAMES = [stage['name'] for stage in STAGES]
+
+def load_configs():
+    """3つの設定ファイルを読み込む（存在しないものは空の設定とする）"""
+    configs = {}
+    for key, path in CONFIG_FILES.items():
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                configs[key] = json.load(f)
+        else:
+            configs[key] = {}
+    return configs
+
+def load_state():
+    """前回のビルド状態を読み込む"""
+    if not STATE_FILE.exists():
+        return {'version': STATE_VERSION, 'stages': {}, 'file_hashes': {}}
+    with open(STATE_FILE, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        return {'version': STATE_VERSION, 'stages': {}, 'file_hashes': {}}
+    return state
+
+def save_state(state):
+    """ビルド状態を保存する"""
+    tmp_path = STATE_FILE.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+class FileHasher:
+    """ファイル内容のハッシュを計算する（サイズと更新時刻が同じファイルは前回の値を再利用）"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def file_hash(self, path):
+        stat = path.stat()
+        key = str(path.resolve())
+        cached = self.cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.cache[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def path_hash(self, rel_path):
+        """ファイルまたはディレクトリ（配下の全ファイル）のハッシュを返す"""
+        path = ROOT_DIR / rel_path
+        if not path.exists():
+            return None
+        if path.is_file():
+            return self.file_hash(path)
+        entries = []
+        for child in sorted(path.rglob('*')):
+            if child.is_file() and not child.name.startswith('.'):
+                entries.append(f"{child.relative_to(path)}:{self.file_hash(child)}")
+        return hashlib.sha1('\n'.join(entries).encode('utf-8')).hexdigest()
+
+    def code_hash(self, rel_paths):
+        """Pythonモジュールのハッシュを返す（ディレクトリは直下の *.py すべて）"""
+        entries = []
+        for rel_path in rel_paths:
+            path = ROOT_DIR / rel_path
+            files = sorted(path.glob('*.py')) if path.is_dir() else [path]
+            entries.extend(f"{file.relative_to(ROOT_DIR)}:{self.file_hash(file)}" for file in files if file.exists())
+        return hashlib.sha1('\n'.join(entries).encode('utf-8')).hexdigest()
+
+def stage_code(stage):
+    """段のスクリプトが import しうるモジュール（スクリプトと同じディレクトリの全モジュールと共通モジュール）"""
+    script_dir = Path(stage['cwd']) / Path(stage['command'][0]).parent
+    return [script_dir.as_posix()] + SHARED_CODE
+
+def stage_fingerprint(stage, configs, hasher):
+    """段のフィンガープリント（入力内容・設定の一部・コマンド・モジュール）を計算する"""
+    payload = {
+        'command': stage['command'],
+        'code': hasher.code_hash(stage_code(stage)),
+        'config': stage['config'](configs),
+        'inputs': {rel: hasher.path_hash(rel) for rel in stage['inputs'](configs)}
+    }
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def settings_fingerprint(stage, configs, hasher):
+    """段の設定（コマンド・設定の一部・モジュール）のフィンガープリント（差分更新できるかの判定に使う）"""
+    payload = {'command': stage['command'], 'config': stage['config'](configs),
+               'code': hasher.code_hash(stage_code(stage))}
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def outputs_exist(stage, configs):
+    """段の出力がすべて存在するか"""
+    return all((ROOT_DIR / rel).exists() for rel in stage['outputs'](configs))
+
+def run_stage(stage, configs, python, extra_args=()):
+    """段のスクリプトを実行する"""
+    if stage['clean']:
+        for rel in stage['outputs'](configs):
+            path = ROOT_DIR / rel
+            if path.is_dir():
+                shutil.rmtree(path)
+    command = [python] + stage['command'] + list(extra_args)
+    print(f"実行: (cd {stage['cwd']} && {' '.join(command)})", flush=True)
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT_DIR / stage['cwd'])
+    return result.returncode, time.perf_counter() - start
+
+def build(targets=None, force=(), fetch=False, dry_run=False, python=sys.executable):
+    """差分ビルドを実行する
+
+    Args:
+        targets (list): 実行対象の段（Noneの場合は fetch 以外の全段）
+        force (tuple): 変更の有無にかかわらず再実行する段
+        fetch (bool): メール取得（IMAP）を実行するか
+        dry_run (bool): 実行せずに判定結果だけを表示する
+    Returns:
+        bool: すべての段が成功した場合True
+    """
+    configs = load_configs()
+    state = load_state()
+    hasher = FileHasher(state.setdefault('file_hashes', {}))
+    targets = set(targets or STAGE_NAMES)
+    rerun_upstream = False
+
+    print("=== パイプラインの差分ビルド ===")
+    for stage in STAGES:
+        name = stage['name']
+        if name not in targets:
+            continue
+        if stage.get('external') and not fetch:
+            if not outputs_exist(stage, configs):
+                print(f"[{name}] 出力がありません（--fetch で取得してください）")
+                return False
+            print(f"[{name}] スキップ（外部データ、--fetch で再取得）")
+            continue
+
+        if dry_run and rerun_upstream:
+            print(f"[{name}] 上流の再実行後に判定")
+            continue
+
+        fingerprint = stage_fingerprint(stage, configs, hasher)
+        previous = state['stages'].get(name, {})
+        up_to_date = (previous.get('fingerprint') == fingerprint and outputs_exist(stage, configs)
+                      and name not in force and not stage.get('external'))
+        if up_to_date:
+            print(f"[{name}] 変更なし（前回 {previous.get('finished', '-')}, {previous.get('duration', 0):.1f}秒）")
+            continue
+
+        reason = '強制実行' if name in force else ('初回' if not previous else '入力または設定の変更')
+        if dry_run:
+            print(f"[{name}] 再実行対象（{reason}）")
+            rerun_upstream = True
+            continue
+
+        # 設定が前回と同じで出力が残っていれば、保存済みの状態に新しい文書だけを反映する
+        settings = settings_fingerprint(stage, configs, hasher)
+        extra_args = []
+        if (stage.get('update_args') and name not in force and previous.get('settings') == settings
+                and outputs_exist(stage, configs)):
+            extra_args = stage['update_args']
+            reason += '、差分更新'
+
+        print(f"\n[{name}] 再実行（{reason}）")
+        returncode, duration = run_stage(stage, configs, python, extra_args)
+        if returncode != 0:
+            print(f"エラー: [{name}] が失敗しました（終了コード {returncode}）")
+            save_state(state)
+            return False
+
+        # 実行後の入力で再計算して記録（実行中に入力が変わる段もあるため）
+        state['stages'][name] = {
+            'fingerprint': stage_fingerprint(stage, configs, hasher),
+            'settings': settings,
+            'finished': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': duration
+        }
+        save_state(state)
+        print(f"[{name}] 完了（{duration:.1f}秒）")
+
+    save_state(state)
+    print("\nビルドが完了しました")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='メール分類パイプラインを差分ビルドします')
+    parser.add_argument('stages', nargs='*', metavar='STAGE',
+                        help=f"実行する段（省略時は全段）: {', '.join(STAGE_NAMES)}")
+    parser.add_argument('--force', action='append', default=[], choices=STAGE_NAMES,
+                        help='変更がなくても再実行する段（複数指定可）')
+    parser.add_argument('--fetch', action='store_true',
+                        help='IMAPでメールを再取得する')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='実行せずに再実行が必要な段を表示する')
+    parser.add_argument('--python', default=sys.executable,
+                        help='各段の実行に使うPythonインタプリタ')
+
+    args = parser.parse_args()
+    unknown = [name for name in args.stages if name not in STAGE_NAMES]
+    if unknown:
+        parser.error(f"未知の段です: {', '.join(unknown)}")
+    ok = build(args.stages or None, tuple(args.force), args.fetch, args.dry_run, args.python)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
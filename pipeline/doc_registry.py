@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文書レジストリ（SQLite）
+- 取り込み時（マスク処理）に各メールへ安定した整数の文書IDを割り当てる
+- 各段の出力ファイル（成果物）とハッシュ、ラベルを文書IDに紐づけて記録する
+- 各段はディレクトリの走査やファイル名の解析の代わりに、インデックス付きの検索・結合で入力とラベルを求める
+- 書き込みは1件ごとに短いトランザクションで確定し、複数の段・ワーカーが同時に書き込めるようにする
+"""
+
+import os
+import csv
+import sqlite3
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / 'doc_registry.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY,
+    source_name TEXT NOT NULL UNIQUE,
+    content_hash TEXT,
+    label TEXT,
+    ingested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    doc_id INTEGER NOT NULL REFERENCES documents(doc_id),
+    stage TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    content_hash TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (dir, name)
+);
+CREATE INDEX IF NOT EXISTS artifacts_doc ON artifacts(doc_id, stage);
+CREATE INDEX IF NOT EXISTS artifacts_name ON artifacts(name);
+"""
+
+def text_hash(text):
+    """テキストのハッシュ値を返す"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def file_hash(path):
+    """ファイル内容のハッシュ値を返す"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _dir_key(directory):
+    """ディレクトリの比較用キー（シンボリックリンクを解決した絶対パス）"""
+    return str(Path(directory).resolve())
+
+def unregistered_error(directory):
+    """レジストリに記録のないディレクトリを読もうとした場合のエラー"""
+    return ValueError(f"文書レジストリに {directory} の記録がありません。"
+                      "先に取り込み（preprocess_rules/mask_mail_texts.py）と上流の段を実行してください"
+                      "（python pipeline/build_pipeline.py）")
+
+class DocRegistry:
+    """文書IDと成果物を管理するレジストリ
+
+    read_only=True の場合は読み込み専用で開き、書き込みのロックを取らない
+    （レジストリがまだない場合は空のレジストリとして扱う）
+    """
+
+    def __init__(self, db_path=None, read_only=False):
+        db_path = db_path or os.environ.get('MAIL_DOC_REGISTRY', DEFAULT_DB_PATH)
+        self.db_path = Path(db_path)
+        if read_only:
+            if self.db_path.exists():
+                self.conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=30)
+            else:
+                self.conn = sqlite3.connect(':memory:')
+                self.conn.executescript(SCHEMA)
+            return
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # WAL では NORMAL でも壊れないため、1件ごとの確定を軽くする
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest(self, source_name, content_hash):
+        """元メールを登録して文書IDを返す
+
+        同じ元ファイル名はいつも同じIDになる。新規登録時は最大ID+1を割り当てる
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.conn:
+            row = self.conn.execute('SELECT doc_id, content_hash FROM documents WHERE source_name = ?',
+                                    (source_name,)).fetchone()
+            if row is not None:
+                if row[1] != content_hash:
+                    self.conn.execute('UPDATE documents SET content_hash = ?, ingested_at = ? WHERE doc_id = ?',
+                                      (content_hash, now, row[0]))
+                return row[0]
+            doc_id = self.conn.execute('SELECT COALESCE(MAX(doc_id), 0) + 1 FROM documents').fetchone()[0]
+            self.conn.execute('INSERT INTO documents (doc_id, source_name, content_hash, ingested_at) '
+                              'VALUES (?, ?, ?, ?)', (doc_id, source_name, content_hash, now))
+        return doc_id
+
+    def record_artifact(self, doc_id, stage, path, content_hash):
+        """段の出力ファイルを記録する（記録ごとに確定し、書き込みのロックを持ち続けない）"""
+        path = Path(path)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO artifacts (doc_id, stage, dir, name, content_hash, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (doc_id, stage, _dir_key(path.parent), path.name, content_hash,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def sync_dir(self, directory, doc_ids):
+        """ディレクトリの記録のうち、doc_ids に含まれない文書の記録を削除する"""
+        keep = set(doc_ids)
+        rows = self.conn.execute('SELECT doc_id FROM artifacts WHERE dir = ?', (_dir_key(directory),)).fetchall()
+        stale = [(_dir_key(directory), doc_id) for (doc_id,) in rows if doc_id not in keep]
+        with self.conn:
+            self.conn.executemany('DELETE FROM artifacts WHERE dir = ? AND doc_id = ?', stale)
+
+    def artifacts_in(self, directory):
+        """ディレクトリに記録された成果物を文書ID順に返す
+
+        Returns:
+            list: (doc_id, ファイルパス, ハッシュ) のリスト（存在しないファイルは除く）
+        """
+        directory = Path(directory)
+        rows = self.conn.execute('SELECT doc_id, name, content_hash FROM artifacts WHERE dir = ? ORDER BY doc_id',
+                                 (_dir_key(directory),)).fetchall()
+        return [(doc_id, directory / name, digest) for doc_id, name, digest in rows
+                if (directory / name).exists()]
+
+    def import_labels(self, label_map):
+        """labels.csv（成果物のファイル名 -> ラベル）を文書IDに紐づけて登録する
+
+        Returns:
+            int: 文書IDに紐づけられたラベルの数
+        """
+        matched = 0
+        with self.conn:
+            for name, label in label_map.items():
+                doc_id = self._doc_id_for(name)
+                if doc_id is not None:
+                    self.conn.execute('UPDATE documents SET label = ? WHERE doc_id = ?', (label, doc_id))
+                    matched += 1
+        return matched
+
+    def _doc_id_for(self, name):
+        """成果物のファイル名に対応する文書ID（記録がない場合は None）"""
+        row = self.conn.execute('SELECT doc_id FROM artifacts WHERE name = ? LIMIT 1', (name,)).fetchone()
+        return row[0] if row else None
+
+    def labels_in_dir(self, directory):
+        """ディレクトリの成果物ファイル名 -> ラベル の対応を返す（ラベル未設定の文書は除く）"""
+        rows = self.conn.execute(
+            'SELECT a.name, d.label FROM artifacts a JOIN documents d ON a.doc_id = d.doc_id '
+            'WHERE a.dir = ? AND d.label IS NOT NULL', (_dir_key(directory),)).fetchall()
+        return dict(rows)
+
+    def resolve_labels(self, directory, label_map):
+        """ディレクトリの成果物ファイル名 -> ラベル の対応を返す（レジストリには書き込まない）
+
+        label_map（labels.csv のファイル名 -> ラベル）を文書IDに紐づけて使い、
+        label_map にない文書は取り込み済み（--import-labels）のラベルを使う。
+        ディレクトリの記録がない場合はエラーとする
+        """
+        if self.conn.execute('SELECT 1 FROM artifacts WHERE dir = ? LIMIT 1',
+                             (_dir_key(directory),)).fetchone() is None:
+            raise unregistered_error(directory)
+        doc_labels = dict(self.conn.execute('SELECT doc_id, label FROM documents WHERE label IS NOT NULL'))
+        for name, label in label_map.items():
+            doc_id = self._doc_id_for(name)
+            if doc_id is not None:
+                doc_labels[doc_id] = label
+        rows = self.conn.execute('SELECT doc_id, name FROM artifacts WHERE dir = ?', (_dir_key(directory),))
+        return {name: doc_labels[doc_id] for doc_id, name in rows if doc_id in doc_labels}
+
+    def summary(self):
+        """登録状況（文書数・ラベル数・ディレクトリごとの成果物数）を返す"""
+        documents, labeled = self.conn.execute(
+            'SELECT COUNT(*), COUNT(label) FROM documents').fetchone()
+        dirs = self.conn.execute(
+            'SELECT stage, dir, COUNT(*) FROM artifacts GROUP BY stage, dir ORDER BY stage').fetchall()
+        return {'documents': documents, 'labeled': labeled, 'artifacts': dirs}
+
+def open_registry(db_path=None, read_only=False):
+    """レジストリを開く（read_only: 評価など読み込むだけの処理で、書き込みのロックを取らない）"""
+    return DocRegistry(db_path, read_only)
+
+def ingest_directory(registry, input_dir, pattern='*.txt'):
+    """元メールのディレクトリを取り込み、(doc_id, パス) のリストを文書ID順に返す"""
+    inputs = []
+    for path in sorted(Path(input_dir).glob(pattern)):
+        doc_id = registry.ingest(path.name, file_hash(path))
+        inputs.append((doc_id, path))
+    return sorted(inputs)
+
+def list_inputs(registry, input_dir):
+    """段の入力を (doc_id, パス) のリストで返す（レジストリに入力ディレクトリの記録がない場合はエラー）"""
+    rows = registry.artifacts_in(input_dir)
+    if not rows:
+        raise unregistered_error(input_dir)
+    return [(doc_id, path) for doc_id, path, _ in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description='文書レジストリの登録状況の表示・ラベルの取り込みを行います')
+    parser.add_argument('--db', help='レジストリのパス')
+    parser.add_argument('--import-labels', help='取り込むラベルファイル（labels.csv）')
+
+    args = parser.parse_args()
+    with open_registry(args.db) as registry:
+        if args.import_labels:
+            with open(args.import_labels, encoding='utf-8') as f:
+                label_map = {row[0]: row[1] for row in csv.reader(f) if len(row) >= 2}
+            matched = registry.import_labels(label_map)
+            print(f"ラベルを取り込みました: {matched}/{len(label_map)}件")
+        summary = registry.summary()
+        print(f"文書数: {summary['documents']}件（ラベル付き {summary['labeled']}件）")
+        for stage, directory, count in summary['artifacts']:
+            print(f"- {stage:<12} {count:6d}件  {directory}")
+
+if __name__ == '__main__':
+    main()
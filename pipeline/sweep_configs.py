@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前処理・特徴量設定の組み合わせを並列に評価するスイープ
+- sweep_config.json の grid に列挙した設定値の全組み合わせ（バリアント）を評価する
+- 形態素解析・正規化・特徴量生成の成果物は、設定と上流が同じバリアント間で1回だけ計算して共有する
+- 依存関係のない成果物は全コアで並列に実行し、結果はバリアントごとに1行ずつ実験履歴に追記する
+- 同時に実行する成果物の数でCPUを分け、各成果物のプロセス・スレッド数（Word2Vec の workers、
+  評価の model_params.parallel.workers）をその予算に制限する
+"""
+
+import os
+import sys
+import csv
+import copy
+import json
+import hashlib
+import argparse
+import itertools
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from build_pipeline import ROOT_DIR, STAGES, FileHasher, stage_code, load_configs, load_state, save_state, build
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+SWEEP_STAGES = ['tokenize', 'normalize', 'word2vec', 'tfidf', 'evaluation']
+STAGE_LEVELS = [['tokenize'], ['normalize'], ['word2vec', 'tfidf'], ['evaluation']]
+STAGE_CONFIG = {stage['name']: stage['config'] for stage in STAGES}
+
+def load_sweep_config(path):
+    """スイープ設定を読み込む"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def set_path(config, dotted_path, value):
+    """ドット区切りのパスで設定値を上書きする"""
+    keys = dotted_path.split('.')
+    target = config
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+def format_value(value):
+    """バリアント名用に設定値を短く表す"""
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    if isinstance(value, dict):
+        return 'on' if any(v for v in value.values() if isinstance(v, bool)) else 'off'
+    return str(value)
+
+def expand_grid(base_configs, grid):
+    """grid の全組み合わせについてバリアント（名前と設定）を作成する"""
+    variants = []
+    for values in itertools.product(*[entry['values'] for entry in grid]):
+        configs = copy.deepcopy(base_configs)
+        labels = []
+        for entry, value in zip(grid, values):
+            if entry['config'] not in ('nlp', 'model'):
+                raise ValueError(f"スイープできるのは nlp / model の設定のみです: {entry['name']}")
+            set_path(configs[entry['config']], entry['path'], value)
+            labels.append(f"{entry['name']}={format_value(value)}")
+        variants.append({'label': ','.join(labels), 'configs': configs})
+    return variants
+
+def digest(*parts):
+    """設定と上流のキーから成果物のキーを作る"""
+    text = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+def plan_artifacts(variants, source_hash, labels_hash, code_hashes):
+    """バリアントごとに必要な成果物を求め、同じキーの成果物をまとめる
+
+    Args:
+        code_hashes (dict): 段の名前 -> 段のモジュールのハッシュ（スクリプトを変更したら作り直す）
+    Returns:
+        dict: キー -> 成果物（stage, deps, configs, variants）
+    """
+    artifacts = {}
+
+    def add(stage, key, deps, configs, label):
+        artifact = artifacts.setdefault(key, {'stage': stage, 'key': key, 'deps': deps,
+                                              'configs': configs, 'variants': []})
+        artifact['variants'].append(label)
+        return key
+
+    for variant in variants:
+        c = variant['configs']
+        label = variant['label']
+        tokenize = add('tokenize', digest('tokenize', STAGE_CONFIG['tokenize'](c), code_hashes['tokenize'],
+                                          source_hash),
+                       {}, c, label)
+        # 正規化の成果物はゆらぎ補正後のテキストを使うバリアントだけが必要とする
+        source = tokenize
+        if c['model']['input']['data_source'] == 'fuzzy':
+            source = add('normalize', digest('normalize', STAGE_CONFIG['normalize'](c), code_hashes['normalize'],
+                                             tokenize),
+                         {'texts': tokenize}, c, label)
+        word2vec = add('word2vec', digest('word2vec', STAGE_CONFIG['word2vec'](c), code_hashes['word2vec'], source),
+                       {'texts': source}, c, label)
+        tfidf = add('tfidf', digest('tfidf', STAGE_CONFIG['tfidf'](c), code_hashes['tfidf'], source),
+                    {'texts': source}, c, label)
+        evaluation = add('evaluation', digest('evaluation', STAGE_CONFIG['evaluation'](c), code_hashes['evaluation'],
+                                              word2vec, tfidf, labels_hash),
+                         {'word2vec': word2vec, 'tfidf': tfidf}, c, label)
+        variant['evaluation'] = evaluation
+    return artifacts
+
+class SweepRunner:
+    """成果物を作業ディレクトリに生成する"""
+
+    def __init__(self, work_dir, python):
+        self.work_dir = Path(work_dir)
+        self.python = python
+
+    def artifact_dir(self, key):
+        return self.work_dir / key
+
+    def is_done(self, artifact):
+        marker = self.artifact_dir(artifact['key']) / '.done'
+        return marker.exists()
+
+    def write_configs(self, artifact, cpu_budget):
+        """成果物用の nlp_config.json / model_config.json を書き出す
+
+        Args:
+            cpu_budget (int): この成果物が使ってよいCPU数（並列数の設定に書き込む。成果物のキーには含めない）
+        """
+        out_dir = self.artifact_dir(artifact['key'])
+        configs = copy.deepcopy(artifact['configs'])
+        nlp_path = out_dir / 'nlp_config.json'
+        with open(nlp_path, 'w', encoding='utf-8') as f:
+            json.dump(configs['nlp'], f, ensure_ascii=False, indent=4)
+
+        model = configs['model']
+        deps = {name: self.artifact_dir(key) for name, key in artifact['deps'].items()}
+        data_source = model['input']['data_source']
+        if 'texts' in deps:
+            model['input']['data_paths'][data_source] = str(deps['texts'] / 'texts' / '*.txt')
+        model['input']['labels_file'] = str(ROOT_DIR / 'classification_ml' / model['input']['labels_file'])
+        model['input']['preprocess_config'] = str(nlp_path)
+        word2vec_dir = deps.get('word2vec', out_dir)
+        tfidf_dir = deps.get('tfidf', out_dir)
+        model['output']['word2vec'] = {'model_path': str(word2vec_dir / 'word2vec.model'),
+                                       'vectors_path': str(word2vec_dir / 'features')}
+        model['output']['tfidf'] = {'features_path': str(tfidf_dir / 'features')}
+        # Doc2Vec・文字n-gramはスイープの対象外（共有の特徴量を評価に混ぜない）
+        model['output']['doc2vec'] = {'model_path': str(out_dir / 'doc2vec' / 'doc2vec.model'),
+                                      'vectors_path': str(out_dir / 'doc2vec')}
+        model['output']['char_ngram'] = {'features_path': str(out_dir / 'char_ngram')}
+        model['output']['results'] = {'evaluation': str(out_dir / 'results')}
+        model.setdefault('word2vec_params', {})['workers'] = cpu_budget
+        model.setdefault('model_params', {}).setdefault('parallel', {})['workers'] = cpu_budget
+        model_path = out_dir / 'model_config.json'
+        with open(model_path, 'w', encoding='utf-8') as f:
+            json.dump(model, f, ensure_ascii=False, indent=4)
+        return nlp_path, model_path
+
+    def command(self, artifact, nlp_path, model_path, base_configs):
+        """成果物を生成するコマンドと実行ディレクトリ"""
+        stage = artifact['stage']
+        out_dir = self.artifact_dir(artifact['key'])
+        if stage == 'tokenize':
+            indir = ROOT_DIR / 'preprocess_nlp' / base_configs['nlp']['process_input']['value']['tokenize']
+            return 'preprocess_nlp', ['tokenize_texts.py', '--config', str(nlp_path),
+                                      '--indir', str(indir), '--outdir', str(out_dir / 'texts')]
+        if stage == 'normalize':
+            indir = self.artifact_dir(artifact['deps']['texts']) / 'texts'
+            return 'preprocess_nlp', ['fuzzy_normalize.py', '--config', str(nlp_path),
+                                      '--indir', str(indir), '--outdir', str(out_dir / 'texts')]
+        scripts = {
+            'word2vec': 'models/generate_word2vec.py',
+            'tfidf': 'models/generate_tfidf.py',
+            'evaluation': 'models/compare_features_and_models.py'
+        }
+        return 'classification_ml', [scripts[stage], '--config', str(model_path)]
+
+    def run(self, artifact, base_configs, cpu_budget=1):
+        """成果物を1つ生成する（ログは成果物ディレクトリに保存）"""
+        out_dir = self.artifact_dir(artifact['key'])
+        out_dir.mkdir(parents=True, exist_ok=True)
+        nlp_path, model_path = self.write_configs(artifact, cpu_budget)
+        cwd, args = self.command(artifact, nlp_path, model_path, base_configs)
+        with open(out_dir / 'log.txt', 'w', encoding='utf-8') as log:
+            result = subprocess.run([self.python] + args, cwd=ROOT_DIR / cwd,
+                                    stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode == 0:
+            (out_dir / '.done').write_text(artifact['key'], encoding='utf-8')
+        return artifact, result.returncode
+
+def append_history(history_file, row):
+    """実験履歴に1行追記する（既存のカラム順を維持）"""
+    history_file = Path(history_file)
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    columns = list(row.keys())
+    if history_file.exists():
+        with open(history_file, encoding='utf-8') as f:
+            header = next(csv.reader(f), None)
+        if header:
+            columns = header
+    new_file = not history_file.exists()
+    with open(history_file, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+
+def read_last_history_row(results_dir):
+    """バリアントの評価結果から実験履歴の最終行を読み込む"""
+    history_file = Path(results_dir) / 'classification_history.csv'
+    if not history_file.exists():
+        return None
+    with open(history_file, encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    return rows[-1] if rows else None
+
+def sweep(sweep_config_path, max_workers=None, dry_run=False, build_upstream=True, python=sys.executable):
+    """スイープを実行する"""
+    sweep_config = load_sweep_config(sweep_config_path)
+    work_dir = PIPELINE_DIR / sweep_config.get('work_dir', 'sweep_work')
+    history_file = (PIPELINE_DIR / sweep_config['history_file']).resolve()
+    if max_workers is None:
+        max_workers = sweep_config.get('max_workers', 0)
+    cpu_count = os.cpu_count() or 1
+    if max_workers <= 0:
+        max_workers = cpu_count
+
+    # 共有する上流（マスク・定型行除去）は差分ビルドで最新にしておく
+    if build_upstream and not dry_run:
+        if not build(['mask', 'boilerplate'], python=python):
+            return False
+
+    base_configs = load_configs()
+    state = load_state()
+    hasher = FileHasher(state.setdefault('file_hashes', {}))
+    source_dir = Path('preprocess_nlp') / base_configs['nlp']['process_input']['value']['tokenize']
+    source_hash = hasher.path_hash(str(source_dir))
+    labels_hash = hasher.path_hash(str(Path('classification_ml') / base_configs['model']['input']['labels_file']))
+    code_hashes = {stage['name']: hasher.code_hash(stage_code(stage)) for stage in STAGES
+                   if stage['name'] in SWEEP_STAGES}
+    save_state(state)
+
+    variants = expand_grid(base_configs, sweep_config['grid'])
+    artifacts = plan_artifacts(variants, source_hash, labels_hash, code_hashes)
+    runner = SweepRunner(work_dir, python)
+
+    print("\n=== 前処理・特徴量設定のスイープ ===")
+    print(f"バリアント数: {len(variants)}件, 並列数: {max_workers}")
+    for stage in SWEEP_STAGES:
+        stage_artifacts = [a for a in artifacts.values() if a['stage'] == stage]
+        done = sum(1 for a in stage_artifacts if runner.is_done(a))
+        print(f"- {stage}: {len(stage_artifacts)}種類（計算済み {done}件）")
+    if dry_run:
+        for variant in variants:
+            print(f"  {variant['label']} -> {variant['evaluation']}")
+        return True
+
+    evaluated = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for level in STAGE_LEVELS:
+            pending = [a for a in artifacts.values() if a['stage'] in level and not runner.is_done(a)]
+            # 同時に実行する成果物でCPUを分ける（成果物 × 各成果物の並列数 がCPU数を超えないようにする）
+            cpu_budget = max(1, cpu_count // max(1, min(max_workers, len(pending))))
+            futures = [executor.submit(runner.run, a, base_configs, cpu_budget) for a in pending]
+            failed = False
+            for future in futures:
+                artifact, returncode = future.result()
+                status = '完了' if returncode == 0 else f'失敗（終了コード {returncode}）'
+                print(f"[{artifact['stage']}:{artifact['key']}] {status} - {' / '.join(artifact['variants'])}")
+                if returncode != 0:
+                    print(f"  ログ: {runner.artifact_dir(artifact['key']) / 'log.txt'}")
+                    failed = True
+                elif artifact['stage'] == 'evaluation':
+                    evaluated.add(artifact['key'])
+            if failed:
+                return False
+
+    # すべてのバリアントを1行ずつ実験履歴に追記（前回までに評価済みの結果は備考にキャッシュと記録）
+    print("\n=== スイープ結果 ===")
+    appended = 0
+    for variant in variants:
+        row = read_last_history_row(runner.artifact_dir(variant['evaluation']) / 'results')
+        if row is None:
+            print(f"{variant['label']:<50} 結果なし")
+            continue
+        cached = variant['evaluation'] not in evaluated
+        print(f"{variant['label']:<50} {row['特徴量手法']} + {row['分類モデル']}  F1={row['F1スコア']}"
+              f"{'（キャッシュ）' if cached else ''}")
+        nlp = variant['configs']['nlp']
+        normalize_params = nlp['normalize_params']['value']
+        row['ストップワード設定'] = 'あり' if nlp['tokenize_params']['value'].get('enable_stopwords', False) else 'なし'
+        row['ゆらぎ補正'] = 'あり' if (normalize_params.get('enable_number_normalize', False) or
+                                   normalize_params.get('enable_kana_normalize', False)) else 'なし'
+        row['備考・変更点'] = f"sweep{'（キャッシュ）' if cached else ''}: {variant['label']}"
+        append_history(history_file, row)
+        appended += 1
+    print(f"\n履歴に{appended}行を追記しました: {history_file}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='前処理・特徴量設定の組み合わせを並列に評価します')
+    parser.add_argument('--config', default=str(PIPELINE_DIR / 'sweep_config.json'),
+                        help='スイープ設定ファイルのパス')
+    parser.add_argument('--max-workers', type=int,
+                        help='同時に実行する成果物の数（設定ファイルの値を上書き、0でCPU数）')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='実行せずにバリアントと共有される成果物の数を表示する')
+    parser.add_argument('--no-upstream', action='store_true',
+                        help='マスク・定型行除去の差分ビルドを行わない')
+    parser.add_argument('--python', default=sys.executable,
+                        help='各処理の実行に使うPythonインタプリタ')
+
+    args = parser.parse_args()
+    ok = sweep(args.config, args.max_workers, args.dry_run, not args.no_upstream, args.python)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+作業単位のキューによる分散実行
+- コーディネーターが処理を作業単位に分けて共有キュー（multiprocessing.managers の TCP サーバー）に投入する
+- 任意の台数のノードで起動したワーカーがキューから作業単位を取り出して処理し、結果を返す
+- 結果はコーディネーターが集めて書き出す（前処理は通常の前処理の出力先とは別のディレクトリ、評価結果は通常の評価と同じ場所）
+- ワーカーは処理中の作業単位のリースを定期的に更新し、更新が途絶えた作業単位だけを再投入する
+- 各ワーカープロセスの並列数（交差検証の n_jobs・Word2Vec の workers）はノードのCPU数をプロセス数で割った値にする
+
+作業単位:
+- preprocess: 数件の文書ごとにマスク処理 → 形態素解析 → 正規化（stream_preprocess.build_stage を利用）
+- features: 特徴量（評価と同じ一覧: Word2Vec / TF-IDF / Doc2Vec / 文字n-gram）ごとの生成
+- evaluate: 特徴量 × モデルごとのパラメータ探索と評価
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import traceback
+from pathlib import Path
+from contextlib import contextmanager
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PREPROCESS_DIR = ROOT_DIR / 'preprocess_nlp'
+CLASSIFICATION_DIR = ROOT_DIR / 'classification_ml'
+MODELS_DIR = CLASSIFICATION_DIR / 'models'
+DEFAULT_CONFIG = Path(__file__).resolve().parent / 'work_queue_config.json'
+
+# ワーカーはリポジトリの各処理のモジュールをそのまま利用する（文書レジストリは pipeline パッケージとして読み込む）
+for path in (ROOT_DIR, PREPROCESS_DIR, MODELS_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+STAGES = ('preprocess', 'evaluate')
+
+class JobBoard:
+    """ジョブごとの共通データ（設定・文書など）を保持し、ワーカーに1回だけ渡す"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def put(self, job_id, payload):
+        self.jobs[job_id] = payload
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def remove(self, job_id):
+        self.jobs.pop(job_id, None)
+
+class LeaseQueue:
+    """作業単位のキュー（取り出された作業単位はリースとして記録し、ワーカーが処理中に更新する）"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.leases = {}
+        self.lock = threading.Lock()
+
+    def put(self, unit):
+        self.queue.put(unit)
+
+    def take(self, worker, timeout):
+        """作業単位を取り出し、同時にリースを記録する（空の場合は queue.Empty）"""
+        unit = self.queue.get(timeout=timeout)
+        if unit is not None:
+            with self.lock:
+                self.leases[(unit['job'], unit['id'])] = (worker, time.monotonic())
+        return unit
+
+    def renew(self, job_id, unit_id):
+        """処理中の作業単位のリースを更新する"""
+        with self.lock:
+            key = (job_id, unit_id)
+            if key in self.leases:
+                self.leases[key] = (self.leases[key][0], time.monotonic())
+
+    def release(self, job_id, unit_id):
+        """結果を受け取った作業単位のリースを削除する"""
+        with self.lock:
+            self.leases.pop((job_id, unit_id), None)
+
+    def expire(self, job_id, lease_timeout):
+        """lease_timeout 秒以上更新されていないリースを削除し、(作業単位ID, ワーカー名) のリストで返す"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [(key, worker) for key, (worker, renewed) in self.leases.items()
+                       if key[0] == job_id and now - renewed > lease_timeout]
+            for key, _ in expired:
+                del self.leases[key]
+        return [(key[1], worker) for key, worker in expired]
+
+    def clear(self, job_id):
+        """ジョブのリースをすべて削除する"""
+        with self.lock:
+            for key in [key for key in self.leases if key[0] == job_id]:
+                del self.leases[key]
+
+# サーバープロセス側で保持するキューとジョブ
+_tasks = LeaseQueue()
+_results = queue.Queue()
+_board = JobBoard()
+
+def _get_tasks():
+    return _tasks
+
+def _get_results():
+    return _results
+
+def _get_board():
+    return _board
+
+class QueueManager(BaseManager):
+    pass
+
+QueueManager.register('get_tasks', callable=_get_tasks)
+QueueManager.register('get_results', callable=_get_results)
+QueueManager.register('get_board', callable=_get_board)
+
+def load_config(config_file=DEFAULT_CONFIG):
+    """分散実行の設定を読み込む"""
+    with open(config_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def parse_address(address):
+    """'host:port' を (host, port) に変換する"""
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def resolve_authkey(config, authkey=None):
+    """認証キーを決める（引数 > 環境変数 > 設定ファイル）"""
+    authkey = authkey or os.environ.get(config.get('authkey_env', 'MAIL_QUEUE_AUTHKEY')) or config.get('authkey')
+    if not authkey:
+        raise ValueError("認証キーが設定されていません（--authkey または環境変数で指定してください）")
+    return authkey.encode('utf-8')
+
+def connect(address, authkey):
+    """キューサーバーに接続する"""
+    manager = QueueManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager
+
+@contextmanager
+def working_dir(path):
+    """一時的に作業ディレクトリを変更する（各処理の設定ファイルは相対パスで書かれているため）"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+# ---------------------------------------------------------------------------
+# ワーカー
+# ---------------------------------------------------------------------------
+
+def _prepare_job(job):
+    """ジョブごとに1回だけ行う準備（辞書・正規表現の読み込み、このノードでのキャッシュの場所など）"""
+    if job['kind'] == 'preprocess':
+        from stream_preprocess import build_stage
+        job['processors'] = [(stage, build_stage(stage, job['settings'])) for stage in job['stages']]
+    if job['kind'] == 'evaluate':
+        # 探索結果のキャッシュは設定のパスを各ノードの classification_ml/ から解決する
+        cache_path = job['fit_cache_path']
+        job['fit_cache_dir'] = (CLASSIFICATION_DIR / cache_path).resolve() if cache_path is not None else None
+    return job
+
+def handle_unit(unit, job, n_jobs=1):
+    """作業単位を処理して結果を返す（n_jobs はこのワーカープロセスが使ってよいCPU数）"""
+    kind = unit['kind']
+
+    if kind == 'preprocess':
+        outputs = []
+        for doc_id, text in unit['payload']:
+            stage_outputs = {}
+            for stage, process in job['processors']:
+                text = process(text)
+                stage_outputs[stage] = text
+            outputs.append((doc_id, stage_outputs))
+        return outputs
+
+    if kind == 'features':
+        feature = unit['payload']['feature']
+        docs = job['docs'][feature]
+        if feature == 'Word2Vec':
+            from generate_word2vec import train_word2vec, compute_doc_vectors
+            word2vec_params = dict(job['word2vec_params'], workers=n_jobs)
+            model = train_word2vec(docs, word2vec_params)
+            return compute_doc_vectors(docs, model, word2vec_params, job['dtype'])
+        if feature == 'TF-IDF':
+            from generate_tfidf import build_tfidf_features
+            X, _ = build_tfidf_features([" ".join(tokens) for tokens in docs], job['tfidf_params'], job['dtype'])
+            return X.tocsr()
+        if feature == 'Doc2Vec':
+            from generate_doc2vec import build_doc2vec_in_memory
+            doc2vec_params = dict(job['doc2vec_params'], workers=n_jobs, infer_workers=n_jobs)
+            return build_doc2vec_in_memory(docs, doc2vec_params, job['dtype'])
+        if feature == 'CharNgram':
+            from generate_char_ngram import build_char_ngram_features
+            X, _, _ = build_char_ngram_features(docs, job['char_ngram_params'], job['dtype'])
+            return X.tocsr()
+        raise ValueError(f"未知の特徴量です: {feature}")
+
+    if kind == 'evaluate':
+        from compare_features_and_models import tune_model, evaluate_model
+        feature_name = unit['payload']['feature']
+        name = unit['payload']['model']
+        X_train, X_test, y_train, y_test = job['datasets'][feature_name]
+        # 探索結果のキャッシュは通常の評価と共有する（探索したモデルは学習済みのため学習し直さない）
+        model, search = tune_model(name, X_train, y_train, job['model_params'], job['fit_cache_dir'],
+                                   n_jobs=n_jobs)
+        result = evaluate_model(model, X_train, X_test, y_train, y_test, name, feature_name, fit=False)
+        result['search'] = search
+        return result
+
+    raise ValueError(f"未知の作業単位です: {kind}")
+
+def _heartbeat(tasks, unit, interval, stop):
+    """作業単位の処理中、interval 秒ごとにリースを更新する"""
+    while not stop.wait(interval):
+        try:
+            tasks.renew(unit['job'], unit['id'])
+        except (EOFError, ConnectionError, OSError):
+            return
+
+def worker_loop(address, authkey, poll_interval=1.0, n_jobs=1, heartbeat_interval=10.0):
+    """キューから作業単位を取り出して処理し続ける（停止指示またはサーバー終了で終わる）"""
+    worker_name = f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        manager = connect(address, authkey)
+    except (ConnectionError, OSError) as e:
+        print(f"[{worker_name}] キューサーバーに接続できません: {e}", flush=True)
+        return
+    tasks = manager.get_tasks()
+    results = manager.get_results()
+    board = manager.get_board()
+
+    current_job_id = None
+    current_job = None
+    processed = 0
+    while True:
+        try:
+            unit = tasks.take(worker_name, poll_interval)
+        except queue.Empty:
+            continue
+        except (EOFError, ConnectionError, OSError):
+            break
+        if unit is None:
+            break
+
+        start = time.perf_counter()
+        # 結果を返し終えるまでリースを更新し続ける（長い探索が再投入されないように）
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(tasks, unit, heartbeat_interval, stop), daemon=True)
+        heartbeat.start()
+        try:
+            try:
+                # ジョブの共通データはジョブが変わったときだけ取得する
+                if unit['job'] != current_job_id:
+                    current_job = _prepare_job(board.get(unit['job']))
+                    current_job_id = unit['job']
+                value = handle_unit(unit, current_job, n_jobs)
+                result = {'ok': True, 'value': value}
+            except Exception:
+                result = {'ok': False, 'error': traceback.format_exc()}
+            result.update({'job': unit['job'], 'id': unit['id'], 'worker': worker_name,
+                           'elapsed': time.perf_counter() - start})
+            results.put(result)
+        except (EOFError, ConnectionError, OSError):
+            break
+        finally:
+            stop.set()
+            heartbeat.join()
+        processed += 1
+    print(f"[{worker_name}] 終了します（処理 {processed}件）", flush=True)
+
+def start_workers(address, authkey, num_workers, poll_interval=1.0, n_jobs=0, heartbeat_interval=10.0):
+    """ワーカープロセスを起動する
+
+    Args:
+        n_jobs (int): 各プロセスが使うCPU数（0の場合はノードのCPU数をプロセス数で割った値）
+    """
+    if n_jobs <= 0:
+        n_jobs = max(1, (os.cpu_count() or 1) // max(1, num_workers))
+    processes = [Process(target=worker_loop, args=(address, authkey, poll_interval, n_jobs, heartbeat_interval))
+                 for _ in range(num_workers)]
+    for p in processes:
+        p.start()
+    return processes
+
+# ---------------------------------------------------------------------------
+# コーディネーター
+# ---------------------------------------------------------------------------
+
+class Coordinator:
+    """作業単位の投入と結果の回収を行う"""
+
+    def __init__(self, manager, lease_timeout=60.0):
+        self.tasks = manager.get_tasks()
+        self.results = manager.get_results()
+        self.board = manager.get_board()
+        self.lease_timeout = lease_timeout
+        self.job_count = 0
+
+    def run_job(self, kind, payload, units, label=None):
+        """ジョブを投入し、全作業単位の結果を投入順のリストで返す
+
+        ワーカーが取り出した作業単位のリースが lease_timeout 秒更新されない場合は、
+        ワーカーが落ちたとみなして再投入する（処理中・キューで待っている作業単位は再投入しない）
+        """
+        self.job_count += 1
+        job_id = f"{os.getpid()}-{self.job_count}"
+        label = label or kind
+        self.board.put(job_id, dict(payload, kind=kind))
+
+        pending = {}
+        for i, unit_payload in enumerate(units):
+            unit = {'job': job_id, 'id': i, 'kind': kind, 'payload': unit_payload}
+            self.tasks.put(unit)
+            pending[i] = unit
+
+        values = {}
+        per_worker = {}
+        start = time.perf_counter()
+        while pending:
+            try:
+                result = self.results.get(timeout=1.0)
+            except queue.Empty:
+                for unit_id, worker in self.tasks.expire(job_id, self.lease_timeout):
+                    if unit_id in pending:
+                        print(f"警告: {label} の作業単位 {unit_id} のリースが {worker} から更新されないため再投入します",
+                              flush=True)
+                        self.tasks.put(pending[unit_id])
+                continue
+            # 再投入により重複した結果や、前のジョブの結果は無視する
+            if result['job'] != job_id or result['id'] not in pending:
+                continue
+            self.tasks.release(job_id, result['id'])
+            if not result['ok']:
+                self.tasks.clear(job_id)
+                self.board.remove(job_id)
+                raise RuntimeError(f"{label} の作業単位 {result['id']} が {result['worker']} で失敗しました:\n"
+                                   f"{result['error']}")
+            del pending[result['id']]
+            values[result['id']] = result['value']
+            count, busy = per_worker.get(result['worker'], (0, 0.0))
+            per_worker[result['worker']] = (count + 1, busy + result['elapsed'])
+
+        self.tasks.clear(job_id)
+        self.board.remove(job_id)
+        elapsed = time.perf_counter() - start
+        print(f"\n=== {label}: {len(units)}件 / {elapsed:.2f}秒 ===")
+        for worker, (count, busy) in sorted(per_worker.items()):
+            print(f"- {worker:<32} {count:6d}件  処理時間 {busy:8.2f}秒")
+        return [values[i] for i in range(len(units))]
+
+def run_preprocess(coordinator, nlp_config_file='nlp_config.json', batch_size=8, output_root='queue_output'):
+    """マスク処理・形態素解析・正規化を分散実行し、output_root（preprocess_nlp/ からの相対パス）に書き出す
+
+    通常の前処理の出力先（mail_mask / texts_tokenize / texts_fuzzy）は差分処理のマニフェストとビルドの状態で管理しているため、
+    分散実行の結果は別のディレクトリに同じディレクトリ名・ファイル名で書き出す。
+
+    Returns:
+        dict: 評価の入力（input.data_source の名前 -> 書き出したディレクトリ）
+    """
+    from stream_preprocess import (load_config as load_nlp_config, load_settings, write_text,
+                                   STAGES as TEXT_STAGES, OUTPUT_PREFIX)
+    from pipeline.doc_registry import open_registry, ingest_directory, text_hash
+
+    with working_dir(PREPROCESS_DIR):
+        config = load_nlp_config(nlp_config_file)
+        stream_params = config['stream_params']['value']
+        settings = load_settings(config, stream_params['rule_config'])
+        output_root = Path(output_root).resolve()
+        input_dir = Path(stream_params['input']).resolve()
+    # ディレクトリ名は各段の出力ファイル名の接頭辞と同じ
+    output_dirs = {stage: output_root / OUTPUT_PREFIX[stage] for stage in TEXT_STAGES}
+
+    for directory in output_dirs.values():
+        directory.mkdir(parents=True, exist_ok=True)
+
+    with open_registry() as registry:
+        inputs = ingest_directory(registry, input_dir, 'mail_data_*.txt')
+    docs = []
+    for doc_id, path in inputs:
+        with open(path, encoding='utf-8') as f:
+            docs.append((doc_id, f.read()))
+    units = [docs[i:i + batch_size] for i in range(0, len(docs), batch_size)]
+    print(f"前処理: {len(docs)}件を {len(units)}個の作業単位に分けて投入します")
+
+    batches = coordinator.run_job('preprocess', {'settings': settings, 'stages': list(TEXT_STAGES)},
+                                  units, '前処理')
+    with open_registry() as registry:
+        for batch in batches:
+            for doc_id, stage_outputs in batch:
+                for stage, text in stage_outputs.items():
+                    path = write_text(output_dirs[stage], stage, doc_id, text)
+                    registry.record_artifact(doc_id, stage, path, text_hash(text))
+        for directory in output_dirs.values():
+            registry.sync_dir(directory, [doc_id for doc_id, _ in inputs])
+    print(f"前処理の出力: {', '.join(str(d) for d in output_dirs.values())}")
+    return {'mask': output_dirs['mask'], 'tokenize': output_dirs['tokenize'], 'fuzzy': output_dirs['normalize']}
+
+def run_evaluation(coordinator, model_config_file='model_config.json', data_dirs=None):
+    """特徴量生成とモデル評価を分散実行し、通常の評価と同じ結果ファイルを書き出す
+
+    特徴量は compare_features_and_models.get_feature_dirs と同じ一覧を生成する
+    （data_dirs: 同じ実行で分散前処理した場合の入力ディレクトリ、None の場合は設定の input.data_paths）
+    """
+    from config_loader import ConfigLoader
+    from generate_word2vec import read_tokenized_docs
+    from generate_doc2vec import DEFAULT_DOC2VEC_PARAMS
+    from generate_char_ngram import DEFAULT_CHAR_NGRAM_PARAMS, read_masked_texts
+    from compare_features_and_models import (load_labels, resolve_labels, split_dataset, get_feature_dirs,
+                                             get_enabled_models, report_results)
+    from reduce_features import reduce_dataset
+    from dtype_policy import get_dtype, apply_dtype_policy
+    from fit_cache import get_cache_dir
+
+    with working_dir(CLASSIFICATION_DIR):
+        config = ConfigLoader(model_config_file)
+        paths = config.get_paths()
+        texts_dirs = {feature_name: texts_dir.resolve()
+                      for feature_name, (_, texts_dir, _) in get_feature_dirs(config, data_dirs).items()}
+        labels_file = Path(paths["input"]["labels_file"]).resolve()
+        results_dir = Path(paths["output"]["results"]["evaluation"]).resolve()
+        # キャッシュの場所は各ワーカーが自分のノードで解決する（設定のパスのまま渡す）
+        fit_cache_path = get_cache_dir(config)
+    results_dir.mkdir(parents=True, exist_ok=True)
+
+    # 特徴量ごとの入力（文字n-gramはマスク処理済みテキスト、それ以外は形態素解析済みテキスト）を1回ずつ読み込む
+    labels = load_labels(labels_file)
+    inputs, label_maps = {}, {}
+    docs, filenames = {}, {}
+    for feature_name, texts_dir in texts_dirs.items():
+        if not texts_dir.exists():
+            print(f"警告: {texts_dir}が存在しません。{feature_name}は処理されません。")
+            continue
+        reader = read_masked_texts if feature_name == "CharNgram" else read_tokenized_docs
+        if (reader, texts_dir) not in inputs:
+            inputs[(reader, texts_dir)] = reader(texts_dir)
+        docs[feature_name], filenames[feature_name] = inputs[(reader, texts_dir)]
+        if not docs[feature_name]:
+            raise ValueError(f"{texts_dir}: テキストファイルが見つからないか、すべてが空です")
+        if texts_dir not in label_maps:
+            label_maps[texts_dir] = resolve_labels(labels, texts_dir)
+
+    # 特徴量ごとに1作業単位
+    features = list(docs)
+    matrices = coordinator.run_job('features', {
+        'docs': docs,
+        'word2vec_params': config.get_word2vec_params(),
+        'tfidf_params': config.get_tfidf_params(),
+        'doc2vec_params': {**DEFAULT_DOC2VEC_PARAMS, **config.get_doc2vec_params()},
+        'char_ngram_params': {**DEFAULT_CHAR_NGRAM_PARAMS, **config.get_char_ngram_params()},
+        'dtype': get_dtype(config)
+    }, [{'feature': feature_name} for feature_name in features], '特徴量生成')
+
+    # 特徴量 × モデルごとに1作業単位
+    datasets = {}
+    for feature_name, X in zip(features, matrices):
+        dataset = split_dataset(X, filenames[feature_name], feature_name, label_maps[texts_dirs[feature_name]])
+        if dataset is not None:
+            # 次元削減は分割ごとに1回だけ行い、削減済みの行列を各ワーカーに配る
+            with working_dir(CLASSIFICATION_DIR):
+                dataset = reduce_dataset(dataset, feature_name, config)
+            datasets[feature_name] = apply_dtype_policy(dataset, feature_name, config)
+    units = [{'feature': feature_name, 'model': name}
+             for feature_name in datasets for name in get_enabled_models(config)]
+    all_results = coordinator.run_job('evaluate', {
+        'datasets': datasets,
+        'model_params': config.get_model_params(),
+        'fit_cache_path': str(fit_cache_path) if fit_cache_path is not None else None
+    }, units, 'モデル評価')
+
+    if not all_results:
+        print("エラー: 有効な結果がありません。")
+        return
+    for result in all_results:
+        print(f"{result['feature_name']} + {result['model_name']}: F1スコア {result['f1_score']:.4f}")
+    with working_dir(CLASSIFICATION_DIR):
+        report_results(all_results, config, results_dir)
+
+def run(stages, address, authkey, local_workers=0, lease_timeout=60.0, batch_size=8,
+        nlp_config_file='nlp_config.json', model_config_file='model_config.json',
+        worker_jobs=0, heartbeat_interval=10.0, preprocess_output='queue_output'):
+    """キューサーバーを起動して指定した段を分散実行する"""
+    manager = QueueManager(address=address, authkey=authkey)
+    manager.start()
+    host, port = address
+    connect_address = ('127.0.0.1' if host in ('', '0.0.0.0') else host, port)
+    print(f"キューサーバーを起動しました: {host}:{port}")
+
+    workers = (start_workers(connect_address, authkey, local_workers, n_jobs=worker_jobs,
+                             heartbeat_interval=heartbeat_interval) if local_workers > 0 else [])
+    if workers:
+        print(f"ローカルワーカー: {len(workers)}プロセス")
+    else:
+        print("ワーカーの接続を待ちます（python pipeline/work_queue.py worker --address HOST:PORT）")
+
+    start = time.perf_counter()
+    try:
+        coordinator = Coordinator(manager, lease_timeout)
+        data_dirs = None
+        if 'preprocess' in stages:
+            data_dirs = run_preprocess(coordinator, nlp_config_file, batch_size, preprocess_output)
+        if 'evaluate' in stages:
+            run_evaluation(coordinator, model_config_file, data_dirs)
+    finally:
+        # ローカルワーカーを停止（リモートのワーカーはサーバー終了で停止する）
+        tasks = manager.get_tasks()
+        for _ in workers:
+            tasks.put(None)
+        for p in workers:
+            p.join()
+        manager.shutdown()
+    print(f"\n全体: {time.perf_counter() - start:.2f}秒")
+
+def main():
+    parser = argparse.ArgumentParser(description='前処理・特徴量生成・モデル評価を作業単位のキューで分散実行します')
+    parser.add_argument('--config', default=str(DEFAULT_CONFIG), help='分散実行の設定ファイルのパス')
+    parser.add_argument('--address', help='キューサーバーのアドレス（HOST:PORT、設定ファイルの値を上書き）')
+    parser.add_argument('--authkey', help='認証キー（省略時は環境変数または設定ファイルの値）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='キューサーバーを起動して処理を分散実行する')
+    run_parser.add_argument('stages', nargs='*', help=f"実行する段（{', '.join(STAGES)}、省略時は全段）")
+    run_parser.add_argument('--local-workers', type=int,
+                            help='このマシンで起動するワーカープロセス数（設定ファイルの値を上書き）')
+    run_parser.add_argument('--batch-size', type=int, help='前処理の作業単位あたりの文書数')
+
+    worker_parser = subparsers.add_parser('worker', help='キューサーバーに接続して作業単位を処理する')
+    worker_parser.add_argument('--processes', type=int, default=1, help='このノードで起動するワーカープロセス数')
+    worker_parser.add_argument('--jobs', type=int,
+                               help='各プロセスが使うCPU数（0でCPU数をプロセス数で割った値、設定ファイルの値を上書き）')
+
+    args = parser.parse_args()
+    config = load_config(args.config)
+    address = parse_address(args.address or config.get('address', '127.0.0.1:50055'))
+    authkey = resolve_authkey(config, args.authkey)
+
+    if args.command == 'worker':
+        worker_jobs = args.jobs if args.jobs is not None else config.get('worker_jobs', 0)
+        processes = start_workers(address, authkey, max(1, args.processes), config.get('poll_interval', 1.0),
+                                  worker_jobs, config.get('heartbeat_interval', 10.0))
+        for p in processes:
+            p.join()
+        return
+
+    stages = args.stages or list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"未知の段です: {', '.join(unknown)}")
+    local_workers = args.local_workers if args.local_workers is not None else config.get('local_workers', 0)
+    run(stages, address, authkey, local_workers,
+        config.get('lease_timeout', 60.0),
+        args.batch_size or config.get('batch_size', 8),
+        config.get('nlp_config', 'nlp_config.json'),
+        config.get('model_config', 'model_config.json'),
+        config.get('worker_jobs', 0),
+        config.get('heartbeat_interval', 10.0),
+        config.get('preprocess_output', 'queue_output'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+コーパス全体の定型行（挨拶文・署名・区切り線など）を検出して除去する
+- 行ハッシュごとの文書頻度インデックスを永続化し、新着メール分だけ差分更新する
+- 文書頻度がしきい値を超えた行を形態素解析の前に削除する
+"""
+
+import json
+import math
+import hashlib
+import argparse
+from pathlib import Path
+
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import open_registry, list_inputs, text_hash
+from manifest import token_settings_fingerprint
+
+INDEX_VERSION = 1
+
+def load_config(config_file='nlp_config.json'):
+    """設定ファイルを読み込む"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def line_key(line):
+    """行を正規化してハッシュ値を返す（空行はNone）"""
+    text = line.strip()
+    if not text:
+        return None
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def content_hash(text):
+    """文書全体のハッシュ値を返す"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def empty_index():
+    """空のインデックスを返す"""
+    return {
+        'version': INDEX_VERSION,
+        'documents': {},   # ファイル名 -> {hash, lines}
+        'line_df': {},     # 行ハッシュ -> 出現文書数
+        'line_text': {},   # 行ハッシュ -> 行テキスト（2文書以上に出現した行のみ）
+        'line_tokens': {}, # 行ハッシュ -> トークン数（除去された行のみキャッシュ）
+        'line_tokens_key': None  # line_tokens を数えたときのトークン化の設定（manifest.token_settings_fingerprint）
+    }
+
+def load_index(index_file):
+    """インデックスを読み込む（存在しない・形式が古い場合は空で返す）"""
+    path = Path(index_file)
+    if not path.exists():
+        return empty_index()
+    with open(path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('version') != INDEX_VERSION:
+        print(f"警告: インデックスの形式が異なるため再構築します: {index_file}")
+        return empty_index()
+    return index
+
+def save_index(index, index_file):
+    """インデックスを保存する"""
+    with open(index_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+
+def _add_document(index, name, text):
+    """文書の行をインデックスに加算する"""
+    keys = {}
+    for line in text.splitlines():
+        key = line_key(line)
+        if key is not None and key not in keys:
+            keys[key] = line.strip()
+    for key, line in keys.items():
+        df = index['line_df'].get(key, 0) + 1
+        index['line_df'][key] = df
+        if df >= 2 and key not in index['line_text']:
+            index['line_text'][key] = line
+    index['documents'][name] = {'hash': content_hash(text), 'lines': list(keys)}
+
+def _remove_document(index, name):
+    """文書の行をインデックスから減算する"""
+    entry = index['documents'].pop(name)
+    for key in entry['lines']:
+        df = index['line_df'].get(key, 0) - 1
+        if df > 0:
+            index['line_df'][key] = df
+            if df < 2:
+                index['line_text'].pop(key, None)
+        else:
+            index['line_df'].pop(key, None)
+            index['line_text'].pop(key, None)
+            index['line_tokens'].pop(key, None)
+
+def update_index(index, texts):
+    """入力文書群とインデックスの差分を反映する
+
+    Args:
+        index (dict): 行頻度インデックス
+        texts (dict): ファイル名 -> 本文
+    Returns:
+        dict: 追加・更新・削除された文書数
+    """
+    stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+    # 入力から消えた文書を除外
+    for name in [n for n in index['documents'] if n not in texts]:
+        _remove_document(index, name)
+        stats['removed'] += 1
+
+    for name, text in texts.items():
+        entry = index['documents'].get(name)
+        if entry is not None:
+            if entry['hash'] == content_hash(text):
+                stats['unchanged'] += 1
+                continue
+            _remove_document(index, name)
+            stats['updated'] += 1
+        else:
+            stats['added'] += 1
+        _add_document(index, name, text)
+
+    return stats
+
+def df_limit(index, params):
+    """除去対象とする文書頻度の下限を返す"""
+    num_docs = len(index['documents'])
+    ratio_limit = math.ceil(params.get('max_doc_freq', 0.3) * num_docs)
+    return max(params.get('min_doc_count', 5), ratio_limit)
+
+def boilerplate_keys(index, params):
+    """除去対象の行ハッシュ集合を返す"""
+    limit = df_limit(index, params)
+    return {key for key, df in index['line_df'].items() if df >= limit}
+
+def filter_text(text, drop_keys):
+    """定型行を除去したテキストと除去した行ハッシュのリストを返す"""
+    kept = []
+    removed = []
+    for line in text.splitlines():
+        key = line_key(line)
+        if key is not None and key in drop_keys:
+            removed.append(key)
+        else:
+            kept.append(line)
+    return '\n'.join(kept), removed
+
+def count_line_tokens(index, keys, stopwords, pos_filter, enable_stopwords=True):
+    """除去行のトークン数を数える（形態素解析結果は行ハッシュ単位でキャッシュ）
+
+    キャッシュはトークン化の設定ごとに持ち、ストップワード・品詞フィルターが変わった場合は数え直す
+    """
+    settings_key = token_settings_fingerprint(stopwords, pos_filter, enable_stopwords)
+    if index.get('line_tokens_key') != settings_key:
+        if index['line_tokens']:
+            print("トークン化の設定が変わったため、除去行のトークン数を数え直します")
+        index['line_tokens'] = {}
+        index['line_tokens_key'] = settings_key
+    missing = [key for key in keys if key not in index['line_tokens']]
+    if missing:
+        from janome.tokenizer import Tokenizer
+        tokenizer = Tokenizer()
+        for key in missing:
+            count = 0
+            for token in tokenizer.tokenize(index['line_text'].get(key, '')):
+                if any(pos in token.part_of_speech for pos in pos_filter):
+                    if not enable_stopwords or (token.surface not in stopwords and token.base_form not in stopwords):
+                        count += 1
+            index['line_tokens'][key] = count
+    return {key: index['line_tokens'][key] for key in keys}
+
+def load_stopwords(stopwords_file):
+    """ストップワードを読み込む"""
+    with open(stopwords_file, 'r', encoding='utf-8') as f:
+        return set(line.strip() for line in f)
+
+def process_directory(input_dir, output_dir, index_file, params, stopwords, pos_filter,
+                      enable_stopwords=True, rebuild=False):
+    """ディレクトリ内の全ファイルのインデックス更新と定型行除去を行う"""
+    input_path = Path(input_dir)
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # 入力ファイルは文書レジストリから文書ID順に取得
+    with open_registry() as registry:
+        inputs = list_inputs(registry, input_path)
+        texts = {}
+        doc_ids = {}
+        for doc_id, input_file in inputs:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                texts[input_file.name] = f.read()
+            doc_ids[input_file.name] = doc_id
+
+        index = empty_index() if rebuild else load_index(index_file)
+        stats = update_index(index, texts)
+        print(f"インデックス更新: 追加 {stats['added']}件, 更新 {stats['updated']}件, "
+              f"削除 {stats['removed']}件, 変更なし {stats['unchanged']}件")
+
+        enabled = params.get('enable', True)
+        drop_keys = boilerplate_keys(index, params) if enabled else set()
+        token_counts = count_line_tokens(index, drop_keys, stopwords, pos_filter, enable_stopwords)
+
+        # 入力から消えた文書の出力を削除
+        for stale in output_path.glob('*.txt'):
+            if stale.name not in texts:
+                stale.unlink()
+
+        removed_lines = 0
+        removed_chars = 0
+        saved_tokens = 0
+        for name, text in texts.items():
+            filtered, removed = filter_text(text, drop_keys)
+            removed_lines += len(removed)
+            removed_chars += len(text) - len(filtered)
+            saved_tokens += sum(token_counts[key] for key in removed)
+            with open(output_path / name, 'w', encoding='utf-8') as f:
+                f.write(filtered)
+            registry.record_artifact(doc_ids[name], 'boilerplate', output_path / name, text_hash(filtered))
+        registry.sync_dir(output_path, doc_ids.values())
+
+    save_index(index, index_file)
+
+    print("\n=== 定型行除去の結果 ===")
+    print(f"- 文書数: {len(texts)}件")
+    print(f"- 除去対象の文書頻度: {df_limit(index, params)}文書以上" if enabled else "- 定型行除去: 無効")
+    print(f"- 定型行の種類: {len(drop_keys)}種類")
+    print(f"- 除去した行数: {removed_lines}行")
+    print(f"- 除去した文字数: {removed_chars}文字")
+    print(f"- 削減トークン数: {saved_tokens}トークン")
+
+    top = sorted(drop_keys, key=lambda k: index['line_df'][k], reverse=True)[:params.get('report_top', 10)]
+    if top:
+        print("\n頻出の定型行:")
+        for key in top:
+            print(f"  {index['line_df'][key]:5d}文書 / {token_counts[key]:3d}トークン : {index['line_text'].get(key, '')[:40]}")
+
+    return {'removed_lines': removed_lines, 'removed_chars': removed_chars, 'saved_tokens': saved_tokens}
+
+def main():
+    parser = argparse.ArgumentParser(description='コーパス全体の定型行を除去します')
+    parser.add_argument('--config', default='nlp_config.json',
+                      help='設定ファイルのパス')
+    parser.add_argument('--indir',
+                      help='入力ディレクトリのパス（設定ファイルの値を上書き）')
+    parser.add_argument('--outdir',
+                      help='出力ディレクトリのパス（設定ファイルの値を上書き）')
+    parser.add_argument('--index',
+                      help='行頻度インデックスのパス（設定ファイルの値を上書き）')
+    parser.add_argument('--max-doc-freq', type=float,
+                      help='除去対象とする文書頻度の割合（設定ファイルの値を上書き）')
+    parser.add_argument('--rebuild', action='store_true',
+                      help='インデックスを作り直す')
+
+    args = parser.parse_args()
+
+    # 設定の読み込み
+    config = load_config(args.config)
+    params = dict(config['boilerplate_params']['value'])
+    if args.max_doc_freq is not None:
+        params['max_doc_freq'] = args.max_doc_freq
+
+    # コマンドライン引数で上書きされた場合はそちらを優先
+    input_dir = args.indir or config['process_input']['value']['boilerplate']
+    output_dir = args.outdir or config['process_output']['value']['boilerplate']
+    index_file = args.index or params.get('index_file', 'boilerplate_index.json')
+    pos_filter = config['default_pos_filter']['value']
+    enable_stopwords = config['tokenize_params']['value'].get('enable_stopwords', True)
+    stopwords = load_stopwords(config['stopwords_file']['value']) if enable_stopwords else set()
+
+    process_directory(input_dir, output_dir, index_file, params, stopwords, pos_filter,
+                      enable_stopwords, args.rebuild)
+
+if __name__ == '__main__':
+    main()
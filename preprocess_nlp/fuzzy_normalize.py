@@ -5,8 +5,15 @@ import json
 import re
 import argparse
 from pathlib import Path
+from multiprocessing import Pool
 import os
 
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import open_registry, list_inputs, file_hash
+from manifest import settings_fingerprint, load_manifest, save_manifest
+
+MANIFEST_FILE = '.fuzzy_manifest.json'
+
 def load_config(config_file):
     """設定ファイルを読み込む"""
     with open(config_file, 'r', encoding='utf-8') as f:
@@ -26,10 +33,11 @@ def load_technical_terms(json_path='technical_terms.json'):
         print(f"警告: 技術用語リストファイル {json_path} が見つかりません")
         return set()
 
-def normalize_text(text, patterns, params):
+def normalize_text(text, patterns, params, tech_terms=None):
     """テキストを正規化する"""
-    # 技術用語リストの読み込み
-    tech_terms = load_technical_terms()
+    # 技術用語リストの読み込み（呼び出し側で読み込み済みの場合は再利用）
+    if tech_terms is None:
+        tech_terms = load_technical_terms()
     
     # 技術用語を一時的にプレースホルダーに置換
     placeholder_map = {}
@@ -59,44 +67,114 @@ def normalize_text(text, patterns, params):
     
     return text
 
-def get_number_from_filename(filename):
-    """ファイル名から数字部分を抽出する"""
-    match = re.search(r'(\d+)', filename)
-    return int(match.group(1)) if match else 0
+def fuzzy_settings_fingerprint(patterns, params, tech_terms):
+    """正規化結果に影響する設定（パターン・パラメータ・技術用語）のフィンガープリント"""
+    return settings_fingerprint({
+        'patterns': patterns,
+        'params': params,
+        'tech_terms': sorted(tech_terms)
+    })
+
+# ワーカープロセスごとに保持する正規化設定
+_worker_settings = {}
 
-def process_directory(input_dir, output_dir, patterns, params):
-    """ディレクトリ内の全ファイルを処理"""
+def _init_worker(patterns, params, tech_terms):
+    """ワーカープロセスの初期化（設定は1回だけ受け取る）"""
+    _worker_settings['patterns'] = patterns
+    _worker_settings['params'] = params
+    _worker_settings['tech_terms'] = tech_terms
+
+def _normalize_file(task):
+    """1ファイルを正規化して出力する（ワーカープロセスで実行）"""
+    input_file, output_file = task
+    with open(input_file, encoding='utf-8') as f:
+        content = f.read()
+    normalized = normalize_text(content, _worker_settings['patterns'],
+                                _worker_settings['params'], _worker_settings['tech_terms'])
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(normalized)
+    return input_file, output_file
+
+def process_directory(input_dir, output_dir, patterns, params, workers=1, incremental=True):
+    """ディレクトリ内の全ファイルを処理
+
+    Args:
+        workers (int): ワーカープロセス数（0以下の場合はCPU数）
+        incremental (bool): 入力と設定が前回から変わっていないファイルをスキップする
+    """
     # 出力ディレクトリが存在しない場合は作成
     os.makedirs(output_dir, exist_ok=True)
     
-    # 入力ファイルの取得とソート
-    input_files = sorted(list(Path(input_dir).glob('*.txt')),
-                        key=lambda x: get_number_from_filename(x.name))
-    
-    # 入力ディレクトリ内の全ファイルを処理
-    for file_path in input_files:
-        # 入力ファイルの番号を維持して出力ファイル名を生成
-        file_number = get_number_from_filename(file_path.name)
-        output_path = Path(output_dir) / f'texts_fuzzy_{file_number:03d}.txt'
-        
-        # ファイルの処理
-        with open(file_path, encoding='utf-8') as f:
-            content = f.read()
-        
-        # テキストの正規化
-        normalized = normalize_text(content, patterns, params)
-        
-        # 結果の出力
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(normalized)
-        
-        print(f"Processing: {file_path} -> {output_path}")
+    # 入力ファイルは文書レジストリから文書ID順に取得
+    with open_registry() as registry:
+        inputs = list_inputs(registry, input_dir)
+    
+    tech_terms = load_technical_terms()
+    fingerprint = fuzzy_settings_fingerprint(patterns, params, tech_terms)
+    manifest = load_manifest(output_dir, MANIFEST_FILE)
+    if not incremental or manifest.get('fingerprint') != fingerprint:
+        previous_files = {}
+    else:
+        previous_files = manifest.get('files', {})
+    
+    # 処理対象の選定（入力ハッシュと設定が同じで出力が残っていればスキップ）
+    tasks = []
+    files = {}
+    outputs = []
+    for doc_id, file_path in inputs:
+        # 文書IDから出力ファイル名を生成
+        output_path = Path(output_dir) / f'texts_fuzzy_{doc_id:03d}.txt'
+        input_hash = file_hash(file_path)
+        files[file_path.name] = {'hash': input_hash, 'output': output_path.name}
+        outputs.append((doc_id, output_path))
+        previous = previous_files.get(file_path.name)
+        if previous == files[file_path.name] and output_path.exists():
+            continue
+        tasks.append((str(file_path), str(output_path)))
+    
+    # 入力から消えたファイルの出力を削除
+    current_outputs = {entry['output'] for entry in files.values()}
+    for name, entry in manifest.get('files', {}).items():
+        if name not in files and entry['output'] not in current_outputs:
+            stale = Path(output_dir) / entry['output']
+            if stale.exists():
+                stale.unlink()
+    
+    skipped = len(inputs) - len(tasks)
+    print(f"対象ファイル: {len(inputs)}件（処理 {len(tasks)}件, スキップ {skipped}件）")
+    
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, max(len(tasks), 1))
+    
+    if workers == 1:
+        _init_worker(patterns, params, tech_terms)
+        for task in tasks:
+            file_path, output_path = _normalize_file(task)
+            print(f"Processing: {file_path} -> {output_path}")
+    else:
+        print(f"ワーカープロセス数: {workers}")
+        with Pool(workers, initializer=_init_worker,
+                  initargs=(patterns, params, tech_terms)) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            for file_path, output_path in pool.imap_unordered(_normalize_file, tasks, chunksize):
+                print(f"Processing: {file_path} -> {output_path}")
+    
+    save_manifest(output_dir, MANIFEST_FILE, {'fingerprint': fingerprint, 'files': files})
+    
+    # 出力をレジストリに記録（スキップしたファイルも含めて記録し直す）
+    with open_registry() as registry:
+        for doc_id, output_path in outputs:
+            registry.record_artifact(doc_id, 'normalize', output_path, file_hash(output_path))
+        registry.sync_dir(output_dir, [doc_id for doc_id, _ in outputs])
 
 def main():
     parser = argparse.ArgumentParser(description='テキストの正規化を行います')
     parser.add_argument('--config', default='nlp_config.json', help='設定ファイルのパス')
     parser.add_argument('--indir', help='入力ディレクトリのパス（設定ファイルの値を上書き）')
     parser.add_argument('--outdir', help='出力ディレクトリのパス（設定ファイルの値を上書き）')
+    parser.add_argument('--workers', type=int, help='ワーカープロセス数（設定ファイルの値を上書き、0でCPU数）')
+    parser.add_argument('--force', action='store_true', help='変更の有無にかかわらず全ファイルを処理する')
     
     args = parser.parse_args()
     
@@ -108,12 +186,15 @@ def main():
     output_dir = args.outdir or config['process_output']['value']['fuzzy']
     patterns_file = config['fuzzy_patterns_file']['value']
     normalize_params = config['normalize_params']['value']
+    runner_params = config.get('normalize_runner_params', {}).get('value', {})
+    workers = args.workers if args.workers is not None else runner_params.get('workers', 0)
+    incremental = runner_params.get('incremental', True) and not args.force
     
     # パターンの読み込み
     patterns = load_patterns(patterns_file)
     
     # ディレクトリ内の全ファイルを処理
-    process_directory(input_dir, output_dir, patterns, normalize_params)
+    process_directory(input_dir, output_dir, patterns, normalize_params, workers, incremental)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前処理の差分処理で共有するマニフェストと設定のフィンガープリント
+- マニフェストは出力ディレクトリに置き、{fingerprint, files: {入力ファイル名: {hash, output}}} を記録する
+- ファイル内容のハッシュは文書レジストリ（pipeline/doc_registry.py）の file_hash を使う
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+def settings_fingerprint(settings):
+    """処理結果に影響する設定（JSONに変換できる値）のフィンガープリント"""
+    payload = json.dumps(settings, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def token_settings_fingerprint(stopwords, pos_filter, enable_stopwords=True):
+    """形態素解析の結果に影響する設定（ストップワード・品詞フィルター）のフィンガープリント"""
+    return settings_fingerprint({
+        'stopwords': sorted(stopwords) if enable_stopwords else [],
+        'pos_filter': list(pos_filter),
+        'enable_stopwords': bool(enable_stopwords)
+    })
+
+def load_manifest(output_dir, manifest_file):
+    """前回実行時のマニフェストを読み込む"""
+    path = Path(output_dir) / manifest_file
+    if not path.exists():
+        return {'fingerprint': None, 'files': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(output_dir, manifest_file, manifest):
+    """マニフェストを保存する"""
+    path = Path(output_dir) / manifest_file
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常駐型の前処理サーバー
+- 起動時に Janome の辞書・マスク用の正規表現・正規化パターン・技術用語・ストップワードを1回だけ読み込む
+- ローカルソケットで生メールのテキスト（1件またはまとめて）を受け取り、マスク処理 → 形態素解析 → 正規化の結果を返す
+- 通信は1行1リクエストのJSON（JSON Lines）
+
+リクエスト例:
+    {"text": "本文"}
+    {"texts": ["本文1", "本文2"], "stages": ["mask", "tokenize"], "intermediate": true}
+    {"command": "ping"} / {"command": "stats"}
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+
+from stream_preprocess import STAGES, load_config, load_settings, build_stage
+
+class PreprocessService:
+    """前処理の各段を保持し、テキストを処理する"""
+
+    def __init__(self, settings, stages=STAGES):
+        start = time.perf_counter()
+        self.stages = list(stages)
+        self.processors = {stage: build_stage(stage, settings) for stage in self.stages}
+        # Janome の Tokenizer はスレッドセーフでないため処理は1件ずつ行う
+        self.lock = threading.Lock()
+        self.load_time = time.perf_counter() - start
+        self.started_at = time.time()
+        self.requests = 0
+        self.documents = 0
+        self.busy = 0.0
+
+    def process(self, text, stages=None, intermediate=False):
+        """1件のテキストを指定した段（省略時は全段）で処理する"""
+        outputs = {}
+        for stage in stages or self.stages:
+            text = self.processors[stage](text)
+            outputs[stage] = text
+        return outputs if intermediate else text
+
+    def handle(self, request):
+        """リクエストを処理してレスポンスを返す"""
+        command = request.get('command')
+        if command == 'ping':
+            return {'ok': True, 'stages': self.stages}
+        if command == 'stats':
+            return {'ok': True, 'requests': self.requests, 'documents': self.documents,
+                    'busy_sec': round(self.busy, 3), 'load_sec': round(self.load_time, 3),
+                    'uptime_sec': round(time.time() - self.started_at, 1)}
+        if command is not None:
+            return {'ok': False, 'error': f"未知のコマンドです: {command}"}
+
+        stages = request.get('stages')
+        unknown = [stage for stage in stages or [] if stage not in self.processors]
+        if unknown:
+            return {'ok': False, 'error': f"未知の処理段です: {', '.join(unknown)}"}
+        intermediate = request.get('intermediate', False)
+
+        if 'texts' in request:
+            texts = request['texts']
+        elif 'text' in request:
+            texts = [request['text']]
+        else:
+            return {'ok': False, 'error': "text または texts を指定してください"}
+
+        start = time.perf_counter()
+        with self.lock:
+            results = [self.process(text, stages, intermediate) for text in texts]
+            elapsed = time.perf_counter() - start
+            self.requests += 1
+            self.documents += len(texts)
+            self.busy += elapsed
+
+        response = {'ok': True, 'elapsed_ms': round(elapsed * 1000, 3)}
+        if 'texts' in request:
+            response['results'] = results
+        else:
+            response['result'] = results[0]
+        return response
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """1接続で複数のリクエスト（1行1件）を受け付ける"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.service.handle(json.loads(line))
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class UnixPreprocessServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPPreprocessServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def is_tcp_address(address):
+    """'HOST:PORT' 形式ならTCP、それ以外はUnixソケットのパスとみなす"""
+    return ':' in address and not address.startswith(('/', '.'))
+
+def parse_tcp_address(address):
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+def serve(service, address):
+    """サーバーを起動し、終了（Ctrl+C）まで待ち受ける"""
+    if is_tcp_address(address):
+        server = TCPPreprocessServer(parse_tcp_address(address), RequestHandler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixPreprocessServer(address, RequestHandler)
+    server.service = service
+    print(f"前処理サーバーを起動しました: {address}（読み込み {service.load_time:.2f}秒）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not is_tcp_address(address) and os.path.exists(address):
+            os.unlink(address)
+        print("前処理サーバーを停止しました")
+
+class PreprocessClient:
+    """前処理サーバーのクライアント（接続は使い回す）"""
+
+    def __init__(self, address, timeout=60.0):
+        if is_tcp_address(address):
+            self.sock = socket.create_connection(parse_tcp_address(address), timeout=timeout)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        self.reader = self.sock.makefile('rb')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, payload):
+        """リクエストを送ってレスポンスを返す（エラーの場合は RuntimeError）"""
+        self.sock.sendall(json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("前処理サーバーとの接続が切れました")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        return response
+
+    def process(self, text, stages=None, intermediate=False):
+        payload = {'text': text, 'intermediate': intermediate}
+        if stages:
+            payload['stages'] = list(stages)
+        return self.request(payload)['result']
+
+    def process_batch(self, texts, stages=None, intermediate=False):
+        payload = {'texts': list(texts), 'intermediate': intermediate}
+        if stages:
+            payload['stages'] = list(stages)
+        return self.request(payload)['results']
+
+def run_client(address, files, stages=None, bench=0):
+    """ファイル（省略時は標準入力）のテキストをサーバーで処理して表示する"""
+    if files:
+        texts = [Path(path).read_text(encoding='utf-8') for path in files]
+    else:
+        texts = [sys.stdin.read()]
+
+    with PreprocessClient(address) as client:
+        if bench > 0:
+            # 1件ずつのリクエストの往復時間を計測
+            latencies = []
+            for i in range(bench):
+                start = time.perf_counter()
+                client.process(texts[i % len(texts)], stages)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            print(f"リクエスト数: {bench}件")
+            print(f"- 中央値: {latencies[len(latencies) // 2]:.2f}ミリ秒")
+            print(f"- 95パーセンタイル: {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f}ミリ秒")
+            print(f"- 最大: {latencies[-1]:.2f}ミリ秒")
+            return
+        results = client.process_batch(texts, stages)
+    for path, result in zip(files or ['<stdin>'], results):
+        if len(results) > 1:
+            print(f"=== {path} ===")
+        print(result)
+
+def main():
+    parser = argparse.ArgumentParser(description='辞書や正規表現を読み込んだまま常駐する前処理サーバーです')
+    parser.add_argument('--config', default='nlp_config.json',
+                      help='設定ファイルのパス')
+    parser.add_argument('--address',
+                      help='待ち受けるソケット（Unixソケットのパス または HOST:PORT、設定ファイルの値を上書き）')
+    parser.add_argument('--client', action='store_true',
+                      help='クライアントとして起動し、ファイルまたは標準入力のテキストを処理する')
+    parser.add_argument('--stages',
+                      help='クライアントで実行する段（カンマ区切り、省略時は全段）')
+    parser.add_argument('--bench', type=int, default=0,
+                      help='クライアントで指定回数のリクエストを送り、応答時間を表示する')
+    parser.add_argument('files', nargs='*', help='クライアントで処理するファイル')
+
+    args = parser.parse_args()
+
+    # 設定の読み込み
+    config = load_config(args.config)
+    server_params = config.get('server_params', {}).get('value', {})
+    address = args.address or server_params.get('address', 'preprocess.sock')
+    stages = args.stages.split(',') if args.stages else None
+
+    if args.client:
+        run_client(address, args.files, stages, args.bench)
+        return
+
+    rule_config_file = server_params.get('rule_config') or config['stream_params']['value']['rule_config']
+    settings = load_settings(config, rule_config_file)
+    serve(PreprocessService(settings, server_params.get('stages', STAGES)), address)
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,12 @@ set -e
 
 echo "NLP前処理を開始します..."
 
-# 出力ディレクトリをクリーンアップ
-echo "出力ディレクトリをクリーンアップ中..."
-rm -rf texts_tokenize texts_fuzzy
+# 出力ディレクトリは削除しない
+# texts_tokenize・texts_fuzzy は入力ハッシュと設定が変わったファイルだけ再生成する
+
+# 定型行除去の実行（行頻度インデックスは差分更新）
+echo "定型行除去を実行中..."
+python boilerplate_filter.py
 
 # 形態素解析の実行
 echo "形態素解析を実行中..."
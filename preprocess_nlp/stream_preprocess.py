@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+マスク処理 → 形態素解析 → 正規化 をメモリ上で流すストリーミング前処理
+- 各段はワーカープロセスのプールで処理し、段の間は上限付きキューでつなぐ
+- 書き出すのは最終出力（と指定時の中間出力）のみ。出力先は差分処理の出力（texts_fuzzy/ など）とは分ける
+- 処理に失敗した文書はエラーとして後ろの段へ流し、書き出さずに最後に一覧を表示する
+- 段ごとのスループットを表示する
+"""
+
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from pathlib import Path
+from multiprocessing import Process, Queue
+
+# マスク処理は preprocess_rules のモジュールを利用する
+RULES_DIR = Path(__file__).resolve().parent.parent / 'preprocess_rules'
+if str(RULES_DIR) not in sys.path:
+    sys.path.insert(0, str(RULES_DIR))
+
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import open_registry, ingest_directory, text_hash
+
+STAGES = ('mask', 'tokenize', 'normalize')
+
+# 中間出力・最終出力のファイル名の接頭辞
+OUTPUT_PREFIX = {
+    'mask': 'mail_mask',
+    'tokenize': 'texts_tokenize',
+    'normalize': 'texts_fuzzy'
+}
+
+DEFAULT_MASK_FILTERS = {
+    'name': True,
+    'email': True,
+    'company': True,
+    'url': True,
+    'profile': True
+}
+
+def load_config(config_file='nlp_config.json'):
+    """設定ファイルを読み込む"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_mask_filters(rule_config_file):
+    """マスク処理の設定（rule_config.json の mask_filters）を読み込む"""
+    try:
+        with open(rule_config_file, encoding='utf-8') as f:
+            return json.load(f).get('mask_filters', DEFAULT_MASK_FILTERS)
+    except FileNotFoundError:
+        print(f"警告: {rule_config_file} が見つかりません。全てのマスクフィルターを有効にします")
+        return DEFAULT_MASK_FILTERS
+
+def load_settings(config, rule_config_file):
+    """各段の処理に必要な設定をまとめて読み込む（ワーカーには1回だけ渡す）"""
+    from fuzzy_normalize import load_patterns, load_technical_terms
+    from tokenize_texts import load_stopwords
+
+    tokenize_params = config['tokenize_params']['value']
+    enable_stopwords = tokenize_params.get('enable_stopwords', True)
+    settings = {
+        'mask_filters': load_mask_filters(rule_config_file),
+        'pos_filter': config['default_pos_filter']['value'],
+        'enable_stopwords': enable_stopwords,
+        'stopwords': load_stopwords(config['stopwords_file']['value']) if enable_stopwords else set(),
+        'patterns': load_patterns(config['fuzzy_patterns_file']['value']),
+        'normalize_params': config['normalize_params']['value'],
+        'tech_terms': load_technical_terms(),
+        'boilerplate_keys': set()
+    }
+
+    # 定型行除去が有効な場合は既存の行頻度インデックスを読み取り専用で利用する
+    boilerplate_params = config.get('boilerplate_params', {}).get('value', {})
+    index_file = boilerplate_params.get('index_file', 'boilerplate_index.json')
+    if boilerplate_params.get('enable', False) and Path(index_file).exists():
+        from boilerplate_filter import load_index, boilerplate_keys
+        settings['boilerplate_keys'] = boilerplate_keys(load_index(index_file), boilerplate_params)
+    return settings
+
+def build_stage(stage, settings):
+    """段の処理関数（テキスト -> テキスト）を作成する
+
+    辞書や正規表現の読み込みはここで1回だけ行う
+    """
+    if stage == 'mask':
+        from mask_mail_texts import compile_patterns, mask_text
+        filters = settings['mask_filters']
+        compiled = compile_patterns(filters)
+        return lambda text: mask_text(text, filters, compiled)[0]
+
+    if stage == 'tokenize':
+        from janome.tokenizer import Tokenizer
+        from tokenize_texts import tokenize_text
+        from boilerplate_filter import filter_text
+        tokenizer = Tokenizer()
+        drop_keys = settings['boilerplate_keys']
+
+        def tokenize(text):
+            if drop_keys:
+                text = filter_text(text, drop_keys)[0]
+            return ' '.join(tokenize_text(text, tokenizer, settings['stopwords'],
+                                          settings['pos_filter'], settings['enable_stopwords']))
+        return tokenize
+
+    if stage == 'normalize':
+        from fuzzy_normalize import normalize_text
+        return lambda text: normalize_text(text, settings['patterns'],
+                                           settings['normalize_params'], settings['tech_terms'])
+
+    raise ValueError(f"未知の処理段です: {stage}")
+
+def _stage_worker(stage, settings, in_queue, out_queue, stats_queue, keep_intermediate):
+    """段のワーカープロセス: 入力キューから文書を取り出して処理し、次のキューへ流す
+
+    文書の処理に失敗した場合は item['error'] に理由を入れて次の段へ流す（後ろの段は処理せずに流す）。
+    処理関数の作成に失敗した場合も、届いた文書をすべてエラーとして流し、段の流れを止めない
+    """
+    count = 0
+    errors = 0
+    busy = 0.0
+    try:
+        try:
+            process = build_stage(stage, settings)
+            build_error = None
+        except Exception as e:
+            process = None
+            build_error = f"{stage}: 処理の準備に失敗しました（{type(e).__name__}: {e}）"
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+            if 'error' not in item:
+                start = time.perf_counter()
+                try:
+                    if process is None:
+                        raise RuntimeError(build_error)
+                    text = process(item['text'])
+                except Exception as e:
+                    item['error'] = build_error or f"{stage}: {type(e).__name__}: {e}"
+                    errors += 1
+                else:
+                    if keep_intermediate:
+                        item.setdefault('intermediate', {})[stage] = text
+                    item['text'] = text
+                    count += 1
+                busy += time.perf_counter() - start
+            out_queue.put(item)
+    finally:
+        stats_queue.put((stage, count, errors, busy))
+
+def _feed(inputs, queue, num_workers):
+    """入力ファイルを読み込んで先頭の段へ流す"""
+    for doc_id, path in inputs:
+        with open(path, encoding='utf-8') as f:
+            queue.put({'number': doc_id, 'text': f.read()})
+    for _ in range(num_workers):
+        queue.put(None)
+
+def _close_stage(processes, next_queue, num_next):
+    """段の全ワーカーの終了を待ってから次の段に終了を伝える"""
+    for p in processes:
+        p.join()
+    for _ in range(num_next):
+        next_queue.put(None)
+
+def write_text(output_dir, stage, number, text):
+    """段の出力ファイルを書き出し、そのパスを返す"""
+    path = Path(output_dir) / f"{OUTPUT_PREFIX[stage]}_{number:03d}.txt"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+def run_pipeline(input_dir, output_dir, settings, workers, queue_size=64, intermediate_dirs=None):
+    """ストリーミング前処理を実行する
+
+    Args:
+        input_dir (str): 生メールデータのディレクトリ
+        output_dir (str): 正規化済みテキストの出力先
+        settings (dict): load_settings() の結果
+        workers (dict): 段ごとのワーカープロセス数
+        queue_size (int): 段の間のキューの上限
+        intermediate_dirs (dict): 中間出力の出力先（段名 -> ディレクトリ、Noneで書き出さない）
+    Returns:
+        dict: 段ごとの処理件数と処理時間
+    """
+    # 生メールを文書レジストリに取り込み、文書IDを割り当てる
+    with open_registry() as registry:
+        inputs = ingest_directory(registry, input_dir, 'mail_data_*.txt')
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        intermediate_dirs = intermediate_dirs or {}
+        for directory in intermediate_dirs.values():
+            Path(directory).mkdir(parents=True, exist_ok=True)
+        keep_intermediate = bool(intermediate_dirs)
+
+        num_workers = [max(1, workers.get(stage, 1)) for stage in STAGES]
+        queues = [Queue(maxsize=queue_size) for _ in range(len(STAGES) + 1)]
+        stats_queue = Queue()
+
+        start = time.perf_counter()
+        stage_processes = []
+        failed = []
+        for i, stage in enumerate(STAGES):
+            processes = [Process(target=_stage_worker,
+                                 args=(stage, settings, queues[i], queues[i + 1], stats_queue, keep_intermediate))
+                         for _ in range(num_workers[i])]
+            for p in processes:
+                p.start()
+            stage_processes.append(processes)
+
+        threads = [threading.Thread(target=_feed, args=(inputs, queues[0], num_workers[0]), daemon=True)]
+        for i in range(len(STAGES)):
+            num_next = num_workers[i + 1] if i + 1 < len(STAGES) else 1
+            threads.append(threading.Thread(target=_close_stage, daemon=True,
+                                            args=(stage_processes[i], queues[i + 1], num_next)))
+        for t in threads:
+            t.start()
+
+        # 最終段の出力を書き出す
+        written = 0
+        write_time = 0.0
+        while True:
+            item = queues[-1].get()
+            if item is None:
+                break
+            if 'error' in item:
+                failed.append((item['number'], item['error']))
+                continue
+            write_start = time.perf_counter()
+            path = write_text(output_dir, STAGES[-1], item['number'], item['text'])
+            registry.record_artifact(item['number'], STAGES[-1], path, text_hash(item['text']))
+            for stage, directory in intermediate_dirs.items():
+                path = write_text(directory, stage, item['number'], item['intermediate'][stage])
+                registry.record_artifact(item['number'], stage, path, text_hash(item['intermediate'][stage]))
+            write_time += time.perf_counter() - write_start
+            written += 1
+
+        # 通常は最終段の終了までに全ワーカーが終了している。ある段のワーカーが全て異常終了した場合は、
+        # その段より前のワーカーと入力の読み込みが空かないキューで止まるため、終了させて待たない
+        stalled = [p for processes in stage_processes for p in processes if p.is_alive()]
+        if stalled:
+            print(f"警告: 処理を続けられない段があるため、{len(stalled)}個のワーカーを終了させます")
+            for p in stalled:
+                p.terminate()
+                p.join()
+            for q in queues:
+                q.cancel_join_thread()
+        for t in threads:
+            t.join(timeout=5 if stalled else None)
+        elapsed = time.perf_counter() - start
+        doc_ids = [doc_id for doc_id, _ in inputs]
+        for directory in [output_dir, *intermediate_dirs.values()]:
+            registry.sync_dir(directory, doc_ids)
+
+    # 全ワーカーは終了済み。異常終了したワーカーの集計は届かないため、正常終了した分だけ待つ
+    finished = 0
+    for stage, processes in zip(STAGES, stage_processes):
+        for p in processes:
+            if p.exitcode == 0:
+                finished += 1
+            else:
+                print(f"警告: {stage} のワーカー（pid {p.pid}）が異常終了しました（終了コード {p.exitcode}）")
+    stats = {stage: {'workers': n, 'count': 0, 'errors': 0, 'busy': 0.0} for stage, n in zip(STAGES, num_workers)}
+    collected = []
+    for _ in range(finished):
+        collected.append(stats_queue.get())
+    while True:
+        try:
+            collected.append(stats_queue.get_nowait())
+        except queue.Empty:
+            break
+    for stage, count, errors, busy in collected:
+        stats[stage]['count'] += count
+        stats[stage]['errors'] += errors
+        stats[stage]['busy'] += busy
+
+    print("\n=== 段ごとのスループット ===")
+    print(f"{'段':<10}{'ワーカー':>8}{'件数':>8}{'失敗':>6}{'処理時間(秒)':>14}{'件/秒':>10}")
+    for stage in STAGES:
+        s = stats[stage]
+        rate = s['count'] / s['busy'] * s['workers'] if s['busy'] > 0 else 0.0
+        print(f"{stage:<10}{s['workers']:>8}{s['count']:>8}{s['errors']:>6}{s['busy']:>14.2f}{rate:>10.1f}")
+    print(f"{'write':<10}{1:>8}{written:>8}{0:>6}{write_time:>14.2f}"
+          f"{(written / write_time if write_time > 0 else 0.0):>10.1f}")
+    print(f"\n全体: {written}件 / {elapsed:.2f}秒（{written / elapsed if elapsed > 0 else 0.0:.1f}件/秒）")
+
+    # 失敗した文書（前回の出力があればそのまま残る）と、異常終了したワーカーとともに失われた文書
+    if failed:
+        print(f"\n警告: {len(failed)}件の文書の処理に失敗しました（出力していません）")
+        for doc_id, error in sorted(failed):
+            print(f"- 文書ID {doc_id}: {error}")
+    lost = len(inputs) - written - len(failed)
+    if lost > 0:
+        print(f"\n警告: {lost}件の文書が出力されませんでした（ワーカーの異常終了）")
+
+    stats['write'] = {'workers': 1, 'count': written, 'busy': write_time}
+    stats['failed'] = failed
+    stats['elapsed'] = elapsed
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='マスク処理・形態素解析・正規化をメモリ上で連続実行します')
+    parser.add_argument('--config', default='nlp_config.json',
+                      help='設定ファイルのパス')
+    parser.add_argument('--rule-config',
+                      help='マスク処理の設定ファイルのパス（設定ファイルの値を上書き）')
+    parser.add_argument('--indir',
+                      help='生メールデータのディレクトリ（設定ファイルの値を上書き）')
+    parser.add_argument('--outdir',
+                      help='出力ディレクトリのパス（設定ファイルの値を上書き）')
+    parser.add_argument('--workers',
+                      help='段ごとのワーカープロセス数（例: mask=1,tokenize=4,normalize=1）')
+    parser.add_argument('--keep-intermediate', action='store_true',
+                      help='マスク済み・形態素解析済みの中間出力も書き出す')
+
+    args = parser.parse_args()
+
+    # 設定の読み込み
+    config = load_config(args.config)
+    stream_params = config['stream_params']['value']
+
+    # コマンドライン引数で上書きされた場合はそちらを優先
+    input_dir = args.indir or stream_params['input']
+    output_dir = args.outdir or stream_params['output']
+    rule_config_file = args.rule_config or stream_params['rule_config']
+    workers = dict(stream_params.get('workers', {}))
+    if args.workers:
+        for pair in args.workers.split(','):
+            stage, num = pair.split('=')
+            workers[stage.strip()] = int(num)
+    keep_intermediate = args.keep_intermediate or stream_params.get('keep_intermediate', False)
+    intermediate_dirs = stream_params.get('intermediate', {}) if keep_intermediate else None
+
+    # 差分処理（tokenize_texts.py / fuzzy_normalize.py）の出力先には書き出さない
+    # （マニフェストを更新しないため、次回の差分処理が上書きされた出力を最新とみなしてしまう）
+    from fuzzy_normalize import MANIFEST_FILE as FUZZY_MANIFEST_FILE
+    from tokenize_texts import MANIFEST_FILE as TOKENIZE_MANIFEST_FILE
+    for directory in [output_dir, *(intermediate_dirs or {}).values()]:
+        for manifest_file in (FUZZY_MANIFEST_FILE, TOKENIZE_MANIFEST_FILE):
+            if (Path(directory) / manifest_file).exists():
+                parser.error(f"{directory} は差分処理の出力先です（{manifest_file}）。別の出力先を指定してください")
+
+    settings = load_settings(config, rule_config_file)
+    run_pipeline(input_dir, output_dir, settings, workers,
+                 stream_params.get('queue_size', 64), intermediate_dirs)
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,13 @@ import json
 import argparse
 from pathlib import Path
 from janome.tokenizer import Tokenizer
-import re
+
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import open_registry, list_inputs, file_hash
+from manifest import token_settings_fingerprint, load_manifest, save_manifest
+
+# 前回の入力ハッシュと設定を記録するファイル（出力ディレクトリに置く）
+MANIFEST_FILE = '.tokenize_manifest.json'
 
 def load_config(config_file='nlp_config.json'):
     """設定ファイルを読み込む"""
@@ -16,33 +22,36 @@ def load_stopwords(stopwords_file):
     with open(stopwords_file, 'r', encoding='utf-8') as f:
         return set(line.strip() for line in f)
 
-def get_number_from_filename(filename):
-    """ファイル名から数字部分を抽出する"""
-    if 'unknown' in filename.lower():
-        return None
-    match = re.search(r'mail_mask_(\d+)\.txt$', filename)
-    return int(match.group(1)) if match else None
-
-def process_file(input_file, output_file, stopwords, pos_filter, enable_stopwords=True):
-    """単一ファイルの形態素解析を行う"""
-    tokenizer = Tokenizer()
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        text = f.read()
-    
+def tokenize_text(text, tokenizer, stopwords, pos_filter, enable_stopwords=True):
+    """テキストを形態素解析し、抽出したトークン（基本形）のリストを返す"""
     tokens = []
     for token in tokenizer.tokenize(text):
         if any(pos in token.part_of_speech for pos in pos_filter):
             # ストップワードチェックを表層形で行う
             if not enable_stopwords or (token.surface not in stopwords and token.base_form not in stopwords):
                 tokens.append(token.base_form)
+    return tokens
+
+def process_file(input_file, output_file, stopwords, pos_filter, enable_stopwords=True, tokenizer=None):
+    """単一ファイルの形態素解析を行う"""
+    if tokenizer is None:
+        tokenizer = Tokenizer()
+    
+    with open(input_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    
+    tokens = tokenize_text(text, tokenizer, stopwords, pos_filter, enable_stopwords)
     
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(' '.join(tokens))
 
-def process_directory(input_dir, output_dir, stopwords_file, pos_filter, enable_stopwords=True):
-    """ディレクトリ内の全ファイルを処理"""
+def process_directory(input_dir, output_dir, stopwords_file, pos_filter, enable_stopwords=True, incremental=True):
+    """ディレクトリ内の全ファイルを処理
+
+    Args:
+        incremental (bool): 入力と設定が前回から変わっていないファイルをスキップする
+    """
     stopwords = load_stopwords(stopwords_file) if enable_stopwords else set()
     
     input_path = Path(input_dir)
@@ -51,20 +60,57 @@ def process_directory(input_dir, output_dir, stopwords_file, pos_filter, enable_
     # 出力ディレクトリの作成
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # 入力ファイルの取得とソート
-    input_files = sorted(list(input_path.glob('*.txt')), 
-                        key=lambda x: get_number_from_filename(x.name))
-    
-    # 各ファイルの処理
-    for input_file in input_files:
-        # 入力ファイルの番号を維持して出力ファイル名を生成
-        file_number = get_number_from_filename(input_file.name)
-        if file_number is None:  # unknown ファイルの場合はスキップ
-            print(f"Skipping: {input_file}")
-            continue
-        output_file = output_path / f'texts_tokenize_{file_number:03d}.txt'
-        print(f"Processing: {input_file} -> {output_file}")
-        process_file(str(input_file), str(output_file), stopwords, pos_filter, enable_stopwords)
+    # 入力ファイルは文書レジストリから文書ID順に取得
+    with open_registry() as registry:
+        inputs = list_inputs(registry, input_path)
+    
+        fingerprint = token_settings_fingerprint(stopwords, pos_filter, enable_stopwords)
+        manifest = load_manifest(output_path, MANIFEST_FILE)
+        if not incremental or manifest.get('fingerprint') != fingerprint:
+            previous_files = {}
+        else:
+            previous_files = manifest.get('files', {})
+    
+        # 処理対象の選定（入力ハッシュと設定が同じで出力が残っていればスキップ）
+        tasks = []
+        files = {}
+        outputs = []
+        for doc_id, input_file in inputs:
+            # 文書IDから出力ファイル名を生成
+            output_file = output_path / f'texts_tokenize_{doc_id:03d}.txt'
+            files[input_file.name] = {'hash': file_hash(input_file), 'output': output_file.name}
+            outputs.append((doc_id, output_file))
+            if previous_files.get(input_file.name) == files[input_file.name] and output_file.exists():
+                continue
+            tasks.append((doc_id, input_file, output_file))
+    
+        # 入力から消えたファイルの出力を削除
+        current_outputs = {entry['output'] for entry in files.values()}
+        for name, entry in manifest.get('files', {}).items():
+            if name not in files and entry['output'] not in current_outputs:
+                stale = output_path / entry['output']
+                if stale.exists():
+                    stale.unlink()
+    
+        print(f"対象ファイル: {len(inputs)}件（処理 {len(tasks)}件, スキップ {len(inputs) - len(tasks)}件）")
+    
+        # 各ファイルの処理（辞書の読み込みは処理するファイルがある場合に1回だけ）
+        if tasks:
+            tokenizer = Tokenizer()
+            for doc_id, input_file, output_file in tasks:
+                print(f"Processing: {input_file} -> {output_file}")
+                process_file(str(input_file), str(output_file), stopwords, pos_filter, enable_stopwords, tokenizer)
+                registry.record_artifact(doc_id, 'tokenize', output_file, file_hash(output_file))
+    
+        save_manifest(output_path, MANIFEST_FILE, {'fingerprint': fingerprint, 'files': files})
+    
+        # スキップしたファイルの記録がない場合（レジストリを作り直した場合など）は記録する
+        processed = {doc_id for doc_id, _, _ in tasks}
+        recorded = {doc_id for doc_id, _, _ in registry.artifacts_in(output_path)}
+        for doc_id, output_file in outputs:
+            if doc_id not in processed and doc_id not in recorded:
+                registry.record_artifact(doc_id, 'tokenize', output_file, file_hash(output_file))
+        registry.sync_dir(output_path, [doc_id for doc_id, _ in inputs])
 
 def main():
     parser = argparse.ArgumentParser(description='テキストの形態素解析を行います')
@@ -80,6 +126,8 @@ def main():
                       help='抽出する品詞（カンマ区切り、設定ファイルの値を上書き）')
     parser.add_argument('--enable-stopwords', type=bool,
                       help='ストップワードを使用するかどうか（設定ファイルの値を上書き）')
+    parser.add_argument('--force', action='store_true',
+                      help='変更の有無にかかわらず全ファイルを処理する')
     
     args = parser.parse_args()
     
@@ -94,7 +142,7 @@ def main():
     enable_stopwords = args.enable_stopwords if args.enable_stopwords is not None else \
                       config['tokenize_params']['value'].get('enable_stopwords', True)
     
-    process_directory(input_dir, output_dir, stopwords_file, pos_filter, enable_stopwords)
+    process_directory(input_dir, output_dir, stopwords_file, pos_filter, enable_stopwords, not args.force)
     print(f"全ファイルの形態素解析が完了しました")
 
 if __name__ == '__main__':
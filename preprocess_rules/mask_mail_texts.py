@@ -11,6 +11,9 @@ import shutil
 from pathlib import Path
 from mask_patterns import get_all_patterns
 
+# 文書レジストリ（pipeline/doc_registry.py）
+from pipeline.doc_registry import open_registry, ingest_directory, file_hash
+
 ### for log
 import logging
 logger = logging.getLogger()
@@ -21,37 +24,55 @@ def load_config(path="rule_config.json"):
     with open(path, encoding="utf-8") as f:
         return json.load(f)
 
-def mask_text(text, filters):
+def compile_patterns(filters):
     """
-    テキストをマスク処理する
+    有効なマスク種別の正規表現をコンパイルする
     Args:
-        text (str): マスク対象のテキスト
         filters (dict): マスク処理の有効/無効を制御する辞書
     Returns:
-        tuple: (マスク後のテキスト, 統計情報)
+        list: (マスク種別, コンパイル済みパターンのリスト) のリスト
     """
-    patterns = get_all_patterns()
-    stats = {key: 0 for key in patterns.keys()}
-    
-    for mask_type, pattern_list in patterns.items():
+    compiled = []
+    for mask_type, pattern_list in get_all_patterns().items():
         if filters.get(mask_type.lower(), True):
+            regexes = []
             for pattern in pattern_list:
                 try:
-                    text, count = re.subn(pattern, f'[{mask_type}]', text)
-                    stats[mask_type] += count
+                    regexes.append(re.compile(pattern))
                 except re.error as e:
                     logger.error(f"正規表現エラー - パターン: {pattern}, エラー: {str(e)}")
-                    continue
+            compiled.append((mask_type, regexes))
+    return compiled
+
+def mask_text(text, filters, compiled=None):
+    """
+    テキストをマスク処理する
+    Args:
+        text (str): マスク対象のテキスト
+        filters (dict): マスク処理の有効/無効を制御する辞書
+        compiled (list): compile_patterns() の結果（省略時はその都度コンパイル）
+    Returns:
+        tuple: (マスク後のテキスト, 統計情報)
+    """
+    if compiled is None:
+        compiled = compile_patterns(filters)
+    stats = {key: 0 for key in get_all_patterns().keys()}
+    
+    for mask_type, regexes in compiled:
+        for regex in regexes:
+            text, count = regex.subn(f'[{mask_type}]', text)
+            stats[mask_type] += count
     
     return text, stats
 
-def process_file(src_path, dst_path, mask_filters):
+def process_file(src_path, dst_path, mask_filters, compiled=None):
     """
     1つのファイルに対してマスク処理を実行
     Args:
         src_path (Path): 入力ファイルのパス
         dst_path (Path): 出力ファイルのパス
         mask_filters (dict): マスクフィルターの設定
+        compiled (list): compile_patterns() の結果
     Returns:
         dict: 処理結果の統計情報
     """
@@ -59,7 +80,7 @@ def process_file(src_path, dst_path, mask_filters):
         with open(src_path, encoding="utf-8") as f:
             content = f.read()
         
-        masked_text, stats = mask_text(content, mask_filters)
+        masked_text, stats = mask_text(content, mask_filters, compiled)
         
         with open(dst_path, "w", encoding="utf-8") as f:
             f.write(masked_text)
@@ -129,20 +150,21 @@ def main():
     DST_DIR.mkdir(exist_ok=True)
     print(f"{DST_DIR} を作成しました")
 
-    # ファイル処理
+    # ファイル処理（正規表現は1回だけコンパイル）
+    # 取り込み時に文書レジストリで文書IDを割り当て、出力ファイル名にはその文書IDを使う
+    compiled = compile_patterns(mask_filters)
     results = []
-    for src_path in sorted(SRC_DIR.glob("mail_data_*.txt")):
-        # 出力ファイル名の生成
-        match = re.search(r'mail_data_(\d+)\.txt$', src_path.name)
-        number = match.group(1) if match else "unknown"
-        # 数字の桁数を3桁に揃える（4桁以上の場合はそのまま）
-        if number != "unknown":
-            number = number.zfill(3) if len(number) <= 3 else number
-        dst_path = DST_DIR / f"{DST_DIR.name}_{number}.txt"
-        
-        # ファイル処理の実行
-        result = process_file(src_path, dst_path, mask_filters)
-        results.append(result)
+    with open_registry() as registry:
+        inputs = ingest_directory(registry, SRC_DIR, "mail_data_*.txt")
+        for doc_id, src_path in inputs:
+            dst_path = DST_DIR / f"{DST_DIR.name}_{doc_id:03d}.txt"
+            
+            # ファイル処理の実行
+            result = process_file(src_path, dst_path, mask_filters, compiled)
+            results.append(result)
+            if result['status'] == 'success':
+                registry.record_artifact(doc_id, 'mask', dst_path, file_hash(dst_path))
+        registry.sync_dir(DST_DIR, [doc_id for doc_id, _ in inputs])
     
     # ログの出力
     log_file = Path("masked.log")